@@ -0,0 +1,95 @@
+"""
+分片匹配基准测试
+生成大规模合成规则集（包含/模糊字面量 + 大量正则），
+对比进程内匹配与 1..N 个分片进程的吞吐，验证吞吐随核数近似线性增长
+
+用法: python -m benchmarks.matcher_shards --rules 200000 --regex 5000 --messages 2000 --batch 64
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import string
+import time
+from typing import Dict, List
+
+from core.match_pool import ShardedMatcher
+from core.matcher import MessageTuple, RuleIndex
+
+
+def make_rules(count: int, regex_count: int, seed: int = 1) -> List[Dict]:
+    """合成规则：其余为包含/模糊匹配，regex_count 条为正则"""
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + "出收售代开飞机汇率"
+    rows = []
+    for rule_id in range(count):
+        if rule_id < regex_count:
+            word = ''.join(rng.choices(alphabet, k=4))
+            content, kw_type = f"{word}.{{0,20}}\\d{{2,}}", 2
+        elif rule_id % 5 == 0:
+            content = '?'.join(''.join(rng.choices(alphabet, k=5)) for _ in range(2))
+            kw_type = 3
+        else:
+            content, kw_type = ''.join(rng.choices(alphabet, k=rng.randint(4, 8))), 1
+        rows.append({'id': rule_id, 'content': content, 'type': kw_type, 'action': 1,
+                     'is_case_sensitive': False})
+    return rows
+
+
+def make_messages(count: int, seed: int = 2) -> List[MessageTuple]:
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + "出收售代开飞机汇率 0123456789"
+    return [(''.join(rng.choices(alphabet, k=rng.randint(50, 400))), rng.randint(1, 10 ** 6), -100)
+            for _ in range(count)]
+
+
+def batches(messages: List[MessageTuple], size: int):
+    for start in range(0, len(messages), size):
+        yield messages[start:start + size]
+
+
+def bench_local(rows: List[Dict], messages: List[MessageTuple], batch: int) -> float:
+    index = RuleIndex(rows)
+    started = time.perf_counter()
+    for chunk in batches(messages, batch):
+        index.match_batch(chunk)
+    return len(messages) / (time.perf_counter() - started)
+
+
+async def bench_sharded(rows: List[Dict], messages: List[MessageTuple], batch: int, shards: int) -> float:
+    matcher = ShardedMatcher(shards)
+    try:
+        matcher.load(rows)
+        # 预热：等待各分片编译完成
+        await matcher.match_batch(messages[:1])
+        started = time.perf_counter()
+        for chunk in batches(messages, batch):
+            await matcher.match_batch(chunk)
+        return len(messages) / (time.perf_counter() - started)
+    finally:
+        matcher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片匹配基准测试")
+    parser.add_argument('--rules', type=int, default=50000)
+    parser.add_argument('--regex', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=64)
+    parser.add_argument('--max-shards', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rows = make_rules(args.rules, args.regex)
+    messages = make_messages(args.messages)
+    print(f"规则: {len(rows)}（正则 {args.regex}） | 消息: {len(messages)} | 批大小: {args.batch}")
+
+    baseline = bench_local(rows, messages, args.batch)
+    print(f"进程内      {baseline:10.1f} 条/秒")
+    for shards in range(1, args.max_shards + 1):
+        rate = asyncio.run(bench_sharded(rows, messages, args.batch, shards))
+        print(f"{shards:2d} 个分片   {rate:10.1f} 条/秒  加速比 {rate / baseline:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
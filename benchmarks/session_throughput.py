@@ -0,0 +1,84 @@
+"""
+会话吞吐基准测试
+模拟持续收到更新：每条更新写入若干用户/频道实体、更新 pts 状态并调用 save()，
+分别在 Telethon 默认的 SQLiteSession 和内存会话上测量每秒可处理的更新数，
+最后确认内存会话写回的文件能被 SQLiteSession 正常读出
+
+用法: python -m benchmarks.session_throughput --updates 5000 --entities 3 --peers 500
+"""
+
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from telethon.sessions import SQLiteSession
+from telethon.tl import types
+
+from core.memory_session import MemoryBackedSession
+
+
+def make_updates(count: int, entities: int, peers: int, seed: int = 5):
+    """生成带实体的更新，实体从 peers 个用户/频道中随机抽取（会有重复，贴近真实的群组消息）"""
+    rng = random.Random(seed)
+    updates = []
+    for pts in range(1, count + 1):
+        users, chats = [], []
+        for peer_id in rng.sample(range(1, peers + 1), entities):
+            if peer_id % 2:
+                users.append(types.User(
+                    id=peer_id, access_hash=peer_id * 7919, username=f"user{peer_id}", first_name="u"
+                ))
+            else:
+                chats.append(types.Channel(
+                    id=peer_id, title=f"chat{peer_id}", photo=types.ChatPhotoEmpty(),
+                    date=datetime.datetime(2024, 1, 1), access_hash=peer_id * 104729, username=f"chat{peer_id}"
+                ))
+        updates.append((types.Updates(updates=[], users=users, chats=chats, date=None, seq=pts), pts))
+    return updates
+
+
+def run(session, updates) -> float:
+    """按收到更新的节奏写会话，返回每秒处理的更新数"""
+    started = time.perf_counter()
+    for update, pts in updates:
+        session.process_entities(update)
+        session.set_update_state(0, types.updates.State(
+            pts=pts, qts=0, date=datetime.datetime.now(), seq=pts, unread_count=0
+        ))
+        session.save()
+    elapsed = time.perf_counter() - started
+    session.close()
+    return len(updates) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话吞吐基准测试")
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--entities', type=int, default=3)
+    parser.add_argument('--peers', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=60)
+    args = parser.parse_args()
+
+    updates = make_updates(args.updates, args.entities, args.peers)
+    print(f"更新: {args.updates} | 每条实体: {args.entities} | 不同实体: {args.peers}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_rate = run(SQLiteSession(os.path.join(tmp, 'sqlite')), updates)
+        print(f"SQLiteSession       {sqlite_rate:10.0f} 条/秒")
+
+        path = os.path.join(tmp, 'memory')
+        memory_rate = run(MemoryBackedSession(path, flush_interval=args.flush_interval), updates)
+        print(f"MemoryBackedSession {memory_rate:10.0f} 条/秒（快 {memory_rate / sqlite_rate:.1f} 倍）")
+
+        # 内存会话关闭时写回，文件格式与 SQLiteSession 一致
+        check = SQLiteSession(path)
+        state = check.get_update_state(0)
+        print(f"写回校验: pts={state.pts if state else None} 实体={check._execute('select count(*) from entities')[0]}")
+        check.close()
+
+
+if __name__ == '__main__':
+    main()
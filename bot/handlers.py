@@ -3,8 +3,10 @@ Bot消息处理器
 处理所有用户交互，优先使用消息编辑
 """
 
+import html
 import json
 import logging
+from datetime import datetime
 from typing import Dict, Any, Tuple
 
 from decouple import config
@@ -17,7 +19,10 @@ from telegram.ext import (
 )
 
 from bot.keyboards import *
+from core.alert_template import FIELDS
 from core.database import get_user_state, set_user_state
+from core.proximity import is_proximity_syntax
+from core.utils import format_duration, normalize_chat_id
 from services.keyword_service import KeywordService
 from services.telegram_service import TelegramService
 from services.monitor_service import MonitorService
@@ -156,6 +161,15 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_account_status(update, context)
     elif data == "logout_account":
         await logout_account(update, context)
+    elif data == "add_account":
+        await start_login_process(update, context, extra=True)
+    elif data == "list_accounts":
+        await show_accounts_list(update, context)
+    elif data.startswith("remove_account_"):
+        phone = "+" + data.replace("remove_account_", "")
+        success, message = await telegram_service.remove_account(phone)
+        await query.answer(message, show_alert=True)
+        await show_accounts_list(update, context)
     
     # 代理设置
     elif data.startswith("proxy_"):
@@ -192,6 +206,14 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await start_monitoring(update, context)
     elif data == "stop_monitor":
         await stop_monitoring(update, context)
+    elif data == "alert_template":
+        await show_alert_template(update, context)
+    elif data == "alert_template_edit":
+        await start_edit_alert_template(update, context)
+    elif data == "alert_template_reset":
+        success, message = await monitor_service.set_alert_template(None)
+        await query.answer(message, show_alert=True)
+        await show_alert_template(update, context)
     elif data.startswith("set_target_"):
         chat_id = int(data.split('_')[-1])
         success, message = await monitor_service.set_target_chat(chat_id)
@@ -211,6 +233,12 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data.startswith("confirm_del_kw_"):
         keyword_id = int(data.split('_')[-1])
         await delete_keyword(update, context, keyword_id)
+    elif data.startswith("enable_kw_"):
+        keyword_id = int(data.split('_')[-1])
+        await enable_keyword(update, context, keyword_id)
+    elif data.startswith("kw_chats_"):
+        keyword_id = int(data.split('_')[-1])
+        await show_keyword_chats_input(update, context, keyword_id)
     
     # 确认操作
     elif data == "confirm_logout":
@@ -329,6 +357,7 @@ async def show_account_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 🌐 **代理设置** - 配置网络代理
 📊 **账号状态** - 查看详细状态信息
 🚪 **退出账号** - 退出当前登录
+➕ **添加监控账号** - 用更多账号扩大监控覆盖范围
 """
     await safe_edit_message(update, context, text, account_menu())
 
@@ -375,6 +404,7 @@ async def show_monitor_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 📊 **监控状态** - 查看详细监控信息
 ▶️ **开始监控** - 启动消息监控
 ⏹️ **停止监控** - 停止消息监控
+📝 **告警模板** - 自定义转发消息的版式
 """
     await safe_edit_message(update, context, text, monitor_menu())
 
@@ -396,6 +426,8 @@ async def show_help_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
 🔍 **正则表达式** - 使用正则表达式匹配
 🌟 **模糊匹配** - 多个关键词用?分隔
 👤 **用户匹配** - 匹配特定用户ID或用户名
+🧮 **布尔表达式** - 如 `(出 OR 收) AND USDT AND NOT 诈骗`
+📏 **邻近匹配** - 如 `出 ~20 USDT`，两词相距20字符内；`~20>` 要求顺序
 
 **关键词动作：**
 ✅ **监控** - 匹配时转发消息到目标群组
@@ -442,6 +474,10 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await handle_import_keywords_input(update, context, message_text)
     elif user_state.current_state == "waiting_blacklist_id":
         await handle_blacklist_input(update, context, message_text)
+    elif user_state.current_state == "waiting_alert_template":
+        await handle_alert_template_input(update, context, message_text)
+    elif user_state.current_state == "waiting_keyword_chats":
+        await handle_keyword_chats_input(update, context, message_text)
     else:
         # 未知状态，返回主菜单
         await show_main_menu(update, context)
@@ -461,19 +497,25 @@ def setup_handlers(app: Application):
     logger.info("所有处理器设置完成")
 
 
-async def start_login_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """开始登录流程"""
-    text = """
-🔑 **账号登录**
+async def start_login_process(update: Update, context: ContextTypes.DEFAULT_TYPE, extra: bool = False):
+    """开始登录流程，extra 为 True 时登录附加监控账号"""
+    title = "➕ **添加监控账号**" if extra else "🔑 **账号登录**"
+    text = f"""
+{title}
 
 请发送您的手机号码（包含国家代码）
 
 示例: +8613812345678
 
 ⚠️ 注意: 发送后消息会自动删除以保护隐私
+"""
+    if extra:
+        text += """
+💡 附加账号使用独立的设备指纹，收到的消息与主账号一起匹配和转发，
+多个账号所在的同一群组消息只会转发一次
 """
     await safe_edit_message(update, context, text, back_cancel_menu("account_menu"))
-    await set_user_state(update.effective_user.id, "waiting_phone")
+    await set_user_state(update.effective_user.id, "waiting_phone", "extra" if extra else "")
 
 
 async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE, phone: str):
@@ -492,8 +534,10 @@ async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE,
         await safe_edit_message(update, context, text, back_cancel_menu("account_menu"))
         return
     
-    # 尝试登录
-    success, message = await telegram_service.login_with_phone(phone)
+    # 尝试登录（附加监控账号的标记保存在状态数据中）
+    user_state = await get_user_state(user_id)
+    extra = user_state.temp_data == "extra"
+    success, message = await telegram_service.login_with_phone(phone, extra=extra)
     
     if success:
         # 登录成功
@@ -689,6 +733,13 @@ async def show_account_status(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 🌐 **代理状态:** {proxy_status.get('status', '未知')}
 """
+        
+        # FloodWait 退避中的请求
+        rpc_backoff = status.get('rpc_backoff')
+        if rpc_backoff:
+            text += "\n⏳ **请求限流中:**\n"
+            for method, seconds in rpc_backoff.items():
+                text += f"• {method}: 剩余 {format_duration(seconds)}\n"
     else:
         text = """
 📊 **账号状态**
@@ -701,6 +752,43 @@ async def show_account_status(update: Update, context: ContextTypes.DEFAULT_TYPE
     await safe_edit_message(update, context, text, back_cancel_menu("account_menu"))
 
 
+async def show_accounts_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """显示监控账号列表"""
+    accounts = await telegram_service.get_accounts_status()
+    
+    text = f"""
+👥 **监控账号** (共 {len(accounts)} 个)
+
+"""
+    keyboard = []
+    if not accounts:
+        text += "暂无已登录的账号"
+    
+    for account in accounts:
+        icon = "🟢" if account['connected'] else "🔴"
+        role = "主账号" if account['primary'] else "附加账号"
+        text += f"""{icon} **{account['phone']}** ({role})
+• 收到消息: {account['received']} | 跨账号重复: {account['duplicates']}
+• 吞吐: {account['per_minute']:.1f} 条/分钟 | 重连: {account['reconnect_count']} 次
+
+"""
+        if not account['primary']:
+            keyboard.append([
+                InlineKeyboardButton(f"🗑 移除 {account['phone']}",
+                                     callback_data=f"remove_account_{account['phone'].lstrip('+')}")
+            ])
+    
+    keyboard.append([
+        InlineKeyboardButton("➕ 添加监控账号", callback_data="add_account"),
+        InlineKeyboardButton("🔄 刷新", callback_data="list_accounts")
+    ])
+    keyboard.append([
+        InlineKeyboardButton("🔙 返回", callback_data="account_menu"),
+        InlineKeyboardButton("❌ 取消", callback_data="main_menu")
+    ])
+    await safe_edit_message(update, context, text, InlineKeyboardMarkup(keyboard))
+
+
 async def logout_account(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """退出账号"""
     text = """
@@ -730,7 +818,19 @@ async def show_proxy_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 当前状态: {proxy_status.get('status', '未知')}
 """
     
-    if proxy_status.get('url'):
+    proxies = proxy_status.get('proxies', [])
+    if len(proxies) > 1:
+        # 代理池：逐个显示探测延迟，▶ 为当前使用的代理
+        for proxy in proxies:
+            mark = "▶" if proxy.get('active') else "•"
+            if proxy.get('latency') is not None:
+                latency = f"{proxy['latency'] * 1000:.0f}ms"
+            elif proxy.get('failures'):
+                latency = "不可用"
+            else:
+                latency = "未探测"
+            text += f"{mark} {proxy['url']} ({latency})\n"
+    elif proxy_status.get('url'):
         text += f"代理地址: {proxy_status['url']}"
     
     text += """
@@ -770,6 +870,8 @@ async def handle_proxy_setting(update: Update, context: ContextTypes.DEFAULT_TYP
 格式2: host:port:username:password
 
 示例: 127.0.0.1:1080
+
+💡 每行一个，可发送多个代理，自动选用延迟最低的可用代理并在失效时切换
 """
         await safe_edit_message(update, context, text, back_cancel_menu("account_menu"))
         await set_user_state(user_id, "waiting_proxy_url", "socks5")
@@ -785,6 +887,8 @@ async def handle_proxy_setting(update: Update, context: ContextTypes.DEFAULT_TYP
 
 或直接发送代理参数:
 server:port:secret
+
+💡 每行一个，可发送多个代理，自动选用延迟最低的可用代理并在失效时切换
 """
         await safe_edit_message(update, context, text, back_cancel_menu("account_menu"))
         await set_user_state(user_id, "waiting_proxy_url", "mtproxy")
@@ -854,6 +958,8 @@ async def handle_keyword_content_input(update: Update, context: ContextTypes.DEF
 🔍 **正则表达式** - 使用正则表达式匹配
 🌟 **模糊匹配** - 多个关键词用?分隔
 👤 **用户匹配** - 匹配特定用户ID或用户名
+🧮 **布尔表达式** - 如 `(出 OR 收) AND USDT AND NOT 诈骗`
+📏 **邻近匹配** - 如 `出 ~20 USDT`，两词相距20字符内；`~20>` 要求顺序
 """
     
     await safe_edit_message(update, context, text, keyword_type_menu())
@@ -871,7 +977,7 @@ async def handle_keyword_type(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # 提取类型
     kw_type = int(data.split('_')[-1])
-    type_names = {0: "全字匹配", 1: "包含匹配", 2: "正则表达式", 3: "模糊匹配", 4: "用户匹配"}
+    type_names = {0: "全字匹配", 1: "包含匹配", 2: "正则表达式", 3: "模糊匹配", 4: "用户匹配", 5: "布尔表达式", 6: "邻近匹配"}
     
     # 保存类型，进入动作选择
     temp_data = json.dumps({"content": content, "type": kw_type})
@@ -1046,8 +1152,18 @@ async def show_keyword_list(update: Update, context: ContextTypes.DEFAULT_TYPE,
         
         # 添加关键词信息
         action_emoji = "✅" if kw['action'] == 1 else "🚫"
+        stats = kw['stats']
+        if stats['disabled']:
+            action_emoji = "⛔"
         text += f"{action_emoji} `{kw['content'][:20]}{'...' if len(kw['content']) > 20 else ''}` {style_text}\n"
-        text += f"   类型: {kw['type_name']} | 动作: {kw['action_name']}\n\n"
+        text += f"   类型: {kw['type_name']} | 动作: {kw['action_name']}"
+        if kw['chats']:
+            text += f" | 范围: {len(kw['chats'])}个群组"
+        text += "\n"
+        text += f"   命中: {stats['hits']} | 最后命中: {stats['last_hit_at'] or '无'}"
+        if stats['avg_cost_ms'] is not None:
+            text += f" | 平均耗时: {stats['avg_cost_ms']:.2f}ms"
+        text += "\n\n"
         
         # 添加编辑和删除按钮
         keyboard.append([
@@ -1151,11 +1267,98 @@ async def show_monitor_status(update: Update, context: ContextTypes.DEFAULT_TYPE
 • 排除规则: {status['keyword_stats']['exclude']}
 
 💡 **状态说明:** {status['status_text']}
+"""
+    
+    # 连接健康状态（仅监控运行时有意义）
+    connection = status.get('connection')
+    if status['is_monitoring'] and connection:
+        connection_icon = "🟢" if connection['connected'] else "🟡"
+        text += f"""
+🔌 **连接状态:** {connection_icon} {'已连接' if connection['connected'] else '重连中'}
+• 运行时长: {format_duration(connection['uptime'])}
+• 重连次数: {connection['reconnect_count']}
+• 断线时长: {format_duration(connection['disconnected_seconds'])}
+"""
+    
+    # 多账号时逐个显示吞吐
+    accounts = status.get('accounts') or []
+    if status['is_monitoring'] and len(accounts) > 1:
+        text += f"\n👥 **监控账号:** {len(accounts)} 个\n"
+        for account in accounts:
+            icon = "🟢" if account['connected'] else "🔴"
+            text += f"{icon} {account['phone']}: {account['per_minute']:.1f} 条/分钟，重复 {account['duplicates']}\n"
+    
+    # 匹配器当前使用的规则快照
+    rules = status.get('rules')
+    if rules:
+        built_at = datetime.fromtimestamp(rules['built_at']).strftime('%Y-%m-%d %H:%M:%S')
+        text += f"""
+🧩 **规则快照:** v{rules['version']}{'（合并中）' if rules['pending'] else ''}
+• 规则数: {rules['rules']}（增量 {rules['delta']}，待删除 {rules['tombstones']}）
+• 主索引构建: {built_at}（耗时 {rules['build_ms']:.0f}ms）
+"""
+    
+    # 告警格式化耗时
+    alerts = status.get('alerts')
+    if alerts and alerts['count']:
+        text += f"""
+📝 **告警格式化:** {'自定义模板' if alerts['custom'] else '默认模板'}
+• 已格式化: {alerts['count']} 条
+• 平均耗时: {alerts['total_ms'] / alerts['count']:.2f}ms（最长 {alerts['max_ms']:.2f}ms）
 """
     
     await safe_edit_message(update, context, text, back_cancel_menu("monitor_menu"))
 
 
+def _alert_template_fields() -> str:
+    """占位符说明（HTML）"""
+    return "\n".join(f"<code>{{{name}}}</code> {description}" for name, description in FIELDS.items())
+
+
+async def show_alert_template(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """显示当前告警模板"""
+    template = await monitor_service.get_alert_template()
+    
+    text = f"""
+📝 <b>告警模板</b>（{'默认' if template['is_default'] else '自定义'}）
+
+<pre>{html.escape(template['source'])}</pre>
+
+<b>可用占位符:</b>
+{_alert_template_fields()}
+"""
+    await safe_edit_message(update, context, text, alert_template_menu(), parse_mode=ParseMode.HTML)
+
+
+async def start_edit_alert_template(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """提示输入新的告警模板"""
+    text = f"""
+✏️ <b>修改告警模板</b>
+
+请发送新的模板内容，占位符会替换为告警的对应部分。
+模板按 HTML 解析，可以使用 &lt;b&gt;、&lt;i&gt;、&lt;u&gt;、&lt;code&gt; 等标签；花括号本身写作 {{{{ 和 }}}}。
+
+<b>可用占位符:</b>
+{_alert_template_fields()}
+"""
+    await safe_edit_message(update, context, text, back_cancel_menu("alert_template"), parse_mode=ParseMode.HTML)
+    await set_user_state(update.effective_user.id, "waiting_alert_template")
+
+
+async def handle_alert_template_input(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """处理告警模板输入"""
+    success, message = await monitor_service.set_alert_template(text)
+    
+    result_text = f"""
+{'✅' if success else '❌'} <b>设置结果</b>
+
+{html.escape(message)}
+"""
+    await safe_edit_message(update, context, result_text, back_cancel_menu("alert_template"), parse_mode=ParseMode.HTML)
+    if success:
+        await set_user_state(update.effective_user.id, "idle")
+
+
 async def start_monitoring(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """开始监控"""
     success, message = await monitor_service.start_monitoring()
@@ -1228,6 +1431,11 @@ async def edit_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE, keywo
     
     style_text = ', '.join(styles) if styles else '无'
     
+    stats = keyword['stats']
+    avg_cost = f"{stats['avg_cost_ms']:.2f}ms（{stats['evals']} 次）" if stats['avg_cost_ms'] is not None else '无'
+    status_text = f"⛔ 已停用（{stats['disabled_reason']}）" if stats['disabled'] else "✅ 启用中"
+    chats_text = ', '.join(f"`{chat_id}`" for chat_id in keyword['chats']) if keyword['chats'] else '所有群组'
+    
     text = f"""
 ✏️ **编辑关键词**
 
@@ -1236,17 +1444,27 @@ async def edit_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE, keywo
 **类型:** {keyword['type_name']}
 **动作:** {keyword['action_name']}
 **样式:** {style_text}
+**群组范围:** {chats_text}
+
+**状态:** {status_text}
+**命中次数:** {stats['hits']}
+**最后命中:** {stats['last_hit_at'] or '无'}
+**平均耗时:** {avg_cost}
 
 暂不支持编辑功能，请删除后重新添加。
 """
     
-    keyboard = [
+    keyboard = []
+    if stats['disabled']:
+        keyboard.append([InlineKeyboardButton("♻️ 重新启用", callback_data=f"enable_kw_{keyword_id}")])
+    keyboard.extend([
+        [InlineKeyboardButton("🎯 设置群组范围", callback_data=f"kw_chats_{keyword_id}")],
         [InlineKeyboardButton("🗑️ 删除此关键词", callback_data=f"del_kw_{keyword_id}")],
         [
             InlineKeyboardButton("🔙 返回列表", callback_data="list_keywords"),
             InlineKeyboardButton("❌ 取消", callback_data="main_menu")
         ]
-    ]
+    ])
     
     await safe_edit_message(update, context, text, InlineKeyboardMarkup(keyboard))
 
@@ -1295,18 +1513,90 @@ async def delete_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE, key
     await safe_edit_message(update, context, text, back_cancel_menu("keyword_menu"))
 
 
+async def enable_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE, keyword_id: int):
+    """重新启用被自动停用的关键词"""
+    success, message = await keyword_service.enable_keyword(keyword_id)
+    
+    text = f"""
+{'✅' if success else '❌'} **启用结果**
+
+{message}
+"""
+    
+    await safe_edit_message(update, context, text, back_cancel_menu("keyword_menu"))
+
+
+async def show_keyword_chats_input(update: Update, context: ContextTypes.DEFAULT_TYPE, keyword_id: int):
+    """提示输入关键词的群组范围"""
+    # 列出已加入群组的带标记ID（超级群组/频道 -100 开头，普通群组 - 开头），供直接复制
+    chats = await telegram_service.get_available_chats()
+    chat_lines = [
+        f"`{chat['peer_id']}` {''.join(ch for ch in chat['title'][:20] if ch not in '*_`[')}"
+        for chat in chats[:10]
+    ]
+    chats_text = "\n已加入的群组:\n" + '\n'.join(chat_lines) + "\n" if chat_lines else ""
+    text = f"""
+🎯 **设置群组范围**
+
+请发送群组ID，多个用空格或逗号分隔，关键词将只在这些群组生效。
+超级群组/频道的ID以 -100 开头，普通群组的ID以 - 开头。
+发送 `0` 取消限制，对所有群组生效。
+
+示例: `-1001234567890 -123456789`
+{chats_text}"""
+    await safe_edit_message(update, context, text, back_cancel_menu("list_keywords"))
+    await set_user_state(update.effective_user.id, "waiting_keyword_chats", str(keyword_id))
+
+
+async def handle_keyword_chats_input(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """处理群组范围输入"""
+    user_id = update.effective_user.id
+    user_state = await get_user_state(user_id)
+    keyword_id = int(user_state.temp_data) if user_state.temp_data else 0
+    
+    # 解析群组ID，只接受带标记的形式，与消息的 chat_id 一致
+    items = [item for item in text.replace(',', ' ').replace('，', ' ').split() if item != '0']
+    invalid = []
+    for item in items:
+        try:
+            normalize_chat_id(item)
+        except ValueError:
+            invalid.append(item)
+    if invalid:
+        invalid_text = ', '.join(f"`{item.replace('`', '')}`" for item in invalid[:10])
+        result_text = f"""
+❌ **ID格式错误**
+
+无法识别: {invalid_text}
+请输入 -100 开头的超级群组/频道ID，或 - 开头的普通群组ID。
+"""
+        await safe_edit_message(update, context, result_text, back_cancel_menu("list_keywords"))
+        return
+    
+    success, message = await keyword_service.set_keyword_chats(keyword_id, items)
+    
+    result_text = f"""
+{'✅' if success else '❌'} **设置结果**
+
+{message}
+"""
+    await safe_edit_message(update, context, result_text, back_cancel_menu("keyword_menu"))
+    await set_user_state(user_id, "idle")
+
+
 async def import_keywords(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """导入关键词"""
     text = """
 📥 **批量导入关键词**
 
 请发送包含关键词的文本，每行一个关键词。
+写成 `A ~N B` / `A ~N> B` 的行按邻近匹配导入，格式错误的行会被跳过并列出。
 
 示例:
 ```
 关键词1
 关键词2
-关键词3
+出 ~20 USDT
 ```
 
 ⚠️ 注意: 发送后消息会自动删除
@@ -1329,17 +1619,18 @@ async def handle_import_keywords_input(update: Update, context: ContextTypes.DEF
         await safe_edit_message(update, context, result_text, back_cancel_menu("keyword_menu"))
         return
     
-    # 解析关键词（每行一个）
+    # 解析关键词（每行一个，写成 A ~N B 的按邻近匹配导入）
     lines = text.strip().split('\n')
     keywords_data = []
     
-    for line in lines:
+    for number, line in enumerate(lines, 1):
         keyword = line.strip()
         if keyword:
             keywords_data.append({
                 'content': keyword,
-                'type': 1,  # 默认包含匹配
+                'type': 6 if is_proximity_syntax(keyword) else 1,  # 默认包含匹配
                 'action': 1,  # 默认监控
+                'line': number,
             })
     
     if not keywords_data:
@@ -1355,15 +1646,16 @@ async def handle_import_keywords_input(update: Update, context: ContextTypes.DEF
     # 批量添加关键词
     success, message = await keyword_service.batch_add_keywords(keywords_data)
     
+    # 结果中可能列出用户输入的规则，用 HTML 转义后显示
     result_text = f"""
-{'✅' if success else '❌'} **批量导入结果**
+{'✅' if success else '❌'} <b>批量导入结果</b>
 
-{message}
+{html.escape(message)}
 
 共解析 {len(keywords_data)} 个关键词
 """
     
-    await safe_edit_message(update, context, result_text, back_cancel_menu("keyword_menu"))
+    await safe_edit_message(update, context, result_text, back_cancel_menu("keyword_menu"), parse_mode=ParseMode.HTML)
     await set_user_state(user_id, "idle")
 
 
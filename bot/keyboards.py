@@ -35,6 +35,10 @@ def account_menu() -> InlineKeyboardMarkup:
             InlineKeyboardButton("📊 账号状态", callback_data="account_status"),
             InlineKeyboardButton("🚪 退出账号", callback_data="logout_account")
         ],
+        [
+            InlineKeyboardButton("➕ 添加监控账号", callback_data="add_account"),
+            InlineKeyboardButton("👥 监控账号", callback_data="list_accounts")
+        ],
         [
             InlineKeyboardButton("🔙 返回主菜单", callback_data="main_menu")
         ]
@@ -71,6 +75,9 @@ def monitor_menu() -> InlineKeyboardMarkup:
             InlineKeyboardButton("▶️ 开始监控", callback_data="start_monitor"),
             InlineKeyboardButton("⏹️ 停止监控", callback_data="stop_monitor")
         ],
+        [
+            InlineKeyboardButton("📝 告警模板", callback_data="alert_template")
+        ],
         [
             InlineKeyboardButton("🔙 返回主菜单", callback_data="main_menu")
         ]
@@ -78,6 +85,20 @@ def monitor_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
+def alert_template_menu() -> InlineKeyboardMarkup:
+    """告警模板菜单"""
+    keyboard = [
+        [
+            InlineKeyboardButton("✏️ 修改模板", callback_data="alert_template_edit"),
+            InlineKeyboardButton("♻️ 恢复默认", callback_data="alert_template_reset")
+        ],
+        [
+            InlineKeyboardButton("🔙 返回", callback_data="monitor_menu")
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
 def proxy_type_menu() -> InlineKeyboardMarkup:
     """代理类型选择菜单"""
     keyboard = [
@@ -108,7 +129,11 @@ def keyword_type_menu() -> InlineKeyboardMarkup:
             InlineKeyboardButton("🌟 模糊匹配", callback_data="kw_type_3")
         ],
         [
-            InlineKeyboardButton("👤 用户匹配", callback_data="kw_type_4")
+            InlineKeyboardButton("👤 用户匹配", callback_data="kw_type_4"),
+            InlineKeyboardButton("🧮 布尔表达式", callback_data="kw_type_5")
+        ],
+        [
+            InlineKeyboardButton("📏 邻近匹配", callback_data="kw_type_6")
         ],
         [
             InlineKeyboardButton("🔙 返回", callback_data="keyword_menu"),
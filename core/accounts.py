@@ -0,0 +1,126 @@
+"""
+多账号监控模块
+每个监控账号拥有独立的客户端、设备指纹、连接监督和更新状态，
+所有账号的消息汇入同一条匹配和转发流程，多个账号看到的同一条消息只处理一次
+"""
+
+import time
+import zlib
+from datetime import datetime, timezone
+from collections import OrderedDict, deque
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from telethon.tl.types import PeerChannel
+
+from core.supervisor import ConnectionSupervisor
+from core.update_state import UpdateStateStore
+
+
+def account_worker(phone: str, worker_count: int) -> int:
+    """分进程模式下附加账号所在的工作进程（按手机号分片，主账号固定在 0 号进程）"""
+    return zlib.crc32(phone.encode()) % max(1, worker_count)
+
+
+class ThroughputMeter:
+    """按秒分桶统计最近一段时间的消息速率"""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        # [秒, 条数]
+        self._buckets: deque = deque()
+
+    def _trim(self, now: int):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+    def hit(self):
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += 1
+        else:
+            self._buckets.append([now, 1])
+        self._trim(now)
+
+    def per_minute(self) -> float:
+        """最近窗口内的平均速率（条/分钟）"""
+        self._trim(int(time.monotonic()))
+        return sum(count for _, count in self._buckets) * 60 / self.window
+
+
+class MonitorAccount:
+    """监控账号"""
+
+    def __init__(self, phone: str, client, supervisor: ConnectionSupervisor,
+                 update_state_store: UpdateStateStore, primary: bool = False):
+        self.phone = phone
+        self.client = client
+        self.supervisor = supervisor
+        self.update_state_store = update_state_store
+        self.primary = primary
+        # 已注册的事件处理器 (回调, 事件)
+        self.event_handlers: List[Tuple] = []
+        # 本账号补拉的起点和已处理的补拉消息数（每个账号独立计算）
+        self.replay_since: Optional[datetime] = None
+        self.replayed_count = 0
+
+        # 吞吐统计
+        self.received = 0
+        self.duplicates = 0
+        self.throughput = ThroughputMeter()
+
+    def reset_replay(self):
+        """开始一轮补拉：此刻之前的消息计入补拉预算"""
+        self.replay_since = datetime.now(timezone.utc)
+        self.replayed_count = 0
+
+    def record(self, duplicate: bool):
+        """记录收到一条消息，duplicate 表示已被其他账号处理过"""
+        self.received += 1
+        self.throughput.hit()
+        if duplicate:
+            self.duplicates += 1
+
+    def get_stats(self) -> Dict:
+        connection = self.supervisor.get_stats()
+        return {
+            'phone': self.phone,
+            'primary': self.primary,
+            'connected': self.client is not None and self.client.is_connected(),
+            'received': self.received,
+            'duplicates': self.duplicates,
+            'per_minute': self.throughput.per_minute(),
+            'reconnect_count': connection['reconnect_count'],
+        }
+
+
+class SeenMessages:
+    """最近处理过的消息键，用于多账号之间的去重"""
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    @staticmethod
+    def key(message, edited: bool = False) -> Optional[Hashable]:
+        """
+        消息键
+        频道/超级群组的消息 ID 对所有成员一致，直接用 (聊天, 消息ID)；
+        普通群组的消息 ID 按账号各自编号，改用 (聊天, 发送者, 时间, 内容)
+        """
+        if isinstance(message.peer_id, PeerChannel):
+            key = (message.chat_id, message.id)
+        else:
+            key = (message.chat_id, message.sender_id, message.date, message.text)
+        if edited:
+            key += ('edit', message.edit_date)
+        return key
+
+    def claim(self, key: Hashable) -> bool:
+        """首次出现返回 True，已出现过返回 False"""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+        return True
@@ -0,0 +1,89 @@
+"""
+相册聚合模块
+同一相册（grouped_id 相同）的多条媒体消息会分别触发 NewMessage 事件，
+这里把它们收集一个短窗口后合并成一次处理，合并后的相册放入摄入队列，
+与普通消息一样由队列的工作协程处理并受队列容量限制
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+from core.ingest import IngestQueue
+
+logger = logging.getLogger(__name__)
+
+
+class AlbumAggregator:
+    """相册聚合器"""
+
+    def __init__(self, window_seconds: float, on_album: Callable[..., Awaitable],
+                 queue: IngestQueue, max_flushed: int = 1000):
+        self.window_seconds = window_seconds
+        self.on_album = on_album
+        self.queue = queue
+        # grouped_id -> (消息列表, 回调附加参数)
+        self._pending: Dict[int, Tuple[List, tuple]] = {}
+        # 最近已处理的相册，窗口结束后才到达的分片直接丢弃，避免同一相册告警两次
+        self._flushed: "OrderedDict[int, None]" = OrderedDict()
+        self.max_flushed = max_flushed
+        # 等待窗口结束的合并任务（事件循环只弱引用任务，需在这里持有）
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def add(self, message, *args):
+        """收集一条相册分片，args 会原样传给 on_album"""
+        grouped_id = message.grouped_id
+
+        if grouped_id in self._flushed:
+            logger.debug(f"⊘ 跳过：相册 {grouped_id} 已处理")
+            return
+
+        group = self._pending.get(grouped_id)
+        if group is None:
+            self._pending[grouped_id] = ([message], args)
+            task = asyncio.create_task(self._flush_later(grouped_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._on_task_done)
+        else:
+            group[0].append(message)
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"相册合并任务异常: {task.exception()}", exc_info=task.exception())
+
+    async def stop(self):
+        """取消所有等待中的合并任务，未处理的分片丢弃"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
+
+    async def _flush_later(self, grouped_id: int):
+        """窗口结束后把整个相册交给摄入队列"""
+        await asyncio.sleep(self.window_seconds)
+
+        messages, args = self._pending.pop(grouped_id)
+        self._flushed[grouped_id] = None
+        while len(self._flushed) > self.max_flushed:
+            self._flushed.popitem(last=False)
+
+        messages.sort(key=lambda m: m.id)
+        # 队列满时在这里等待，处理过程中的异常由队列的工作协程记录
+        await self.queue.put(self.on_album, messages, *args)
+
+    @staticmethod
+    def combine(messages: List) -> Tuple[object, str]:
+        """
+        合并相册
+        返回: (代表消息, 合并后的说明文字)，代表消息取第一条带说明文字的分片
+        """
+        captions = [m.text for m in messages if m.text]
+        primary = next((m for m in messages if m.text), messages[0])
+        return primary, "\n".join(captions)
@@ -0,0 +1,224 @@
+"""
+告警模板
+告警版式只编译一次：模板拆成固定文本和占位符位置，每条告警只填入变化的部分并拼接一次；
+标题、广告链接、广告按钮等来自广告系统的片段渲染后缓存，超过刷新间隔才重新获取
+"""
+
+import html
+import logging
+import string
+import time
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 占位符 -> 说明
+FIELDS = {
+    'title': '标题（广告系统配置的标题和作者）',
+    'user': '发送者链接',
+    'chat': '来源群组链接',
+    'content': '消息内容（已标注命中关键词）',
+    'time': '消息时间',
+    'keywords': '命中关键词',
+    'suppressed': '冷却抑制提示（没有时为空）',
+    'ads': '广告链接（没有时为空）',
+}
+
+DEFAULT_TEMPLATE = """{title}
+
+用户: {user}
+来源: 🔍 {chat}
+内容: {content}
+时间: {time}
+命中关键词: {keywords}
+{suppressed}{ads}
+---"""
+
+DEFAULT_TITLE = "📨 实时精准获客"
+
+# Telegram HTML 支持的标签
+_ALLOWED_TAGS = {
+    'b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del', 'tg-spoiler',
+    'span', 'a', 'code', 'pre', 'blockquote',
+}
+
+
+class TemplateError(ValueError):
+    """模板格式错误"""
+
+
+class _TagChecker(HTMLParser):
+    """检查模板中的 HTML 标签是否受支持且成对出现"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in _ALLOWED_TAGS:
+            raise TemplateError(f"不支持的标签 <{tag}>")
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack.pop() != tag:
+            raise TemplateError(f"标签 </{tag}> 没有对应的开始标签")
+
+
+class AlertTemplate:
+    """编译后的告警模板，占位符见 FIELDS，{{ 和 }} 表示花括号本身"""
+
+    def __init__(self, source: str):
+        self.source = source
+        # 固定文本和占位符按顺序排列，占位符位置先留空
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, str]] = []
+        try:
+            parsed = list(string.Formatter().parse(source))
+        except ValueError as e:
+            raise TemplateError(f"花括号不匹配: {e}")
+        for literal, field, spec, conversion in parsed:
+            if literal:
+                self._parts.append(literal)
+            if field is None:
+                continue
+            if field not in FIELDS:
+                raise TemplateError(f"未知的占位符 {{{field}}}")
+            if spec or conversion:
+                raise TemplateError(f"占位符 {{{field}}} 不支持格式说明")
+            self._slots.append((len(self._parts), field))
+            self._parts.append('')
+
+        checker = _TagChecker()
+        checker.feed(''.join(self._parts))
+        checker.close()
+        if checker.stack:
+            raise TemplateError(f"标签 <{checker.stack[-1]}> 没有闭合")
+
+    def render(self, values: Dict[str, str]) -> str:
+        parts = self._parts.copy()
+        for index, field in self._slots:
+            parts[index] = values[field]
+        return ''.join(parts)
+
+
+class AdFragments:
+    """
+    广告系统提供的标题、广告链接和广告按钮
+    渲染结果缓存 refresh_interval 秒（0 为每条告警都重新获取）
+    """
+
+    def __init__(self, refresh_interval: float = 60):
+        self.refresh_interval = refresh_interval
+        self.title = html.escape(DEFAULT_TITLE, quote=False)
+        self.ads = ''
+        # 广告按钮行（InlineKeyboardButton 列表）
+        self.buttons: List = []
+        self._loaded_at: Optional[float] = None
+
+    def get(self) -> 'AdFragments':
+        """返回最新的片段，缓存过期时先刷新"""
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at >= self.refresh_interval:
+            self.refresh()
+            self._loaded_at = now
+        return self
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def refresh(self):
+        from telegram import InlineKeyboardButton
+        from core.ad_integration import get_ad_service
+
+        try:
+            ad_service = get_ad_service()
+            manager = ad_service.manager if ad_service else None
+        except Exception as e:
+            logger.warning(f"获取广告服务失败: {e}")
+            manager = None
+
+        title = DEFAULT_TITLE
+        try:
+            header = manager.get_header() if manager else None
+            if header:
+                title = header.get('title', title)
+                if header.get('author'):
+                    title += f" {header['author']}"
+        except Exception as e:
+            logger.warning(f"获取header配置失败: {e}")
+        self.title = html.escape(title, quote=False)
+
+        ads = ''
+        try:
+            items = manager.get_ads() if manager else None
+            if items:
+                ads = "\n" + ''.join(
+                    f'🔗 <a href="{html.escape(ad["url"])}">{html.escape(ad["title"], quote=False)}</a>\n'
+                    for ad in items
+                )
+        except Exception as e:
+            logger.warning(f"获取广告链接失败: {e}")
+        self.ads = ads
+
+        buttons = []
+        try:
+            configs = manager.get_buttons() if manager else None
+            if configs:
+                buttons = [InlineKeyboardButton(btn["text"], url=btn["url"]) for btn in configs]
+        except Exception as e:
+            logger.warning(f"获取广告按钮失败: {e}")
+        self.buttons = buttons
+
+
+class AlertRenderer:
+    """告警模板 + 缓存的广告片段，并统计每条告警的格式化耗时"""
+
+    def __init__(self, refresh_interval: float = 60):
+        self.template = AlertTemplate(DEFAULT_TEMPLATE)
+        self.fragments = AdFragments(refresh_interval)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    @property
+    def is_default(self) -> bool:
+        return self.template.source == DEFAULT_TEMPLATE
+
+    def set_template(self, source: Optional[str]):
+        """更换模板，source 为空时恢复默认模板；格式错误时抛出 TemplateError"""
+        self.template = AlertTemplate(source or DEFAULT_TEMPLATE)
+
+    def render(self, **values: str) -> str:
+        fragments = self.fragments.get()
+        values['title'] = fragments.title
+        values['ads'] = fragments.ads
+        return self.template.render(values)
+
+    def record(self, seconds: float):
+        """记录一条告警的格式化耗时"""
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def get_stats(self) -> Dict:
+        return {
+            'count': self.count,
+            'total_ms': self.total_seconds * 1000,
+            'max_ms': self.max_seconds * 1000,
+            'custom': not self.is_default,
+        }
+
+    @staticmethod
+    def merge_stats(stats: List[Optional[Dict]]) -> Optional[Dict]:
+        """汇总多个工作进程的格式化耗时"""
+        stats = [item for item in stats if item]
+        if not stats:
+            return None
+        return {
+            'count': sum(item['count'] for item in stats),
+            'total_ms': sum(item['total_ms'] for item in stats),
+            'max_ms': max(item['max_ms'] for item in stats),
+            'custom': stats[0]['custom'],
+        }
@@ -0,0 +1,123 @@
+"""
+告警冷却模块
+同一发送者/同一群组反复命中同一关键词时，在冷却窗口内抑制告警，
+被抑制的次数累计到下一条放行的告警上显示
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, Optional, Tuple
+
+
+class CooldownTracker:
+    """
+    过期键集合
+    每个键记录冷却截止时间和冷却期间被抑制的次数。冷却窗口长度固定，
+    刷新时把键移到队尾，因此队列始终按截止时间有序，淘汰只需检查队首
+    """
+
+    def __init__(self, seconds: float, max_entries: int = 10000):
+        self.seconds = seconds
+        self.max_entries = max_entries
+        # 键 -> [冷却截止时间, 被抑制次数]
+        self._entries: "OrderedDict[Hashable, List]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.seconds > 0 and self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float):
+        """淘汰过期已久的键（过期后再保留一个窗口，等待下一条告警带走抑制计数）"""
+        entries = self._entries
+        expire_before = now - self.seconds
+        while entries:
+            expires_at, _ = next(iter(entries.values()))
+            if expires_at >= expire_before and len(entries) < self.max_entries:
+                break
+            entries.popitem(last=False)
+
+    def is_cooling(self, key: Hashable, now: float) -> bool:
+        """键是否处于冷却期"""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > now
+
+    def suppress(self, key: Hashable):
+        """记录一次抑制"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] += 1
+
+    def refresh(self, key: Hashable, now: float) -> int:
+        """开始新的冷却窗口，返回并清零之前累计的抑制次数"""
+        entry = self._entries.pop(key, None)
+        suppressed = entry[1] if entry else 0
+        self._evict(now)
+        self._entries[key] = [now + self.seconds, 0]
+        return suppressed
+
+
+class AlertThrottle:
+    """
+    告警节流
+    按 (发送者, 关键词) 和 (群组, 关键词) 两个维度分别冷却，
+    只要有一个命中的关键词不在冷却中，消息就放行。
+    放行时只刷新已过期（或尚未记录）的键，仍在冷却中的键保持原截止时间
+    """
+
+    def __init__(self, sender_seconds: float = 0, chat_seconds: float = 0,
+                 max_entries: int = 10000):
+        self._trackers = [
+            (tracker, scope)
+            for tracker, scope in (
+                (CooldownTracker(sender_seconds, max_entries), "sender"),
+                (CooldownTracker(chat_seconds, max_entries), "chat"),
+            )
+            if tracker.enabled
+        ]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._trackers)
+
+    def _keys(self, sender_id: Optional[int], chat_id: Optional[int],
+              keyword_id: int) -> List[Tuple[CooldownTracker, Tuple]]:
+        keys = []
+        for tracker, scope in self._trackers:
+            owner = sender_id if scope == "sender" else chat_id
+            if owner is not None:
+                keys.append((tracker, (owner, keyword_id)))
+        return keys
+
+    def check(self, sender_id: Optional[int], chat_id: Optional[int],
+              keyword_ids: Iterable[int]) -> Tuple[bool, int]:
+        """
+        检查一条命中消息是否放行
+        返回: (是否放行, 放行时带上的累计抑制次数)
+        """
+        now = time.monotonic()
+        per_keyword = [self._keys(sender_id, chat_id, kw_id) for kw_id in keyword_ids]
+
+        allowed = any(
+            not any(tracker.is_cooling(key, now) for tracker, key in keys)
+            for keys in per_keyword
+        )
+
+        if not allowed:
+            # 每条被抑制的消息只记一次，记在第一个冷却中的键上
+            for keys in per_keyword:
+                for tracker, key in keys:
+                    if tracker.is_cooling(key, now):
+                        tracker.suppress(key)
+                        return False, 0
+            return False, 0
+
+        # 冷却中的键不刷新，否则其他维度的命中会把它的窗口不断延后
+        suppressed = 0
+        for keys in per_keyword:
+            for tracker, key in keys:
+                if not tracker.is_cooling(key, now):
+                    suppressed += tracker.refresh(key, now)
+        return True, suppressed
@@ -9,7 +9,7 @@ from pathlib import Path
 from typing import Optional
 
 from decouple import config
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, create_engine
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Text, create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -23,7 +23,7 @@ class Keyword(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     content = Column(String(500), nullable=False, comment="关键词内容")
-    type = Column(Integer, default=1, comment="匹配类型: 0=全字,1=包含,2=正则,3=模糊,4=用户")
+    type = Column(Integer, default=1, comment="匹配类型: 0=全字,1=包含,2=正则,3=模糊,4=用户,5=表达式,6=邻近")
     action = Column(Integer, default=1, comment="执行动作: 0=排除,1=监控")
     
     # 样式设置 - 对应原项目的样式字段
@@ -39,6 +39,36 @@ class Keyword(Base):
     created_at = Column(DateTime, default=datetime.now, comment="创建时间")
 
 
+class KeywordStats(Base):
+    """关键词运行统计表 - 匹配耗时、命中次数与自动停用"""
+    __tablename__ = "keyword_stats"
+    
+    keyword_id = Column(Integer, primary_key=True, comment="关键词ID")
+    eval_count = Column(Integer, default=0, comment="单独执行次数（正则等不走共享扫描的规则）")
+    total_cost_ms = Column(Float, default=0.0, comment="单独执行累计耗时（毫秒）")
+    hit_count = Column(Integer, default=0, comment="命中次数")
+    last_hit_at = Column(DateTime, comment="最后命中时间")
+    disabled_at = Column(DateTime, comment="自动停用时间")
+    disabled_reason = Column(String(200), comment="停用原因")
+
+
+class KeywordChat(Base):
+    """关键词群组范围表 - 设置了范围的关键词只在这些群组生效"""
+    __tablename__ = "keyword_chats"
+    
+    keyword_id = Column(Integer, primary_key=True, comment="关键词ID")
+    chat_id = Column(Integer, primary_key=True, comment="群组ID（与消息的 chat_id 格式一致）")
+
+
+class UsernameCache(Base):
+    """用户名解析缓存表 - 用户匹配规则中的 @username 对应的用户ID"""
+    __tablename__ = "username_cache"
+    
+    username = Column(String(100), primary_key=True, comment="用户名（小写，不含@）")
+    user_id = Column(Integer, comment="用户ID，未找到时为空")
+    resolved_at = Column(DateTime, comment="解析时间")
+
+
 class SystemConfig(Base):
     """系统配置表"""
     __tablename__ = "system_config"
@@ -0,0 +1,315 @@
+"""
+告警去重模块
+同一内容在短时间内被发到多个群组时，只转发第一条，其余来源合并到已发送的告警中
+除精确哈希外，还通过 SimHash 识别只改动了个别字符/表情的近似重复内容
+"""
+
+import asyncio
+import hashlib
+import html
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# 归一化时折叠所有连续空白
+_WHITESPACE_RE = re.compile(r"\s+")
+# SimHash 只看文字和数字，忽略标点、表情等常被用来绕过去重的字符
+_NON_WORD_RE = re.compile(r"[\W_]+")
+# 告警是 HTML，长度按去掉标签后的可见文本计算
+_TAG_RE = re.compile(r"<[^>]+>")
+# Telegram 单条消息的长度上限（按 UTF-16 码元计）
+MAX_MESSAGE_LENGTH = 4096
+
+# SimHash 位切片累加表：把64位哈希的每一位展开到独立的16位计数槽中，
+# 多个哈希的展开值直接相加即可得到每一位的计数，避免逐位循环
+_LANE_BITS = 16
+_SPREAD_TABLES = [
+    [
+        sum(1 << ((byte_index * 8 + bit) * _LANE_BITS) for bit in range(8) if value >> bit & 1)
+        for value in range(256)
+    ]
+    for byte_index in range(8)
+]
+_LANE_MASK = (1 << _LANE_BITS) - 1
+
+
+def simhash(text: str, shingle_size: int = 2) -> int:
+    """计算文本的64位 SimHash（基于字符 n-gram，兼容中文）"""
+    compact = _NON_WORD_RE.sub("", text.casefold())
+    if len(compact) <= shingle_size:
+        shingles = {compact}
+    else:
+        shingles = {compact[i:i + shingle_size] for i in range(len(compact) - shingle_size + 1)}
+
+    t0, t1, t2, t3, t4, t5, t6, t7 = _SPREAD_TABLES
+    counts = 0
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        counts += (t0[h & 0xFF] + t1[h >> 8 & 0xFF] + t2[h >> 16 & 0xFF] + t3[h >> 24 & 0xFF]
+                   + t4[h >> 32 & 0xFF] + t5[h >> 40 & 0xFF] + t6[h >> 48 & 0xFF] + t7[h >> 56])
+
+    # 超过半数 n-gram 在该位为1，则指纹该位为1
+    half = len(shingles) / 2
+    fingerprint = 0
+    for bit in range(64):
+        if (counts >> (bit * _LANE_BITS) & _LANE_MASK) > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class SimHashIndex:
+    """
+    近似重复检索索引
+    指纹按位切成 max_distance+1 段，汉明距离不超过 max_distance 的两个指纹
+    至少有一段完全相同，因此只需比较同段桶内的候选
+    """
+
+    def __init__(self, max_distance: int = 3, max_entries: int = 5000):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        bands = max_distance + 1
+        width = 64 // bands
+        # (位移, 掩码)，最后一段吸收余下的位
+        self._bands = [
+            (i * width, (1 << (width if i < bands - 1 else 64 - i * width)) - 1)
+            for i in range(bands)
+        ]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        # 序号 -> (指纹, 写入时间, 关联对象)，按写入时间有序
+        self._items: "OrderedDict[int, Tuple[int, float, object]]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def evict(self, expire_before: float):
+        """淘汰过期记录，并为新记录腾出容量"""
+        items = self._items
+        while items:
+            item_id, (fingerprint, created_at, _) = next(iter(items.items()))
+            if created_at >= expire_before and len(items) < self.max_entries:
+                break
+            items.popitem(last=False)
+            for (shift, mask), table in zip(self._bands, self._tables):
+                band = fingerprint >> shift & mask
+                bucket = table[band]
+                bucket.remove(item_id)
+                if not bucket:
+                    del table[band]
+
+    def add(self, fingerprint: int, payload: object, now: float):
+        """写入一个指纹"""
+        item_id = self._next_id
+        self._next_id += 1
+        self._items[item_id] = (fingerprint, now, payload)
+        for (shift, mask), table in zip(self._bands, self._tables):
+            table.setdefault(fingerprint >> shift & mask, []).append(item_id)
+
+    def find(self, fingerprint: int) -> Optional[object]:
+        """查找汉明距离在阈值内的已有指纹，返回其关联对象"""
+        items = self._items
+        seen = set()
+        for (shift, mask), table in zip(self._bands, self._tables):
+            for item_id in table.get(fingerprint >> shift & mask, ()):
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                candidate, _, payload = items[item_id]
+                if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return payload
+        return None
+
+
+class DuplicateEntry:
+    """去重窗口中的一条记录"""
+
+    __slots__ = ("created_at", "alert_text", "reply_markup", "message_id",
+                 "sent", "released", "extra_sources", "edit_task")
+
+    def __init__(self, created_at: float):
+        self.created_at = created_at
+        self.alert_text: Optional[str] = None
+        self.reply_markup: Optional[str] = None
+        self.message_id: Optional[int] = None
+        # 首条告警发送完成后置位，合并编辑需要等待它
+        self.sent = asyncio.Event()
+        # 首条告警发送失败后撤销，不再吸收近似重复
+        self.released = False
+        self.extra_sources: List[str] = []
+        self.edit_task: Optional[asyncio.Task] = None
+
+
+class DuplicateWindow:
+    """
+    滚动内容哈希窗口
+    以归一化文本的哈希为键，按插入时间淘汰过期记录，并限制最大条目数
+    near_distance > 0 时同时维护 SimHash 索引，近似重复的内容归入同一条记录
+    """
+
+    def __init__(self, window_seconds: float = 60, max_entries: int = 5000,
+                 near_distance: int = 0, near_min_length: int = 16):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, DuplicateEntry]" = OrderedDict()
+        # 过短的文本 SimHash 区分度太低，不参与近似去重
+        self.near_min_length = near_min_length
+        self._near_index = SimHashIndex(near_distance, max_entries) if near_distance > 0 else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """归一化文本：忽略大小写和空白差异"""
+        return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+    @classmethod
+    def fingerprint(cls, text: str) -> bytes:
+        """计算归一化文本的内容哈希"""
+        return hashlib.blake2b(cls.normalize(text).encode("utf-8"), digest_size=16).digest()
+
+    def _evict(self, now: float):
+        """淘汰过期记录，并为新记录腾出容量（记录按插入时间有序）"""
+        entries = self._entries
+        expire_before = now - self.window_seconds
+        while entries:
+            entry = next(iter(entries.values()))
+            if entry.created_at >= expire_before and len(entries) < self.max_entries:
+                break
+            entries.popitem(last=False)
+        if self._near_index is not None:
+            self._near_index.evict(expire_before)
+
+    def claim(self, text: str) -> Tuple[bool, DuplicateEntry]:
+        """
+        登记一条内容
+        返回: (是否为窗口内首次出现, 对应记录)
+        首次出现时调用方负责发送告警并调用 mark_sent
+        """
+        now = time.monotonic()
+        self._evict(now)
+
+        key = self.fingerprint(text)
+        entry = self._entries.get(key)
+        if entry is not None:
+            # 近似重复登记的别名按登记顺序排在后面、淘汰不到，需按首条记录的时间判断是否过期
+            if entry.created_at >= now - self.window_seconds:
+                return False, entry
+            del self._entries[key]
+
+        near_hash = None
+        if self._near_index is not None and len(text) >= self.near_min_length:
+            near_hash = simhash(text)
+            entry = self._near_index.find(near_hash)
+            if entry is not None and not entry.released:
+                # 近似重复：登记精确哈希，后续完全相同的变体直接命中
+                self._entries[key] = entry
+                return False, entry
+
+        entry = DuplicateEntry(now)
+        self._entries[key] = entry
+        if near_hash is not None:
+            self._near_index.add(near_hash, entry, now)
+        return True, entry
+
+    def release(self, text: str, entry: DuplicateEntry):
+        """首条告警发送失败时撤销登记，让后续重复消息可以重新发送"""
+        key = self.fingerprint(text)
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+        entry.released = True
+        entry.sent.set()
+
+    @staticmethod
+    def mark_sent(entry: DuplicateEntry, message_id: Optional[int],
+                  alert_text: str, reply_markup: Optional[str]):
+        """记录首条告警的发送结果"""
+        entry.message_id = message_id
+        entry.alert_text = alert_text
+        entry.reply_markup = reply_markup
+        entry.sent.set()
+
+    @staticmethod
+    def _visible_length(text: str) -> int:
+        """HTML 文本解析后的长度（UTF-16 码元）"""
+        return len(html.unescape(_TAG_RE.sub("", text)).encode("utf-16-le")) // 2
+
+    @classmethod
+    def render(cls, entry: DuplicateEntry, max_sources: int = 20,
+               max_length: int = MAX_MESSAGE_LENGTH) -> str:
+        """
+        生成合并了额外来源的告警文本
+        来源超过 max_sources 条或全文超过 max_length 时只列出前面的来源，
+        末尾以 "+N" 行注明未列出的数量
+        """
+        total = len(entry.extra_sources)
+        header = f"{entry.alert_text}\n其他来源 ({total}):"
+        # 为末尾的 "+N" 行预留长度
+        budget = max_length - cls._visible_length(header) - len(f"\n… +{total} 个来源")
+        if budget < 0:
+            # 首条告警本身已接近上限，放不下来源列表
+            return entry.alert_text
+        lines = []
+        for source in entry.extra_sources[:max_sources]:
+            line = f"\n• {source}"
+            budget -= cls._visible_length(line)
+            if budget < 0:
+                break
+            lines.append(line)
+        if len(lines) < total:
+            lines.append(f"\n… +{total - len(lines)} 个来源")
+        return header + "".join(lines)
+
+
+class RecentMessage:
+    """最近处理过的一条消息"""
+
+    __slots__ = ("text_hash", "alert_id", "reply_markup")
+
+    def __init__(self, text_hash: bytes):
+        self.text_hash = text_hash
+        self.alert_id: Optional[int] = None
+        self.reply_markup: Optional[str] = None
+
+
+class RecentMessageCache:
+    """
+    最近消息缓存（LRU）
+    (chat_id, message_id) -> 上次参与匹配的文本哈希和已转发的告警，
+    用于编辑事件：文本没变就跳过，已有告警就原地更新
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], RecentMessage]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple[int, int]) -> Optional[RecentMessage]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def remember(self, key: Tuple[int, int], text_hash: bytes) -> RecentMessage:
+        """记录消息的最新文本哈希，保留已有的告警信息"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = RecentMessage(text_hash)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            entry.text_hash = text_hash
+            self._entries.move_to_end(key)
+        return entry
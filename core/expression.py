@@ -0,0 +1,165 @@
+"""
+关键词布尔表达式
+支持 AND / OR / NOT（不区分大小写）和括号，例如 (出 OR 收) AND USDT AND NOT 诈骗；
+含空格或括号的关键词用双引号括起来。优先级 NOT > AND > OR
+"""
+
+import re
+from typing import Callable, List, Tuple, Union
+
+# 语法树节点：('term', 关键词) / ('not', 子节点) / ('and' | 'or', (子节点, ...))
+Node = Tuple[str, Union[str, 'Node', Tuple['Node', ...]]]
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+_OPERATORS = {'AND', 'OR', 'NOT'}
+
+
+class ExpressionError(ValueError):
+    """表达式语法错误"""
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    """切分为 [(种类, 值)]，种类为 ( ) op term"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        found = _TOKEN.match(text, position)
+        if not found:
+            raise ExpressionError(f"第 {position + 1} 个字符附近有未闭合的引号")
+        position = found.end()
+        lparen, rparen, quoted, word = found.groups()
+        if lparen:
+            tokens.append(('(', lparen))
+        elif rparen:
+            tokens.append((')', rparen))
+        elif quoted is not None:
+            if not quoted.strip():
+                raise ExpressionError("引号内的关键词不能为空")
+            tokens.append(('term', quoted.strip()))
+        elif word.upper() in _OPERATORS:
+            tokens.append(('op', word.upper()))
+        else:
+            tokens.append(('term', word))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Tuple[str, str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else ('end', '')
+
+    def accept(self, kind: str, value: str = None) -> bool:
+        token_kind, token_value = self.peek()
+        if token_kind == kind and (value is None or token_value == value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self) -> Node:
+        node = self.parse_or()
+        kind, value = self.peek()
+        if kind != 'end':
+            if kind == ')':
+                raise ExpressionError("多余的右括号")
+            raise ExpressionError(f"“{value}”前缺少 AND / OR")
+        return node
+
+    def parse_or(self) -> Node:
+        children = [self.parse_and()]
+        while self.accept('op', 'OR'):
+            children.append(self.parse_and())
+        return _combine('or', children)
+
+    def parse_and(self) -> Node:
+        children = [self.parse_not()]
+        while self.accept('op', 'AND'):
+            children.append(self.parse_not())
+        return _combine('and', children)
+
+    def parse_not(self) -> Node:
+        if self.accept('op', 'NOT'):
+            child = self.parse_not()
+            # NOT NOT x 即 x
+            return child[1] if child[0] == 'not' else ('not', child)
+        return self.parse_atom()
+
+    def parse_atom(self) -> Node:
+        kind, value = self.peek()
+        if self.accept('('):
+            node = self.parse_or()
+            if not self.accept(')'):
+                raise ExpressionError("缺少右括号")
+            return node
+        if self.accept('term'):
+            return ('term', value)
+        if kind == 'end':
+            raise ExpressionError("表达式不完整")
+        raise ExpressionError(f"“{value}”的位置应为关键词或左括号")
+
+
+def _combine(op: str, children: List[Node]) -> Node:
+    """合并同类运算并去重，只有一个子节点时直接返回该子节点"""
+    flat: List[Node] = []
+    for child in children:
+        for item in (child[1] if child[0] == op else (child,)):
+            if item not in flat:
+                flat.append(item)
+    return flat[0] if len(flat) == 1 else (op, tuple(flat))
+
+
+def parse_expression(text: str) -> Node:
+    """解析表达式，语法错误时抛出 ExpressionError"""
+    tokens = _tokenize(text)
+    if not tokens:
+        raise ExpressionError("表达式不能为空")
+    return _Parser(tokens).parse()
+
+
+def evaluate(node: Node, has_term: Callable[[str], bool]) -> bool:
+    """按语法树求值，has_term 判断关键词是否出现"""
+    op = node[0]
+    if op == 'term':
+        return has_term(node[1])
+    if op == 'not':
+        return not evaluate(node[1], has_term)
+    if op == 'and':
+        return all(evaluate(child, has_term) for child in node[1])
+    return any(evaluate(child, has_term) for child in node[1])
+
+
+def map_terms(node: Node, transform: Callable[[str], str]) -> Node:
+    """返回关键词经过 transform 转换后的语法树（用于预先折叠大小写）"""
+    op = node[0]
+    if op == 'term':
+        return ('term', transform(node[1]))
+    if op == 'not':
+        return ('not', map_terms(node[1], transform))
+    return (op, tuple(map_terms(child, transform) for child in node[1]))
+
+
+def validate_expression(text: str) -> Node:
+    """
+    添加规则时校验表达式
+    除语法外还要求至少有一个关键词出现才可能成立，否则规则会命中所有消息
+    """
+    node = parse_expression(text)
+    if evaluate(node, lambda term: False):
+        raise ExpressionError("表达式在没有任何关键词出现时也成立，会命中所有消息")
+    return node
+
+
+def positive_terms(node: Node, negated: bool = False) -> List[str]:
+    """不在 NOT 之下（或在偶数层 NOT 之下）的关键词，即命中时可用于标注的关键词"""
+    op = node[0]
+    if op == 'term':
+        return [] if negated else [node[1]]
+    if op == 'not':
+        return positive_terms(node[1], not negated)
+    terms = []
+    for child in node[1]:
+        terms.extend(positive_terms(child, negated))
+    return terms
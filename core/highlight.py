@@ -0,0 +1,134 @@
+"""
+命中内容标注
+把各关键词的命中位置和样式渲染成 Telegram HTML：
+所有位置的起止点一次排序后顺序扫描，重叠部分取各关键词样式的并集，
+每一段只转义、包裹一次，输出长度与原文线性相关
+"""
+
+import html
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 样式位
+BOLD = 1
+ITALIC = 2
+UNDERLINE = 4
+STRIKETHROUGH = 8
+SPOILER = 16
+MONOSPACE = 32
+QUOTE = 64
+
+# Keyword 列 -> 样式位
+STYLE_COLUMNS = (
+    ('is_bold', BOLD),
+    ('is_italic', ITALIC),
+    ('is_underline', UNDERLINE),
+    ('is_strikethrough', STRIKETHROUGH),
+    ('is_spoiler', SPOILER),
+    ('is_monospace', MONOSPACE),
+    ('is_quote', QUOTE),
+)
+
+# 行内样式由外到内的包裹顺序
+_INLINE_TAGS = (
+    (BOLD, 'b'),
+    (ITALIC, 'i'),
+    (UNDERLINE, 'u'),
+    (STRIKETHROUGH, 's'),
+    (SPOILER, 'tg-spoiler'),
+)
+
+# 带样式的命中位置 (起始下标, 结束下标, 样式位)
+StyledSpan = Tuple[int, int, int]
+
+
+def keyword_style(keyword) -> int:
+    """关键词设置的样式位，未设置任何样式时为 0"""
+    style = 0
+    for column, bit in STYLE_COLUMNS:
+        if getattr(keyword, column, False):
+            style |= bit
+    return style
+
+
+def _inline(text: str, style: int) -> str:
+    """
+    渲染一段样式相同的文本
+    等宽文本不能再包含其他实体，只加 <code>
+    """
+    if style & MONOSPACE:
+        return f"<code>{text}</code>"
+    for bit, tag in reversed(_INLINE_TAGS):
+        if style & bit:
+            text = f"<{tag}>{text}</{tag}>"
+    return text
+
+
+class _Writer:
+    """按段输出，链接在行内样式的段之间保持打开，遇到引用、等宽的段才关闭"""
+
+    def __init__(self, link: Optional[str]):
+        self.href = html.escape(link) if link else None
+        self.parts: List[str] = []
+        self.linked = False
+
+    def close_link(self):
+        if self.linked:
+            self.parts.append("</a>")
+            self.linked = False
+
+    def segment(self, text: str, style: int):
+        if self.href and not style & (QUOTE | MONOSPACE):
+            if not self.linked:
+                self.parts.append(f'<a href="{self.href}">')
+                self.linked = True
+        else:
+            self.close_link()
+        self.parts.append(_inline(html.escape(text, quote=False), style))
+
+    def tag(self, tag: str):
+        self.close_link()
+        self.parts.append(tag)
+
+    def result(self) -> str:
+        self.close_link()
+        return ''.join(self.parts)
+
+
+def render_highlights(text: str, spans: Iterable[StyledSpan], link: Optional[str] = None) -> str:
+    """
+    按命中位置渲染带样式的 HTML 文本
+    spans: 原文上的 (起始, 结束, 样式位)，可以重叠；link 为整段文本的链接（引用和等宽部分除外）
+    """
+    # 每个边界上各样式位的计数变化
+    changes: Dict[int, List[Tuple[int, int]]] = {}
+    length = len(text)
+    for start, end, style in spans:
+        start, end = max(0, start), min(length, end)
+        if style and start < end:
+            changes.setdefault(start, []).append((style, 1))
+            changes.setdefault(end, []).append((style, -1))
+
+    writer = _Writer(link)
+    counts = [0] * QUOTE.bit_length()
+    position = 0
+    style = 0
+    for boundary in sorted(changes):
+        for bits, delta in changes[boundary]:
+            for index in range(len(counts)):
+                if bits >> index & 1:
+                    counts[index] += delta
+        new_style = sum(1 << index for index, count in enumerate(counts) if count)
+        if new_style == style:
+            continue
+        if boundary > position:
+            writer.segment(text[position:boundary], style)
+            position = boundary
+        # 连续的引用部分合并为一个 <blockquote>
+        if new_style & QUOTE and not style & QUOTE:
+            writer.tag("<blockquote>")
+        elif style & QUOTE and not new_style & QUOTE:
+            writer.tag("</blockquote>")
+        style = new_style
+    if position < length:
+        writer.segment(text[position:], style)
+    return writer.result()
@@ -0,0 +1,128 @@
+"""
+消息摄入队列
+Telethon 事件处理器只负责入队，由固定数量的工作协程消费。
+队列有界：消费跟不上时入队会等待，配合 sequential_updates 把背压传回更新循环，
+补拉大量积压时按块流过队列，而不是一次性全部堆在内存里。
+工作协程每次取出队列中已积压的一小批任务并发处理，
+配合 MatchBatcher 把同一批消息的关键词匹配合并成一次调用
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """有界消息摄入队列"""
+
+    def __init__(self, maxsize: int = 1000, workers: int = 4, batch_size: int = 1):
+        self.maxsize = maxsize
+        self.workers = max(1, workers)
+        # 每个工作协程一次最多取出的任务数
+        self.batch_size = max(1, batch_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        """启动工作协程"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"摄入队列已启动 | 容量: {self.maxsize} | 工作协程: {self.workers} | 批大小: {self.batch_size}")
+
+    async def stop(self):
+        """停止工作协程，丢弃尚未处理的消息"""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def put(self, handler: Callable[..., Awaitable], *args):
+        """入队一个待处理任务，队列满时等待"""
+        if self._queue is None:
+            return
+        await self._queue.put((handler, args))
+
+    async def _worker(self, index: int):
+        """工作协程：取出一批已积压的任务并发处理（没有积压时每批只有一个）"""
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                results = await asyncio.gather(
+                    *(handler(*args) for handler, args in batch), return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"摄入队列任务失败: {result}", exc_info=result)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+
+class MatchBatcher:
+    """
+    匹配请求合批
+    并发处理的消息各自调用 match，在 max_delay 内到达（或凑满 max_batch 条）的请求
+    合并为一次 match_many 调用，分摊扫描和跨进程分发的固定开销
+    """
+
+    def __init__(self, match_many: Callable[[List[Tuple]], Awaitable[List]],
+                 max_batch: int = 64, max_delay: float = 0.002):
+        self.match_many = match_many
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay)
+        self._pending: List[Tuple[Tuple, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def match(self, text: str, sender_id: Optional[int], chat_id: Optional[int]):
+        """提交一条消息，返回它的匹配结果"""
+        item = (text, sender_id, chat_id)
+        if self.max_batch == 1:
+            return (await self.match_many([item]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.create_task(self._run(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: Sequence[Tuple[Tuple, asyncio.Future]]):
+        try:
+            results = await self.match_many([item for item, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,310 @@
+"""
+进程间通信模块
+分进程模式下，Bot 界面进程通过本机回环地址上的 TCP 连接与监控工作进程通信（每行一个 JSON 请求/响应），
+Linux、macOS 和 Windows 上都可用；连接的第一行是进程池生成的随机令牌，本机其他进程无法冒充界面进程。
+关键词和黑名单的变更以增量形式推送给所有工作进程；
+工作进程也可以在同一连接上发送不带请求ID的事件（如上报慢规则），由界面进程统一处理
+"""
+
+import asyncio
+import hmac
+import itertools
+import json
+import logging
+import multiprocessing
+import secrets
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 单行消息上限，批量导入关键词时增量可能较大
+STREAM_LIMIT = 16 * 1024 * 1024
+
+# 只监听本机回环地址
+HOST = '127.0.0.1'
+
+
+def _encode(payload: Dict) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode()
+
+
+class WorkerServer:
+    """工作进程端：在回环地址的随机端口上监听，校验令牌后接收请求并分发给对应的处理函数"""
+
+    def __init__(self, token: str, handlers: Dict[str, Callable[..., Awaitable]]):
+        self.token = token.encode()
+        self.handlers = handlers
+        self._server: Optional[asyncio.AbstractServer] = None
+        # 已建立的连接及其处理任务
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        # 已通过令牌校验的连接（事件只发给它们）
+        self._authorized: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> int:
+        """开始监听，返回端口号"""
+        self._server = await asyncio.start_server(self._serve, HOST, 0, limit=STREAM_LIMIT)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            # 关闭已建立的连接，等连接处理任务读到结束后退出
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # 每个请求一个任务，监控启动等耗时请求不阻塞状态查询；
+        # 增量处理函数在第一个 await 之前就已生效，因此仍按到达顺序应用
+        tasks = set()
+        self._connections[writer] = asyncio.current_task()
+        try:
+            if not hmac.compare_digest((await reader.readline()).strip(), self.token):
+                logger.warning("拒绝令牌不正确的进程间连接")
+                return
+            self._authorized.add(writer)
+            while line := await reader.readline():
+                task = asyncio.create_task(self._dispatch(json.loads(line), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            self._connections.pop(writer, None)
+            self._authorized.discard(writer)
+            writer.close()
+
+    async def notify(self, event: str, **params):
+        """向界面进程发送事件（界面进程未连接时丢弃）"""
+        if not self._authorized:
+            logger.warning(f"界面进程未连接，丢弃事件 {event}")
+            return
+        for writer in list(self._authorized):
+            writer.write(_encode({'event': event, 'params': params}))
+            await writer.drain()
+
+    async def _dispatch(self, request: Dict, writer: asyncio.StreamWriter):
+        response = {'id': request.get('id')}
+        try:
+            handler = self.handlers[request['method']]
+            response['result'] = await handler(**request.get('params', {}))
+        except Exception as e:
+            logger.error(f"处理进程间请求 {request.get('method')} 失败: {e}", exc_info=True)
+            response['error'] = str(e)
+        writer.write(_encode(response))
+        await writer.drain()
+
+
+class WorkerClient:
+    """界面进程端：到单个工作进程的连接"""
+
+    def __init__(self, name: str, token: str, on_event: Callable[[str, Dict], Awaitable] = None):
+        self.name = name
+        self.token = token
+        self.on_event = on_event
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._event_tasks = set()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self, port: int):
+        """连接工作进程已在监听的端口，先发送令牌"""
+        self._reader, self._writer = await asyncio.open_connection(HOST, port, limit=STREAM_LIMIT)
+        self._writer.write(self.token.encode() + b"\n")
+        await self._writer.drain()
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+            await asyncio.gather(self._read_task, return_exceptions=True)
+            self._read_task = None
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending(ConnectionError("与工作进程的连接已关闭"))
+
+    async def call(self, method: str, timeout: float = 120, **params) -> Any:
+        """发送请求并等待结果，工作进程返回错误时抛出 RuntimeError"""
+        if not self.connected:
+            raise ConnectionError("未连接工作进程")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(_encode({'id': request_id, 'method': method, 'params': params}))
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_loop(self):
+        try:
+            while line := await self._reader.readline():
+                response = json.loads(line)
+                if 'event' in response:
+                    self._handle_event(response['event'], response.get('params', {}))
+                    continue
+                future = self._pending.get(response.get('id'))
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(RuntimeError(response['error']))
+                else:
+                    future.set_result(response.get('result'))
+        finally:
+            if self._writer:
+                self._writer.close()
+                self._writer = None
+            self._fail_pending(ConnectionError("工作进程连接已断开"))
+
+    def _handle_event(self, event: str, params: Dict):
+        if self.on_event is None:
+            return
+        task = asyncio.create_task(self.on_event(event, params))
+        self._event_tasks.add(task)
+        task.add_done_callback(self._event_tasks.discard)
+
+    def _fail_pending(self, error: Exception):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+
+class WorkerPool:
+    """监控工作进程池：启动、监督并与各工作进程通信"""
+
+    def __init__(self, count: int, check_interval: float = 5, start_timeout: float = 60,
+                 events: Dict[str, Callable[..., Awaitable]] = None):
+        self.count = max(1, count)
+        self.check_interval = check_interval
+        self.start_timeout = start_timeout
+        # 工作进程发来的事件的处理函数 {事件名: 处理函数}
+        self.events = events or {}
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * self.count
+        self._token = secrets.token_hex(16)
+        self.clients: List[WorkerClient] = [
+            WorkerClient(f"monitor-worker-{index}", self._token, self._on_event) for index in range(self.count)
+        ]
+        # 界面上是否处于监控状态，工作进程重启后据此恢复
+        self.monitoring = False
+        self._watch_task: Optional[asyncio.Task] = None
+        self._context = multiprocessing.get_context('spawn')
+
+    async def start(self):
+        """启动所有工作进程并建立连接"""
+        for index in range(self.count):
+            await self._spawn(index)
+        self._watch_task = asyncio.create_task(self._watch())
+        logger.info(f"✓ 已启动 {self.count} 个监控工作进程")
+
+    async def stop(self):
+        """停止所有工作进程"""
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+
+        for client in self.clients:
+            await client.close()
+        for process in self.processes:
+            if process and process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            if process:
+                await asyncio.to_thread(process.join, 10)
+
+    async def _spawn(self, index: int):
+        from core.worker import run_worker
+
+        # 工作进程开始监听后通过管道告知端口号
+        port_reader, port_writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=run_worker,
+            args=(index, self.count, self._token, port_writer),
+            name=self.clients[index].name,
+            daemon=True,
+        )
+        process.start()
+        port_writer.close()
+        self.processes[index] = process
+        try:
+            port = await asyncio.to_thread(self._wait_port, port_reader, index)
+        finally:
+            port_reader.close()
+        await self.clients[index].connect(port)
+
+    def _wait_port(self, port_reader, index: int) -> int:
+        if not port_reader.poll(self.start_timeout):
+            raise TimeoutError(f"等待工作进程 {index} 就绪超时")
+        try:
+            return port_reader.recv()
+        except EOFError:
+            raise ConnectionError(f"工作进程 {index} 启动失败（退出码: {self.processes[index].exitcode}）")
+
+    async def _watch(self):
+        """工作进程意外退出时重新拉起，并恢复监控状态"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for index, process in enumerate(self.processes):
+                if process and process.is_alive():
+                    continue
+                logger.warning(f"⚠️ 监控工作进程 {index} 已退出（退出码: {process.exitcode if process else None}），正在重启")
+                try:
+                    await self.clients[index].close()
+                    await self._spawn(index)
+                    if self.monitoring:
+                        await self.clients[index].call('start_monitoring')
+                except Exception as e:
+                    logger.error(f"重启监控工作进程 {index} 失败: {e}")
+
+    async def _on_event(self, event: str, params: Dict):
+        handler = self.events.get(event)
+        if handler is None:
+            logger.warning(f"忽略未知的工作进程事件: {event}")
+            return
+        try:
+            await handler(**params)
+        except Exception as e:
+            logger.error(f"处理工作进程事件 {event} 失败: {e}", exc_info=True)
+
+    async def call(self, method: str, index: int = 0, **params) -> Any:
+        """向指定工作进程发送请求（默认主账号所在的 0 号进程）"""
+        return await self.clients[index].call(method, **params)
+
+    async def broadcast(self, method: str, **params) -> List[Any]:
+        """向所有工作进程发送请求，失败的进程结果为 None"""
+        results = await asyncio.gather(
+            *(client.call(method, **params) for client in self.clients), return_exceptions=True
+        )
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"工作进程 {index} 处理 {method} 失败: {result}")
+        return [None if isinstance(result, Exception) else result for result in results]
+
+
+# 全局工作进程池（仅分进程模式下存在）
+_worker_pool: Optional[WorkerPool] = None
+
+
+def set_worker_pool(pool: Optional[WorkerPool]):
+    global _worker_pool
+    _worker_pool = pool
+
+
+def get_worker_pool() -> Optional[WorkerPool]:
+    return _worker_pool
+
+
+async def publish(method: str, **params):
+    """把变更推送给所有工作进程，单进程模式下不做任何事"""
+    if _worker_pool is not None:
+        await _worker_pool.broadcast(method, **params)
@@ -0,0 +1,123 @@
+"""
+分片匹配进程池
+规则集很大（大量正则）时单个事件循环进程的一个核会被匹配占满，
+把规则分片到多个独立进程，每条消息批次分发给所有分片并行匹配后合并结果
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.matcher import MessageTuple, RuleIndex
+
+logger = logging.getLogger(__name__)
+
+# 分片进程内的规则索引
+_shard_index: Optional[RuleIndex] = None
+
+
+def _load_shard(rows: List[Dict]) -> int:
+    """在分片进程内编译规则，返回规则数"""
+    global _shard_index
+    _shard_index = RuleIndex(rows)
+    return _shard_index.size
+
+
+def _match_shard(messages: Sequence[MessageTuple]) -> Tuple[List[List[int]], Dict[int, List]]:
+    """在分片进程内匹配一批消息，同时返回单独执行的规则耗时"""
+    costs: Dict[int, List] = {}
+    if _shard_index is None:
+        return [[] for _ in messages], costs
+    return _shard_index.match_batch(messages, costs), costs
+
+
+def split_rows(rows: List[Dict], shards: int) -> List[List[Dict]]:
+    """
+    把规则均匀分到各分片
+    按类型排序后轮流分配，每个分片的正则数量基本相同，避免某个分片成为瓶颈
+    """
+    parts: List[List[Dict]] = [[] for _ in range(shards)]
+    for position, row in enumerate(sorted(rows, key=lambda r: (r['type'], r['id']))):
+        parts[position % shards].append(row)
+    return parts
+
+
+class ShardedMatcher:
+    """
+    分片匹配器
+    每个分片是一个单进程的执行器：规则只在加载时发送一次，由分片进程自行编译并常驻；
+    同一分片上的加载和匹配按提交顺序执行，新规则加载后提交的批次一定使用新规则
+    """
+
+    def __init__(self, shards: int):
+        self.shards = max(1, shards)
+        # spawn 的分片进程在打包后的单文件程序中依赖 main.py 入口的 freeze_support()
+        self._context = multiprocessing.get_context('spawn')
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * self.shards
+        self._rows: List[Dict] = []
+
+    def _executor(self, shard: int) -> ProcessPoolExecutor:
+        executor = self._executors[shard]
+        if executor is None:
+            executor = self._executors[shard] = ProcessPoolExecutor(max_workers=1, mp_context=self._context)
+        return executor
+
+    def load(self, rows: List[Dict]):
+        """把规则分片发送给各进程（不等待编译完成）"""
+        self._rows = list(rows)
+        for shard, part in enumerate(split_rows(self._rows, self.shards)):
+            self._submit_load(shard, part)
+
+    def _submit_load(self, shard: int, part: List[Dict]):
+        future = self._executor(shard).submit(_load_shard, part)
+
+        def done(f: Future):
+            if f.cancelled() or f.exception():
+                logger.error(f"分片 {shard} 加载规则失败: {None if f.cancelled() else f.exception()}")
+            else:
+                logger.debug(f"分片 {shard} 已加载 {f.result()} 条规则")
+
+        future.add_done_callback(done)
+
+    def _restart(self, shard: int):
+        """分片进程异常退出后重建并重新加载规则"""
+        executor = self._executors[shard]
+        self._executors[shard] = None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"⚠️ 匹配分片 {shard} 进程已退出，正在重启")
+        self._submit_load(shard, split_rows(self._rows, self.shards)[shard])
+
+    async def match_batch(self, messages: Sequence[MessageTuple],
+                          costs: Optional[Dict[int, List]] = None) -> List[List[int]]:
+        """把一批消息分发给所有分片，合并每条消息在各分片的命中（以及规则耗时）"""
+        messages = list(messages)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._executor(shard), _match_shard, messages)
+            for shard in range(self.shards)
+        ), return_exceptions=True)
+
+        merged: List[List[int]] = [[] for _ in messages]
+        for shard, result in enumerate(results):
+            if isinstance(result, BrokenProcessPool):
+                self._restart(shard)
+                result = await loop.run_in_executor(self._executor(shard), _match_shard, messages)
+            elif isinstance(result, Exception):
+                raise result
+            shard_hits, shard_costs = result
+            for hits, hits_in_shard in zip(merged, shard_hits):
+                hits.extend(hits_in_shard)
+            if costs is not None:
+                # 规则只属于一个分片，不会重复
+                costs.update(shard_costs)
+        return merged
+
+    def shutdown(self):
+        for executor in self._executors:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = [None] * self.shards
@@ -0,0 +1,876 @@
+"""
+关键词匹配索引
+把关键词规则编译成一次构建、多次使用的索引：
+全字匹配走字典查找，包含/模糊匹配的字面量汇入同一个 Aho-Corasick 自动机一次扫描，
+正则预编译并提取必需字面量注册到同一个自动机，字面量没出现的正则不执行，
+布尔表达式编译成共享的求值图、叶子为自动机的字面量，
+邻近匹配直接使用自动机报告的出现位置，用户匹配按发送者ID直接查表；
+限定了群组范围的规则编入各群组的附加索引，只在来自这些群组的消息上匹配
+"""
+
+import asyncio
+import inspect
+import logging
+import re
+import time
+from collections import deque
+from typing import Awaitable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+
+from core.expression import ExpressionError, Node, evaluate, map_terms, parse_expression, positive_terms
+from core.normalize import get_normalizer, normalize_rule
+from core.proximity import ProximityError, find_ends, is_near, parse_proximity
+
+try:
+    from re import _parser as sre_parse
+    from re._casefix import _EXTRA_CASES
+except ImportError:  # Python < 3.11
+    import sre_parse
+    _EXTRA_CASES = None
+
+logger = logging.getLogger(__name__)
+
+# 批量匹配的消息 (文本, 发送者ID, 聊天ID)
+MessageTuple = Tuple[str, Optional[int], Optional[int]]
+
+
+def fold_case(text: str) -> str:
+    """
+    不区分大小写时的比较形式
+    与 str.lower() 一致，个别字符小写后变长时只取首字符，保证位置与原文一一对应
+    """
+    folded = text.lower()
+    if len(folded) != len(text):
+        folded = ''.join(ch.lower()[0] for ch in text)
+    return folded
+
+
+def _timed_search(rule_id: int, pattern: re.Pattern, text: str, costs: Optional[Dict[int, List]]) -> bool:
+    """执行单条正则，costs 不为 None 时累加该规则的 [执行次数, 耗时秒]"""
+    if costs is None:
+        return pattern.search(text) is not None
+    started = time.perf_counter()
+    hit = pattern.search(text) is not None
+    elapsed = time.perf_counter() - started
+    entry = costs.get(rule_id)
+    if entry is None:
+        costs[rule_id] = [1, elapsed]
+    else:
+        entry[0] += 1
+        entry[1] += elapsed
+    return hit
+
+
+# 正则的必需字面量：(字面量, 是否区分大小写) 的集合，匹配的文本中至少出现其中一个
+LiteralFactor = FrozenSet[Tuple[str, bool]]
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT}
+if hasattr(sre_parse, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(sre_parse.POSSESSIVE_REPEAT)
+
+
+def _foldable(ch: str) -> bool:
+    """忽略大小写时该字符能否用 fold_case 后的文本比较（re 对少数字符有额外的等价关系）"""
+    if _EXTRA_CASES is None:
+        return ch.isascii()
+    lowered = ch.lower()
+    return len(lowered) == 1 and ord(lowered) not in _EXTRA_CASES
+
+
+def _best_factor(factors: List[LiteralFactor]) -> Optional[LiteralFactor]:
+    """在多个必需因子中选最有区分度的：最短字面量最长，其次候选最少"""
+    if not factors:
+        return None
+    return max(factors, key=lambda factor: (min(len(text) for text, _ in factor), -len(factor)))
+
+
+def _literal_factors(items, ignorecase: bool) -> List[LiteralFactor]:
+    """
+    遍历正则语法树，返回所有必需因子（每个因子都必须出现）
+    连续的字面量字符组成一个因子；分组、至少重复一次的子模式取其最佳因子；
+    分支要求每个分支都有因子，合并为"出现其一即可"的因子
+    """
+    factors: List[LiteralFactor] = []
+    run: List[str] = []
+
+    def close_run():
+        if run:
+            text = ''.join(run)
+            factors.append(frozenset({(fold_case(text) if ignorecase else text, not ignorecase)}))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            ch = chr(av)
+            if not ignorecase or _foldable(ch):
+                run.append(ch)
+                continue
+            close_run()
+            continue
+
+        close_run()
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            sub_ignorecase = (ignorecase or bool(add_flags & re.IGNORECASE)) and not del_flags & re.IGNORECASE
+            factor = _best_factor(_literal_factors(sub, sub_ignorecase))
+        elif op is sre_parse.BRANCH:
+            branches = [_best_factor(_literal_factors(branch, ignorecase)) for branch in av[1]]
+            factor = frozenset().union(*branches) if branches and all(branches) else None
+        elif op in _REPEATS and av[0] >= 1:
+            factor = _best_factor(_literal_factors(av[2], ignorecase))
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            factor = _best_factor(_literal_factors(av, ignorecase))
+        else:
+            # 字符集、任意字符、断言、反向引用等：只打断字面量
+            factor = None
+        if factor:
+            factors.append(factor)
+    close_run()
+    return factors
+
+
+def required_literals(pattern: str, flags: int = 0) -> Optional[LiteralFactor]:
+    """
+    提取正则的必需字面量
+    返回的集合中至少有一个会出现在任何能匹配的文本里；无法提取时返回 None（正则每次都要执行）
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+        return _best_factor(_literal_factors(parsed, bool(parsed.state.flags & re.IGNORECASE)))
+    except Exception:
+        return None
+
+
+class Automaton:
+    """Aho-Corasick 多模式自动机，一次扫描找出文本中出现的所有模式"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态结束的模式编号（构建后包含失败链上的输出）
+        self._out: List[Tuple[int, ...]] = [()]
+        self._index: Dict[str, int] = {}
+        self.patterns: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def add(self, pattern: str) -> int:
+        """添加模式，返回模式编号（相同模式只保存一份）"""
+        index = self._index.get(pattern)
+        if index is not None:
+            return index
+
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][ch] = nxt
+            state = nxt
+
+        index = self._index[pattern] = len(self.patterns)
+        self.patterns.append(pattern)
+        self._out[state] += (index,)
+        return index
+
+    def build(self):
+        """添加完所有模式后计算失败链"""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+                queue.append(nxt)
+
+    def scan(self, text: str) -> List[Tuple[int, int]]:
+        """扫描文本，返回 [(模式结束位置, 模式编号)]，结束位置为最后一个字符的下标"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        state = 0
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.extend((position, index) for index in out[state])
+        return found
+
+
+class RuleIndex:
+    """
+    编译后的规则索引
+    rows 为规则列值（id/content/type/action/is_case_sensitive ...，chats 为群组范围），
+    规则文本在编译时归一化，match 的文本需由调用方先用同一个归一化函数处理，
+    返回命中的规则ID（含排除规则，由调用方决定如何处理）
+    """
+
+    def __init__(self, rows: Iterable[Dict], scoped: bool = True):
+        self.size = 0
+        # 群组ID -> 只在该群组生效的规则索引（scoped=False 时忽略群组范围）
+        self._overlays: Dict[int, 'RuleIndex'] = {}
+        # 全字匹配：比较形式 -> 规则ID
+        self._exact: Dict[str, List[int]] = {}
+        self._exact_cs: Dict[str, List[int]] = {}
+        # 字面量：编号 -> 原文 / 是否区分大小写 / 依赖它的规则 / 以它为预过滤的正则
+        self._literal_ids: Dict[Tuple[str, bool], int] = {}
+        self._literal_text: List[str] = []
+        self._literal_cs: List[bool] = []
+        self._literal_rules: List[List[int]] = []
+        self._literal_regexes: List[List[int]] = []
+        # 自动机模式编号 -> 字面量编号
+        self._pattern_literals: List[List[int]] = []
+        # 规则需要命中的不同字面量个数
+        self._required: Dict[int, int] = {}
+        # 正则：有必需字面量的只在字面量出现时执行，其余每次都执行
+        self._regexes: List[Tuple[int, re.Pattern]] = []
+        self._unfiltered_regexes: List[int] = []
+        self._users: Dict[int, List[int]] = {}
+        # 布尔表达式求值图：所有表达式的相同子表达式只保存一个节点，子节点编号小于父节点
+        self._node_ids: Dict[Tuple, int] = {}
+        self._node_op: List[str] = []
+        self._node_children: List[Tuple[int, ...]] = []
+        self._node_parents: List[List[int]] = []
+        # 没有任何字面量出现时节点的值
+        self._node_base: List[bool] = []
+        self._literal_nodes: Dict[int, int] = {}
+        # 根节点 -> 规则ID；没有字面量出现时也成立的根节点
+        self._expr_rules: Dict[int, List[int]] = {}
+        self._base_true_roots: List[int] = []
+        # 邻近匹配：(规则ID, 字面量A, 字面量B, 最大距离, 是否有序)，以及字面量 -> 用到它的邻近规则
+        self._proximity: List[Tuple[int, int, int, int, bool]] = []
+        self._literal_proximity: Dict[int, List[int]] = {}
+        self._automaton = Automaton()
+
+        scoped_rows: Dict[int, List[Dict]] = {}
+        for row in rows:
+            chats = row.get('chats') if scoped else None
+            if chats:
+                for chat_id in chats:
+                    scoped_rows.setdefault(chat_id, []).append(row)
+                self.size += 1
+            else:
+                self._add_rule(row)
+        self._automaton.build()
+        for chat_id, chat_rows in scoped_rows.items():
+            self._overlays[chat_id] = RuleIndex(chat_rows, scoped=False)
+
+    def _add_literal(self, text: str, case_sensitive: bool) -> int:
+        key = (text, case_sensitive)
+        literal = self._literal_ids.get(key)
+        if literal is None:
+            literal = self._literal_ids[key] = len(self._literal_text)
+            self._literal_text.append(text)
+            self._literal_cs.append(case_sensitive)
+            self._literal_rules.append([])
+            self._literal_regexes.append([])
+
+            pattern = self._automaton.add(fold_case(text))
+            if pattern == len(self._pattern_literals):
+                self._pattern_literals.append([])
+            self._pattern_literals[pattern].append(literal)
+        return literal
+
+    def _add_node(self, key: Tuple, children: Tuple[int, ...], base: bool) -> int:
+        node = self._node_ids.get(key)
+        if node is None:
+            node = self._node_ids[key] = len(self._node_op)
+            self._node_op.append(key[0])
+            self._node_children.append(children)
+            self._node_parents.append([])
+            self._node_base.append(base)
+            for child in children:
+                self._node_parents[child].append(node)
+        return node
+
+    def _add_expression(self, expression: Node, case_sensitive: bool) -> int:
+        """把语法树编译进求值图，返回根节点"""
+        op = expression[0]
+        if op == 'term':
+            literal = self._add_literal(expression[1], case_sensitive)
+            node = self._add_node(('term', literal), (), False)
+            self._literal_nodes[literal] = node
+            return node
+        if op == 'not':
+            child = self._add_expression(expression[1], case_sensitive)
+            return self._add_node(('not', child), (child,), not self._node_base[child])
+        children = tuple(sorted({self._add_expression(item, case_sensitive) for item in expression[1]}))
+        bases = [self._node_base[child] for child in children]
+        return self._add_node((op, children), children, all(bases) if op == 'and' else any(bases))
+
+    def _match_expressions(self, literals: Iterable[int]) -> List[int]:
+        """
+        增量求值：只重新计算出现的字面量向上能到达的节点，
+        其余节点保持没有字面量出现时的值
+        """
+        affected = set()
+        stack = [self._literal_nodes[literal] for literal in literals if literal in self._literal_nodes]
+        while stack:
+            node = stack.pop()
+            if node not in affected:
+                affected.add(node)
+                stack.extend(self._node_parents[node])
+
+        base = self._node_base
+        values: Dict[int, bool] = {}
+        for node in sorted(affected):
+            op = self._node_op[node]
+            if op == 'term':
+                value = True
+            elif op == 'not':
+                child = self._node_children[node][0]
+                value = not values.get(child, base[child])
+            elif op == 'and':
+                value = all(values.get(child, base[child]) for child in self._node_children[node])
+            else:
+                value = any(values.get(child, base[child]) for child in self._node_children[node])
+            values[node] = value
+
+        matched = []
+        for root in self._base_true_roots:
+            if root not in values:
+                matched.extend(self._expr_rules[root])
+        for node, value in values.items():
+            if value and node in self._expr_rules:
+                matched.extend(self._expr_rules[node])
+        return matched
+
+    def _add_rule(self, row: Dict):
+        rule_id, kw_type = row['id'], row['type']
+        content = normalize_rule(row['content'], kw_type)
+        case_sensitive = bool(row.get('is_case_sensitive'))
+
+        if kw_type == 0:  # 全字匹配
+            if case_sensitive:
+                self._exact_cs.setdefault(content, []).append(rule_id)
+            else:
+                self._exact.setdefault(fold_case(content), []).append(rule_id)
+
+        elif kw_type in (1, 3):  # 包含匹配 / 模糊匹配（多个关键词用?分隔，全部出现才算命中）
+            terms = [content] if kw_type == 1 else [t.strip() for t in content.split('?') if t.strip()]
+            literals = {self._add_literal(term, case_sensitive) for term in terms if term}
+            if not literals:
+                return
+            for literal in literals:
+                self._literal_rules[literal].append(rule_id)
+            self._required[rule_id] = len(literals)
+
+        elif kw_type == 2:  # 正则表达式
+            try:
+                pattern = re.compile(content, 0 if case_sensitive else re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"忽略无法编译的正则规则 {rule_id}: {e}")
+                return
+            factor = required_literals(content, pattern.flags)
+            if factor:
+                for text, literal_cs in factor:
+                    self._literal_regexes[self._add_literal(text, literal_cs)].append(len(self._regexes))
+            else:
+                self._unfiltered_regexes.append(len(self._regexes))
+            self._regexes.append((rule_id, pattern))
+
+        elif kw_type == 4:  # 用户匹配
+            try:
+                user_id = int(content.lstrip('@'))
+            except ValueError:
+                # 用户名规则使用添加时解析、后台刷新的用户ID
+                user_id = row.get('user_id')
+                if user_id is None:
+                    return
+            self._users.setdefault(user_id, []).append(rule_id)
+
+        elif kw_type == 5:  # 布尔表达式
+            try:
+                expression = parse_expression(content)
+            except ExpressionError as e:
+                logger.warning(f"忽略无法解析的表达式规则 {rule_id}: {e}")
+                return
+            root = self._add_expression(expression, case_sensitive)
+            self._expr_rules.setdefault(root, []).append(rule_id)
+            if self._node_base[root] and len(self._expr_rules[root]) == 1:
+                self._base_true_roots.append(root)
+
+        elif kw_type == 6:  # 邻近匹配
+            try:
+                first, second, distance, ordered = parse_proximity(content)
+            except ProximityError as e:
+                logger.warning(f"忽略无法解析的邻近规则 {rule_id}: {e}")
+                return
+            first_literal = self._add_literal(first, case_sensitive)
+            second_literal = self._add_literal(second, case_sensitive)
+            for literal in {first_literal, second_literal}:
+                self._literal_proximity.setdefault(literal, []).append(len(self._proximity))
+            self._proximity.append((rule_id, first_literal, second_literal, distance, ordered))
+
+        else:
+            return
+        self.size += 1
+
+    def _match_proximity(self, positions: Dict[int, List[int]]) -> List[int]:
+        """两个字面量都出现的邻近规则按出现位置判断距离"""
+        candidates = set()
+        for literal in positions:
+            candidates.update(self._literal_proximity[literal])
+        matched = []
+        for position in candidates:
+            rule_id, first, second, distance, ordered = self._proximity[position]
+            if first in positions and second in positions and is_near(
+                    positions[first], len(self._literal_text[first]),
+                    positions[second], len(self._literal_text[second]), distance, ordered):
+                matched.append(rule_id)
+        return matched
+
+    def match(self, text: str, sender_id: Optional[int] = None, chat_id: Optional[int] = None,
+              costs: Optional[Dict[int, List]] = None) -> List[int]:
+        """匹配一条消息，返回命中的规则ID；costs 用于统计单独执行的规则耗时"""
+        folded = fold_case(text)
+        matched = list(self._exact.get(folded, ()))
+        matched.extend(self._exact_cs.get(text, ()))
+
+        # 一次扫描得到出现的字面量，区分大小写的字面量再核对原文
+        regexes = self._unfiltered_regexes
+        if self._literal_text:
+            hits = set()
+            # 邻近规则用到的字面量记录每次出现的结尾位置
+            positions: Dict[int, List[int]] = {}
+            for end, pattern in self._automaton.scan(folded):
+                for literal in self._pattern_literals[pattern]:
+                    positional = literal in self._literal_proximity
+                    if literal in hits and not positional:
+                        continue
+                    if self._literal_cs[literal]:
+                        raw = self._literal_text[literal]
+                        if text[end - len(raw) + 1:end + 1] != raw:
+                            continue
+                    hits.add(literal)
+                    if positional:
+                        positions.setdefault(literal, []).append(end)
+
+            counts: Dict[int, int] = {}
+            fired = set()
+            for literal in hits:
+                for rule_id in self._literal_rules[literal]:
+                    counts[rule_id] = counts.get(rule_id, 0) + 1
+                fired.update(self._literal_regexes[literal])
+            matched.extend(rule_id for rule_id, count in counts.items() if count == self._required[rule_id])
+            if fired:
+                regexes = list(fired) + regexes
+            if self._expr_rules:
+                matched.extend(self._match_expressions(hits))
+            if positions:
+                matched.extend(self._match_proximity(positions))
+
+        for position in regexes:
+            rule_id, pattern = self._regexes[position]
+            if _timed_search(rule_id, pattern, text, costs):
+                matched.append(rule_id)
+
+        if sender_id is not None:
+            matched.extend(self._users.get(sender_id, ()))
+
+        overlay = self._overlays.get(chat_id) if self._overlays else None
+        if overlay is not None:
+            matched.extend(overlay.match(text, sender_id, chat_id, costs))
+        return matched
+
+    def match_batch(self, messages: Sequence[MessageTuple],
+                    costs: Optional[Dict[int, List]] = None) -> List[List[int]]:
+        """批量匹配，返回与 messages 一一对应的命中规则ID"""
+        return [self.match(text, sender_id, chat_id, costs) for text, sender_id, chat_id in messages]
+
+
+class DeltaIndex:
+    """
+    最近新增规则的小索引
+    不构建自动机，逐条检查；新增一条规则只需编译这一条，合并进主索引前数量很少
+    """
+
+    __slots__ = ('_entries',)
+
+    def __init__(self, entries: Tuple = ()):
+        # (规则ID, 类型, 是否区分大小写, 编译后的数据, 群组范围)
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _compile(row: Dict) -> Optional[Tuple]:
+        kw_type = row['type']
+        content = normalize_rule(row['content'], kw_type)
+        case_sensitive = bool(row.get('is_case_sensitive'))
+        fold = (lambda value: value) if case_sensitive else fold_case
+
+        if kw_type == 0:
+            data = fold(content)
+        elif kw_type in (1, 3):
+            terms = [content] if kw_type == 1 else [t.strip() for t in content.split('?') if t.strip()]
+            data = tuple(fold(term) for term in terms if term)
+            if not data:
+                return None
+        elif kw_type == 2:
+            try:
+                data = re.compile(content, 0 if case_sensitive else re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"忽略无法编译的正则规则 {row['id']}: {e}")
+                return None
+        elif kw_type == 4:
+            try:
+                data = int(content.lstrip('@'))
+            except ValueError:
+                data = row.get('user_id')
+                if data is None:
+                    return None
+        elif kw_type == 5:
+            try:
+                data = map_terms(parse_expression(content), fold)
+            except ExpressionError as e:
+                logger.warning(f"忽略无法解析的表达式规则 {row['id']}: {e}")
+                return None
+        elif kw_type == 6:
+            try:
+                first, second, distance, ordered = parse_proximity(content)
+            except ProximityError as e:
+                logger.warning(f"忽略无法解析的邻近规则 {row['id']}: {e}")
+                return None
+            data = (fold(first), fold(second), distance, ordered)
+        else:
+            return None
+        chats = frozenset(row['chats']) if row.get('chats') else None
+        return row['id'], kw_type, case_sensitive, data, chats
+
+    def without(self, rule_id: int) -> 'DeltaIndex':
+        return DeltaIndex(tuple(entry for entry in self._entries if entry[0] != rule_id))
+
+    def with_rule(self, row: Dict) -> 'DeltaIndex':
+        """返回加入（或替换）一条规则后的新索引，原索引不变"""
+        delta = self.without(row['id'])
+        entry = self._compile(row)
+        return DeltaIndex(delta._entries + (entry,)) if entry else delta
+
+    def match(self, text: str, sender_id: Optional[int] = None, chat_id: Optional[int] = None,
+              costs: Optional[Dict[int, List]] = None) -> List[int]:
+        folded = None
+        matched = []
+        for rule_id, kw_type, case_sensitive, data, chats in self._entries:
+            if chats is not None and chat_id not in chats:
+                continue
+            if kw_type == 2:
+                hit = _timed_search(rule_id, data, text, costs)
+            elif kw_type == 4:
+                hit = sender_id == data
+            else:
+                if case_sensitive:
+                    subject = text
+                else:
+                    subject = folded = folded if folded is not None else fold_case(text)
+                if kw_type == 0:
+                    hit = subject == data
+                elif kw_type == 5:
+                    hit = evaluate(data, subject.__contains__)
+                elif kw_type == 6:
+                    first, second, distance, ordered = data
+                    hit = is_near(find_ends(subject, first), len(first),
+                                  find_ends(subject, second), len(second), distance, ordered)
+                else:
+                    hit = all(term in subject for term in data)
+            if hit:
+                matched.append(rule_id)
+        return matched
+
+
+# 命中位置 (起始下标, 结束下标)，左闭右开
+Span = Tuple[int, int]
+
+
+def _term_spans(term: str, text: str, folded: str, case_sensitive: bool) -> List[Span]:
+    if not case_sensitive:
+        term, text = fold_case(term), folded
+    return [(end - len(term) + 1, end + 1) for end in find_ends(text, term)] if term else []
+
+
+def rule_spans(row: Dict, text: str) -> List[Span]:
+    """
+    一条命中规则在（归一化后的）文本中的命中位置，用于告警中标注匹配内容
+    只在转发前对命中的规则调用，不进入匹配热路径；用户匹配规则没有位置
+    """
+    kw_type = row['type']
+    content = normalize_rule(row['content'], kw_type)
+    case_sensitive = bool(row.get('is_case_sensitive'))
+    folded = text if case_sensitive else fold_case(text)
+
+    if kw_type == 0:
+        return [(0, len(text))] if text else []
+    if kw_type == 2:
+        try:
+            pattern = re.compile(content, 0 if case_sensitive else re.IGNORECASE)
+        except re.error:
+            return []
+        return [found.span() for found in pattern.finditer(text) if found.end() > found.start()]
+    if kw_type == 1:
+        terms = [content]
+    elif kw_type == 3:
+        terms = [t.strip() for t in content.split('?')]
+    elif kw_type == 5:
+        try:
+            terms = positive_terms(parse_expression(content))
+        except ExpressionError:
+            return []
+    elif kw_type == 6:
+        try:
+            terms = parse_proximity(content)[:2]
+        except ProximityError:
+            return []
+    else:
+        return []
+    spans = []
+    for term in dict.fromkeys(terms):
+        spans.extend(_term_spans(term, text, folded, case_sensitive))
+    return spans
+
+
+class RuleSnapshot:
+    """
+    规则快照
+    主索引 + 增量索引 + 删除标记三层：主索引很大且只在合并时重建，
+    新增/修改的规则进入增量索引，删除或被修改的旧规则记入删除标记。
+    快照创建后不再修改，匹配过程中始终使用同一个快照，不会读到构建了一半的索引
+    """
+
+    __slots__ = ('version', 'main_rules', 'index', 'delta_rows', 'delta', 'tombstones',
+                 'built_at', 'build_seconds')
+
+    def __init__(self, version: int, main_rules: Dict[int, Dict], index: Optional[RuleIndex],
+                 built_at: float, build_seconds: float, delta_rows: Dict[int, Dict] = None,
+                 delta: DeltaIndex = None, tombstones: frozenset = frozenset()):
+        self.version = version
+        # 主索引的规则 {规则ID: 列值}，分片模式下主索引在分片进程中，index 为 None
+        self.main_rules = main_rules
+        self.index = index
+        self.built_at = built_at
+        self.build_seconds = build_seconds
+        self.delta_rows = delta_rows or {}
+        self.delta = delta or DeltaIndex()
+        # 主索引中已删除或已被增量替换的规则ID
+        self.tombstones = tombstones
+
+    def __len__(self) -> int:
+        return len(self.main_rules) - len(self.tombstones) + len(self.delta_rows)
+
+    @property
+    def pending(self) -> int:
+        """尚未合并进主索引的变更数"""
+        return len(self.delta_rows) + len(self.tombstones)
+
+    def rule(self, rule_id: int) -> Optional[Dict]:
+        row = self.delta_rows.get(rule_id)
+        if row is None and rule_id not in self.tombstones:
+            row = self.main_rules.get(rule_id)
+        return row
+
+    def rows(self) -> Dict[int, Dict]:
+        """三层合并后的完整规则表"""
+        rules = {rule_id: row for rule_id, row in self.main_rules.items() if rule_id not in self.tombstones}
+        rules.update(self.delta_rows)
+        return rules
+
+    def apply(self, version: int, op: str, rows: List[Dict] = None, ids: List[int] = None) -> 'RuleSnapshot':
+        """返回应用一次变更后的新快照，开销只与变更的规则和增量大小有关"""
+        delta_rows = dict(self.delta_rows)
+        delta = self.delta
+        tombstones = set(self.tombstones)
+        if op == 'upsert':
+            for row in rows or []:
+                if row['id'] in self.main_rules:
+                    tombstones.add(row['id'])
+                delta_rows[row['id']] = row
+                delta = delta.with_rule(row)
+        elif op == 'delete':
+            for rule_id in ids or []:
+                if rule_id in self.main_rules:
+                    tombstones.add(rule_id)
+                if delta_rows.pop(rule_id, None) is not None:
+                    delta = delta.without(rule_id)
+        return RuleSnapshot(version, self.main_rules, self.index, self.built_at, self.build_seconds,
+                            delta_rows, delta, frozenset(tombstones))
+
+
+class RuleMatcher:
+    """
+    进程内的规则匹配器
+    匹配读取当前快照；单条变更直接生成带新增量的快照，
+    增量和删除标记超过 delta_threshold 时在后台线程把三层合并成新的主索引后原子替换，
+    合并期间到达的变更在替换时重放。shards > 0 时主索引在独立的分片进程中匹配；
+    消息文本在进入索引前统一归一化一次
+    """
+
+    def __init__(self, shards: int = 0, delta_threshold: int = 256):
+        self.snapshot: Optional[RuleSnapshot] = None
+        self.delta_threshold = max(1, delta_threshold)
+        self._version = 0
+        # 规则运行统计（可选，需提供 record(costs, hits) 和 reset(ids)）
+        self.stats = None
+        # 构建主索引期间到达的变更 [(序号, op, rows, ids)]，新索引生效时重放
+        self._seq = 0
+        self._log: List[Tuple[int, str, Optional[List[Dict]], Optional[List[int]]]] = []
+        self._merge_task: Optional[asyncio.Task] = None
+        # 构建锁：全量加载和后台合并串行执行，并发的首次加载不会各自构建一份主索引
+        self._merge_lock = asyncio.Lock()
+        self.pool = None
+        if shards > 0:
+            from core.match_pool import ShardedMatcher
+            self.pool = ShardedMatcher(shards)
+
+    @property
+    def loaded(self) -> bool:
+        return self.snapshot is not None
+
+    @property
+    def rules(self) -> Dict[int, Dict]:
+        """当前完整的规则表"""
+        return self.snapshot.rows() if self.snapshot else {}
+
+    async def load(self, rows: Union[Iterable[Dict], Awaitable[Iterable[Dict]]]):
+        """
+        加载全部规则并构建主索引
+        rows 也可以是读取规则的协程：读取和构建期间到达的变更先记入日志，主索引生效时按顺序重放
+        """
+        async with self._merge_lock:
+            seq = self._seq
+            started = time.perf_counter()
+            if inspect.isawaitable(rows):
+                rows = await rows
+            await self._build({row['id']: row for row in rows}, seq, started)
+
+    def apply_delta(self, op: str, rows: List[Dict] = None, ids: List[int] = None):
+        """
+        应用规则增量
+        op: upsert（rows 为规则列值）或 delete（ids 为规则ID）
+        正在构建主索引时同时记入变更日志；尚未加载且没有加载进行中时忽略（之后的加载会读到最新规则）
+        """
+        if op == 'upsert' and self.stats:
+            self.stats.reset(row['id'] for row in rows or [])
+        # 日志只在构建期间记录、生效时清空，长度不超过一次构建期间到达的变更数
+        if self._merge_lock.locked():
+            self._seq += 1
+            self._log.append((self._seq, op, rows, ids))
+        if self.snapshot is None:
+            return
+        self._version += 1
+        self.snapshot = self.snapshot.apply(self._version, op, rows, ids)
+
+        if self.snapshot.pending >= self.delta_threshold and (
+                self._merge_task is None or self._merge_task.done()):
+            self._merge_task = asyncio.get_running_loop().create_task(self._merge_loop())
+
+    async def _merge_loop(self):
+        while self.snapshot.pending >= self.delta_threshold:
+            try:
+                await self._merge()
+            except Exception as e:
+                logger.error(f"合并规则索引失败: {e}", exc_info=True)
+                return
+
+    async def _merge(self):
+        """把当前快照的三层合并成新的主索引"""
+        async with self._merge_lock:
+            seq = self._seq
+            started = time.perf_counter()
+            rules = await asyncio.to_thread(self.snapshot.rows)
+            await self._build(rules, seq, started)
+
+    async def _build(self, rules: Dict[int, Dict], seq: int, started: float):
+        """构建新的主索引，替换时重放序号大于 seq 的变更（调用方持有构建锁）"""
+        if self.pool:
+            # 分片按提交顺序先加载再匹配，之后提交的批次一定使用新的主索引
+            self.pool.load(list(rules.values()))
+            index = None
+        else:
+            index = await asyncio.to_thread(RuleIndex, rules.values())
+
+        self._version += 1
+        merged = RuleSnapshot(self._version, rules, index, time.time(), time.perf_counter() - started)
+        for entry_seq, op, rows, ids in self._log:
+            if entry_seq > seq:
+                self._version += 1
+                merged = merged.apply(self._version, op, rows, ids)
+        self._log = []
+        self.snapshot = merged
+        logger.info(f"规则主索引 v{merged.version} 已生效 | 规则: {len(merged)} | "
+                    f"构建耗时: {merged.build_seconds * 1000:.0f}ms")
+
+    async def match_batch(self, messages: Sequence[MessageTuple]) -> List[List[Dict]]:
+        """批量匹配，返回与 messages 一一对应的命中规则列值（同一批次使用同一个快照）"""
+        snapshot = self.snapshot
+        normalizer = get_normalizer()
+        if normalizer:
+            messages = [(normalizer(text), sender_id, chat_id) for text, sender_id, chat_id in messages]
+        costs: Dict[int, List] = {}
+        if self.pool:
+            main_hits = await self.pool.match_batch(messages, costs)
+        else:
+            main_hits = snapshot.index.match_batch(messages, costs)
+
+        results = []
+        for (text, sender_id, chat_id), hits in zip(messages, main_hits):
+            if snapshot.tombstones:
+                hits = [rule_id for rule_id in hits if rule_id not in snapshot.tombstones]
+            if snapshot.delta:
+                hits.extend(snapshot.delta.match(text, sender_id, chat_id, costs))
+            # 分片进程可能已换上更新的主索引（如分片重启后按最新规则重新加载），
+            # 而本批次仍使用旧快照的增量，同一规则会在两层各命中一次，按规则ID去重
+            results.append([row for row in map(snapshot.rule, dict.fromkeys(hits)) if row is not None])
+
+        if self.stats:
+            self.stats.record(costs, (row['id'] for rows in results for row in rows))
+        return results
+
+    def locate(self, text: str, rule_ids: Iterable[int]) -> Dict[int, List[Span]]:
+        """
+        命中规则在原文中的位置 {规则ID: [(起始, 结束)]}
+        在归一化文本上查找，再按归一化映射换算回原文下标；已被删除的规则不返回
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return {}
+        normalizer = get_normalizer()
+        normalized = normalizer(text) if normalizer else text
+        offsets = normalizer.offsets(text) if normalizer else None
+
+        located = {}
+        for rule_id in rule_ids:
+            row = snapshot.rule(rule_id)
+            if row is None:
+                continue
+            spans = rule_spans(row, normalized)
+            if offsets is not None:
+                spans = [(offsets[start], offsets[end - 1] + 1) for start, end in spans]
+            located[rule_id] = spans
+        return located
+
+    def get_status(self) -> Optional[Dict]:
+        """当前快照的版本、规则数和构建信息，尚未加载时返回 None"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        return {
+            'version': snapshot.version,
+            'rules': len(snapshot),
+            'built_at': snapshot.built_at,
+            'build_ms': snapshot.build_seconds * 1000,
+            'delta': len(snapshot.delta_rows),
+            'tombstones': len(snapshot.tombstones),
+            'pending': self._merge_task is not None and not self._merge_task.done(),
+        }
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
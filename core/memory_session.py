@@ -0,0 +1,230 @@
+"""
+内存会话
+Telethon 默认的 SQLite 会话在收到更新时会频繁写实体和更新状态。
+这里把实体和更新状态放在内存里，由定时任务按间隔、或在关闭时批量写回同一个 .session 文件，
+文件格式与 SQLiteSession 完全一致，可以直接沿用已有的会话文件
+"""
+
+import asyncio
+import atexit
+import datetime
+import logging
+import time
+import weakref
+from typing import Dict, Optional, Set, Tuple
+
+from telethon import utils
+from telethon.sessions import SQLiteSession
+from telethon.tl import types
+from telethon.tl.types import PeerChannel, PeerChat, PeerUser
+
+logger = logging.getLogger(__name__)
+
+# 尚未关闭的内存会话，进程退出时统一写回；弱引用，不会让已替换的旧客户端无法回收
+_open_sessions: "weakref.WeakSet[MemoryBackedSession]" = weakref.WeakSet()
+
+
+def _close_open_sessions():
+    for session in list(_open_sessions):
+        try:
+            session.close()
+        except Exception as e:
+            logger.warning(f"退出时写回内存会话失败: {e}")
+
+
+atexit.register(_close_open_sessions)
+
+
+class MemoryBackedSession(SQLiteSession):
+    """内存会话 - 读写走内存，定期刷回 SQLite"""
+
+    def __init__(self, session_id: str, flush_interval: float = 60):
+        # 父类初始化过程中会调用 save()，相关属性需要先就位
+        self.flush_interval = flush_interval
+        self._entity_rows: Dict[int, Tuple] = {}
+        self._ids_by_username: Dict[str, int] = {}
+        self._ids_by_phone: Dict[str, int] = {}
+        self._states: Dict[int, types.updates.State] = {}
+        self._dirty_entities: Set[int] = set()
+        self._dirty_states: Set[int] = set()
+        # 授权密钥/数据中心变化必须立即落盘
+        self._force_flush = False
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+
+        super().__init__(session_id)
+        self._load()
+        _open_sessions.add(self)
+
+    def _load(self):
+        """把会话文件中的实体和更新状态读入内存"""
+        c = self._cursor()
+        try:
+            for row in c.execute('select id, hash, username, phone, name, date from entities'):
+                self._index_entity(row)
+            for entity_id, pts, qts, date, seq in c.execute('select id, pts, qts, date, seq from update_state'):
+                self._states[entity_id] = types.updates.State(
+                    pts=pts, qts=qts,
+                    date=datetime.datetime.fromtimestamp(date, tz=datetime.timezone.utc),
+                    seq=seq, unread_count=0
+                )
+        finally:
+            c.close()
+        logger.info(f"内存会话已加载 | 实体: {len(self._entity_rows)} | 更新状态: {len(self._states)}")
+
+    def _index_entity(self, row: Tuple):
+        """写入实体行并维护用户名/手机号索引"""
+        entity_id, _, username, phone, _, _ = row
+        old = self._entity_rows.get(entity_id)
+        if old:
+            if old[2] and self._ids_by_username.get(old[2]) == entity_id:
+                del self._ids_by_username[old[2]]
+            if old[3] and self._ids_by_phone.get(old[3]) == entity_id:
+                del self._ids_by_phone[old[3]]
+
+        self._entity_rows[entity_id] = row
+        # 同一用户名以最新的实体为准，与 SQLiteSession 的处理一致
+        if username:
+            self._ids_by_username[username] = entity_id
+        if phone:
+            self._ids_by_phone[phone] = entity_id
+
+    # 会话表（授权密钥等）仍直接写 SQLite，但要求下次 save() 立即提交
+    def _update_session_table(self):
+        super()._update_session_table()
+        self._force_flush = True
+
+    # 实体
+
+    def process_entities(self, tlo):
+        if not self.save_entities:
+            return
+
+        rows = self._entities_to_rows(tlo)
+        if not rows:
+            return
+
+        now = int(time.time())
+        for row in rows:
+            self._index_entity(row + (now,))
+            self._dirty_entities.add(row[0])
+
+    def _entity_result(self, entity_id: Optional[int]):
+        row = self._entity_rows.get(entity_id) if entity_id is not None else None
+        return (row[0], row[1]) if row else None
+
+    def get_entity_rows_by_phone(self, phone):
+        return self._entity_result(self._ids_by_phone.get(phone))
+
+    def get_entity_rows_by_username(self, username):
+        return self._entity_result(self._ids_by_username.get(username))
+
+    def get_entity_rows_by_name(self, name):
+        return next(((row[0], row[1]) for row in self._entity_rows.values() if row[4] == name), None)
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        if exact:
+            return self._entity_result(id)
+
+        for peer_id in (utils.get_peer_id(PeerUser(id)),
+                        utils.get_peer_id(PeerChat(id)),
+                        utils.get_peer_id(PeerChannel(id))):
+            result = self._entity_result(peer_id)
+            if result:
+                return result
+        return None
+
+    # 更新状态
+
+    def get_update_state(self, entity_id):
+        return self._states.get(entity_id)
+
+    def set_update_state(self, entity_id, state):
+        self._states[entity_id] = state
+        self._dirty_states.add(entity_id)
+
+    def get_update_states(self):
+        return list(self._states.items())
+
+    # 持久化
+
+    def save(self):
+        """Telethon 会频繁调用 save()，这里只在到达间隔或有必须落盘的变化时写回
+
+        客户端 connect() 时会在事件循环中调用 save()，此时启动定期写回任务，
+        保证没有新的 save() 调用时内存中的变化也会按间隔落盘
+        """
+        self._start_flush_task()
+        if self._force_flush or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _start_flush_task(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 父类初始化等不在事件循环中的调用
+            return
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """定期写回任务，close() 时取消"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not (self._dirty_entities or self._dirty_states or self._force_flush):
+                continue
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"定期写回内存会话失败: {e}")
+
+    def _stop_flush_task(self):
+        task, self._flush_task = self._flush_task, None
+        # 进程退出时事件循环可能已关闭，任务随循环一起结束
+        if task is not None and not task.done() and not task.get_loop().is_closed():
+            task.cancel()
+
+    def flush(self):
+        """把内存中的变化批量写回会话文件"""
+        c = self._cursor()
+        try:
+            if self._dirty_entities:
+                c.executemany(
+                    'insert or replace into entities values (?,?,?,?,?,?)',
+                    [self._entity_rows[entity_id] for entity_id in self._dirty_entities]
+                )
+            if self._dirty_states:
+                c.executemany(
+                    'insert or replace into update_state values (?,?,?,?,?)',
+                    [
+                        (entity_id, state.pts, state.qts, state.date.timestamp(), state.seq)
+                        for entity_id, state in ((i, self._states[i]) for i in self._dirty_states)
+                    ]
+                )
+        finally:
+            c.close()
+
+        super().save()
+        self._dirty_entities.clear()
+        self._dirty_states.clear()
+        self._force_flush = False
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def close(self):
+        """关闭前停止定期写回并写回所有变化"""
+        _open_sessions.discard(self)
+        self._stop_flush_task()
+        if self.filename != ':memory:':
+            self.flush()
+        super().close()
+
+    def delete(self):
+        self._entity_rows.clear()
+        self._ids_by_username.clear()
+        self._ids_by_phone.clear()
+        self._states.clear()
+        self._dirty_entities.clear()
+        self._dirty_states.clear()
+        return super().delete()
@@ -0,0 +1,198 @@
+"""
+匹配前的文本归一化
+把 NFKC 兼容分解、全角转半角、零宽字符剔除、繁体转简体、形近字（西里尔/希腊字母冒充拉丁字母）
+预先合并成一张 str.translate 映射表，规则和消息都经过同一张表，整个归一化只需扫描一遍文本。
+启用的步骤由 MATCH_NORMALIZE 配置（形近字默认不启用），留空则不做归一化
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+STEPS = ('nfkc', 'width', 'zero_width', 't2s', 'confusables')
+# 形近字会改写真实的西里尔/希腊文，默认不启用
+DEFAULT_STEPS = ('nfkc', 'width', 'zero_width', 't2s')
+
+# 零宽及不可见的格式字符
+_ZERO_WIDTH = (
+    '\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e'
+    '\u200b\u200c\u200d\u200e\u200f\u202a\u202b\u202c\u202d\u202e'
+    '\u2060\u2061\u2062\u2063\u2064\u2066\u2067\u2068\u2069\u3164\ufeff\uffa0'
+) + ''.join(chr(cp) for cp in range(0xFE00, 0xFE10))
+
+# 常见冒充拉丁字母的西里尔/希腊字母（小写形式），大写形式由 _confusables_table 按大小写对应补全，
+# 保证先归一化再忽略大小写与先忽略大小写再归一化结果一致；
+# 只收录大小写两种形式都像同一个拉丁字母的，希腊字母 ν/Ν、η/Η、μ/Μ、υ/Υ 等大小写形似不同字母的不收录
+_CONFUSABLES = {
+    'а': 'a', 'в': 'b', 'е': 'e', 'ѕ': 's', 'і': 'i', 'ј': 'j', 'к': 'k', 'м': 'm', 'н': 'h',
+    'о': 'o', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ԁ': 'd', 'һ': 'h', 'ү': 'y',
+    'ԛ': 'q', 'ԝ': 'w', 'ɡ': 'g', 'α': 'a', 'β': 'b', 'ε': 'e', 'ι': 'i', 'κ': 'k', 'ο': 'o',
+    'ρ': 'p', 'τ': 't', 'χ': 'x',
+}
+
+# 常用繁体字 -> 简体字（每项两个字符：繁 简）
+_T2S_PAIRS = """
+萬万 與与 醜丑 專专 業业 叢丛 東东 絲丝 丟丢 兩两 嚴严 喪丧 個个 豐丰 臨临 為为 麗丽 舉举 麼么 義义
+烏乌 樂乐 喬乔 習习 鄉乡 書书 買买 亂乱 爭争 於于 虧亏 雲云 亞亚 產产 畝亩 親亲 億亿 僅仅 從从 侖仑
+倉仓 儀仪 們们 價价 眾众 優优 會会 傘伞 偉伟 傳传 傷伤 倫伦 偽伪 體体 餘余 傭佣 僉佥 俠侠 侶侣 僥侥
+偵侦 側侧 僑侨 儈侩 儕侪 儂侬 儔俦 儼俨 倆俩 儷俪 儉俭 債债 傾倾 僂偻 僕仆 儲储 兒儿 兌兑 黨党 蘭兰
+關关 興兴 茲兹 養养 獸兽 內内 岡冈 冊册 寫写 軍军 農农 馮冯 衝冲 決决 況况 凍冻 淨净 涼凉 減减 湊凑
+凜凛 幾几 鳳凤 憑凭 凱凯 擊击 鑿凿 劃划 劉刘 則则 剛刚 創创 刪删 別别 劊刽 劑剂 劍剑 劇剧 勸劝 辦办
+務务 動动 勵励 勁劲 勞劳 勢势 勳勋 勻匀 區区 醫医 華华 協协 單单 賣卖 盧卢 鹵卤 臥卧 衛卫 卻却 廠厂
+廳厅 曆历 歷历 厲厉 壓压 厭厌 廁厕 縣县 參参 雙双 發发 變变 敘叙 疊叠 葉叶 號号 嘆叹 嚇吓 呂吕 嗎吗
+噸吨 聽听 啟启 吳吴 嘔呕 唄呗 員员 嗆呛 嗚呜 詠咏 嚨咙 響响 啞哑 嘩哗 喚唤 嘖啧 嘮唠 喲哟 嘍喽 嚕噜
+團团 園园 圍围 國国 圖图 圓圆 聖圣 場场 壞坏 塊块 堅坚 壇坛 壩坝 塢坞 墳坟 墜坠 壟垄 壘垒 墾垦 墊垫
+塹堑 墮堕 壺壶 處处 備备 復复 複复 夠够 頭头 誇夸 夾夹 奪夺 奮奋 獎奖 奧奥 妝妆 婦妇 媽妈 嫵妩 姍姗
+婁娄 嬌娇 娛娱 嫻娴 嬰婴 嬸婶 孫孙 學学 寧宁 寶宝 實实 寵宠 審审 憲宪 宮宫 寬宽 賓宾 寢寝 對对 尋寻
+導导 壽寿 將将 爾尔 塵尘 嘗尝 堯尧 尷尴 屍尸 盡尽 層层 屆届 屬属 屢屡 嶼屿 歲岁 豈岂 嶇岖 崗岗 嵐岚
+島岛 嶺岭 巖岩 巒峦 崢峥 幣币 帥帅 師师 帳帐 帶带 幀帧 幫帮 幹干 乾干 並并 廣广 莊庄 慶庆 廬庐 庫库
+應应 廟庙 龐庞 廢废 開开 異异 棄弃 張张 彌弥 彎弯 彈弹 強强 歸归 當当 錄录 彙汇 彥彦 徹彻 徑径 後后
+憶忆 懺忏 憂忧 懷怀 態态 慫怂 憐怜 總总 戀恋 懇恳 惡恶 慟恸 愷恺 惻恻 惱恼 悅悦 懸悬 慣惯 驚惊 懼惧
+慘惨 懲惩 憊惫 愜惬 慚惭 憚惮 願愿 懾慑 戲戏 戰战 戶户 撲扑 執执 擴扩 掃扫 揚扬 擾扰 撫抚 搶抢 護护
+報报 擔担 擬拟 攏拢 揀拣 擁拥 攔拦 擰拧 撥拨 擇择 掛挂 摯挚 撈捞 損损 撿捡 換换 搗捣 據据 擄掳 擺摆
+攜携 攝摄 搖摇 數数 斂敛 斃毙 鬥斗 斬斩 斷断 時时 曠旷 晝昼 顯显 晉晋 曬晒 曉晓 暈晕 暫暂 曖暧 術术
+機机 殺杀 雜杂 權权 條条 來来 楊杨 極极 構构 槍枪 楓枫 櫃柜 檸柠 檢检 樓楼 欄栏 樣样 標标 歡欢 歐欧
+殘残 氣气 漢汉 湯汤 溝沟 沒没 滬沪 淚泪 潑泼 澤泽 潔洁 灑洒 濁浊 測测 濟济 渾浑 濃浓 濤涛 渦涡 漲涨
+滲渗 濕湿 溫温 滿满 濾滤 濫滥 潛潜 滅灭 燈灯 災灾 爐炉 點点 煉炼 爍烁 燒烧 煙烟 熱热 營营 爺爷 牆墙
+獨独 獲获 猶犹 獄狱 瑪玛 環环 現现 瑣琐 電电 畫画 暢畅 療疗 瘋疯 癢痒 皚皑 盜盗 監监 蓋盖 盤盘 睜睁
+礦矿 碼码 磚砖 確确 禮礼 禍祸 離离 種种 積积 稱称 穩稳 窮穷 竊窃 競竞 筆笔 筍笋 築筑 簡简 糧粮 緊紧
+紅红 約约 級级 紀纪 純纯 紗纱 納纳 紙纸 紛纷 線线 綫线 練练 組组 細细 終终 結结 給给 絕绝 統统 經经
+綠绿 維维 綜综 網网 緒绪 編编 緣缘 縮缩 績绩 織织 繩绳 繼继 續续 繫系 係系 罰罚 罷罢 羅罗 聯联 聰聪
+職职 腦脑 腫肿 膚肤 脅胁 臉脸 艦舰 艙舱 節节 蘇苏 藥药 莖茎 薦荐 萊莱 蓮莲 蘿萝 螢萤 蟲虫 蝦虾 蠟蜡
+補补 裝装 製制 襲袭 裡里 裏里 見见 規规 視视 覽览 覺觉 觀观 訂订 計计 訊讯 討讨 訓训 記记 講讲 許许
+論论 設设 訪访 證证 評评 識识 詐诈 訴诉 診诊 詞词 試试 話话 該该 詳详 誠诚 認认 誤误 說说 請请 諸诸
+讀读 課课 誰谁 調调 談谈 謝谢 謀谋 謎谜 譯译 議议 讓让 註注 詢询 貝贝 負负 財财 貢贡 貨货 販贩 貪贪
+貧贫 責责 貴贵 貸贷 費费 貿贸 資资 賊贼 賬账 賭赌 賺赚 購购 贈赠 贊赞 賠赔 賴赖 趕赶 趙赵 躍跃 蹤踪
+車车 軟软 載载 較较 輔辅 輕轻 輛辆 輸输 轉转 辭辞 邊边 遼辽 達达 遷迁 過过 運运 還还 這这 進进 遠远
+違违 連连 遲迟 適适 選选 遺遗 鄭郑 鄰邻 醬酱 釋释 針针 釣钓 鈔钞 鈴铃 鉛铅 銀银 銷销 鋒锋 錢钱 錯错
+鍵键 鎖锁 鏈链 鐵铁 鑰钥 長长 門门 閃闪 閉闭 問问 閒闲 間间 閱阅 闊阔 陽阳 陰阴 陣阵 陳陈 陸陆 際际
+險险 隨随 隱隐 難难 雞鸡 霧雾 靈灵 靜静 韓韩 頁页 頂顶 項项 順顺 須须 預预 領领 頻频 題题 額额 顏颜
+風风 飛飞 飯饭 飲饮 飽饱 餅饼 館馆 馬马 駕驾 騙骗 驗验 騰腾 鬆松 魚鱼 鮮鲜 鳥鸟 鴨鸭 麥麦 黃黄 齊齐
+齒齿 龍龙 龜龟 匯汇 虛虚 擬拟 戶户 廣广 優优 導导 網网 場场 娛娱 體体 戲戏 衆众 啓启 峯峰 綁绑
+""".split()
+
+
+def _pairs_table(pairs: Iterable[str]) -> Dict[int, str]:
+    return {ord(pair[0]): pair[1] for pair in pairs if len(pair) == 2 and pair[0] != pair[1]}
+
+
+def _confusables_table() -> Dict[int, str]:
+    """形近字映射表，小写和对应的大写形式同时映射"""
+    table = {}
+    for src, dst in _CONFUSABLES.items():
+        table[ord(src)] = dst
+        upper = src.upper()
+        if len(upper) == 1 and upper != src and upper.lower() == src:
+            table[ord(upper)] = dst.upper()
+    return table
+
+
+def _step_tables() -> Dict[str, Dict[int, str]]:
+    """各步骤的单字映射表"""
+    nfkc = {}
+    for cp in range(0xA0, 0x30000):
+        ch = chr(cp)
+        normalized = unicodedata.normalize('NFKC', ch)
+        if normalized != ch:
+            nfkc[cp] = normalized
+
+    width = {cp: chr(cp - 0xFEE0) for cp in range(0xFF01, 0xFF5F)}
+    width[0x3000] = ' '
+
+    return {
+        'nfkc': nfkc,
+        'width': width,
+        'zero_width': {ord(ch): '' for ch in _ZERO_WIDTH},
+        't2s': _pairs_table(_T2S_PAIRS),
+        'confusables': _confusables_table(),
+    }
+
+
+class Normalizer:
+    """
+    合并后的归一化映射表
+    各步骤按 STEPS 的顺序依次作用在每个字符上，合并结果只需一次 translate
+    """
+
+    def __init__(self, steps: Iterable[str]):
+        self.steps = tuple(step for step in STEPS if step in set(steps))
+        tables = _step_tables()
+        chain = [tables[step] for step in self.steps]
+
+        keys = set()
+        for table in chain:
+            keys.update(table)
+        self.table: Dict[int, str] = {}
+        for cp in keys:
+            value = chr(cp)
+            for table in chain:
+                value = value.translate(table)
+            if value != chr(cp):
+                self.table[cp] = value
+        # 正则规则用：映射出的字符按字面量转义，避免全角括号等变成正则语法
+        self.pattern_table = {cp: re.escape(value) for cp, value in self.table.items()}
+        # 需要映射的字符；大多数消息不含这些字符，先用 C 实现的集合判断跳过 translate
+        self._chars = frozenset(chr(cp) for cp in self.table)
+        # 映射表不涉及 ASCII 字符时，纯 ASCII 文本可以直接跳过
+        self._ascii_safe = all(cp >= 0x80 for cp in self.table)
+
+    def _unchanged(self, text: str) -> bool:
+        return (self._ascii_safe and text.isascii()) or self._chars.isdisjoint(text)
+
+    def __call__(self, text: str) -> str:
+        if self._unchanged(text):
+            return text
+        return text.translate(self.table)
+
+    def pattern(self, pattern: str) -> str:
+        """归一化正则表达式中的字面量字符"""
+        if self._unchanged(pattern):
+            return pattern
+        return pattern.translate(self.pattern_table)
+
+    def offsets(self, text: str) -> Optional[List[int]]:
+        """
+        归一化结果中每个字符对应的原文下标（末尾附加 len(text)），归一化不改变文本时返回 None
+        用于把在归一化文本上找到的位置映射回原文
+        """
+        if self._unchanged(text):
+            return None
+        table = self.table
+        starts = []
+        for index, ch in enumerate(text):
+            value = table.get(ord(ch))
+            if value is None:
+                starts.append(index)
+            elif value:
+                starts.extend([index] * len(value))
+        starts.append(len(text))
+        return starts
+
+
+_normalizer = None
+
+
+def get_normalizer() -> Optional[Normalizer]:
+    """进程内共享的归一化函数（按 MATCH_NORMALIZE 配置构建一次），未启用时返回 None"""
+    global _normalizer
+    if _normalizer is None:
+        steps = [step.strip() for step in config('MATCH_NORMALIZE', default=','.join(DEFAULT_STEPS)).split(',')]
+        unknown = [step for step in steps if step and step not in STEPS]
+        if unknown:
+            logger.warning(f"忽略未知的归一化步骤: {', '.join(unknown)}")
+        normalizer = Normalizer(steps)
+        _normalizer = normalizer if normalizer.table else False
+    return _normalizer or None
+
+
+def normalize_rule(content: str, kw_type: int) -> str:
+    """规则文本归一化，用户匹配规则（ID/用户名）不处理"""
+    normalizer = get_normalizer()
+    if normalizer is None or kw_type == 4:
+        return content
+    return normalizer.pattern(content) if kw_type == 2 else normalizer(content)
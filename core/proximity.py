@@ -0,0 +1,75 @@
+"""
+关键词邻近匹配
+两个关键词在指定字符数之内出现才算命中，避免相距很远、毫不相关的段落误报：
+  A ~N B   A 与 B 相距不超过 N 个字符（顺序不限）
+  A ~N> B  A 之后 N 个字符之内出现 B
+含空格的关键词用双引号括起来。距离为前一个关键词结尾到后一个关键词开头之间的字符数
+"""
+
+import re
+from typing import List, Sequence, Tuple
+
+# 距离和顺序标记之后不能紧跟数字或其他方向符号，避免 ~20> 被拆成 ~2 和关键词 0>
+_SYNTAX = re.compile(r'^\s*(?:"([^"]+)"|(\S+?))\s*~(\d+)(>?)(?![\d<>~])\s*(?:"([^"]+)"|(\S+))\s*$')
+# 批量导入时识别邻近规则
+_MARKER = re.compile(r'\s~|~\d')
+
+# 最大距离（Telegram 单条消息最长 4096 个字符）
+MAX_DISTANCE = 4096
+
+
+class ProximityError(ValueError):
+    """邻近规则格式错误"""
+
+
+def parse_proximity(text: str) -> Tuple[str, str, int, bool]:
+    """解析邻近规则，返回 (关键词A, 关键词B, 最大距离, 是否要求 A 在前)"""
+    found = _SYNTAX.match(text)
+    if not found:
+        raise ProximityError("格式应为 A ~N B 或 A ~N> B，例如 出 ~20 USDT")
+    quoted_a, word_a, distance, ordered, quoted_b, word_b = found.groups()
+    first = (quoted_a or word_a).strip()
+    second = (quoted_b or word_b).strip()
+    if not first or not second:
+        raise ProximityError("关键词不能为空")
+    if int(distance) > MAX_DISTANCE:
+        raise ProximityError(f"距离不能超过 {MAX_DISTANCE} 个字符")
+    return first, second, int(distance), bool(ordered)
+
+
+def is_proximity_syntax(text: str) -> bool:
+    """文本是否写成了邻近规则（含 ~ 标记，格式是否正确由 parse_proximity 校验）"""
+    return _MARKER.search(text) is not None
+
+
+def _follows(first_ends: Sequence[int], second_ends: Sequence[int], second_length: int, distance: int) -> bool:
+    """second 的某次出现是否在 first 的某次出现之后 distance 个字符之内（位置均为升序的结尾下标）"""
+    position = 0
+    last_end = -1
+    for end in second_ends:
+        start = end - second_length + 1
+        # 取在该次出现开头之前结束的最后一个 first
+        while position < len(first_ends) and first_ends[position] < start:
+            last_end = first_ends[position]
+            position += 1
+        if last_end >= 0 and start - last_end - 1 <= distance:
+            return True
+    return False
+
+
+def is_near(first_ends: Sequence[int], first_length: int, second_ends: Sequence[int], second_length: int,
+            distance: int, ordered: bool) -> bool:
+    """根据两个关键词的出现位置判断是否邻近，线性时间"""
+    if _follows(first_ends, second_ends, second_length, distance):
+        return True
+    return not ordered and _follows(second_ends, first_ends, first_length, distance)
+
+
+def find_ends(text: str, term: str) -> List[int]:
+    """term 在 text 中每次出现的结尾下标（允许重叠）"""
+    ends = []
+    position = text.find(term)
+    while position >= 0:
+        ends.append(position + len(term) - 1)
+        position = text.find(term, position + 1)
+    return ends
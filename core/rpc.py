@@ -0,0 +1,145 @@
+"""
+RPC 调度模块
+统一调度用户客户端的 Telethon 请求：按通道限制并发、缓存幂等结果、
+合并同时发起的相同请求，并把 FloodWait 转换为按方法计时的退避
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+
+class RpcBackoffError(Exception):
+    """请求处于 FloodWait 退避期"""
+
+    def __init__(self, method: str, seconds: float):
+        self.method = method
+        self.seconds = seconds
+        super().__init__(f"{method} 请求过于频繁，请 {int(seconds) + 1} 秒后重试")
+
+
+class RpcScheduler:
+    """
+    RPC 调度器
+    通道（lane）之间互不等待：界面触发的对话扫描走 ui 通道，
+    告警热路径不指定通道，不会排在界面请求之后
+    """
+
+    def __init__(self, lane_limits: Dict[str, int] = None, max_wait: float = 10,
+                 max_cache_entries: int = 1000):
+        # 通道名 -> 并发上限，未配置的通道默认串行
+        self.lane_limits = lane_limits or {}
+        self._lanes: Dict[str, asyncio.Semaphore] = {}
+        # 退避剩余不超过该值（秒）时等待后再请求，否则直接失败或返回旧缓存
+        self.max_wait = max_wait
+        self.max_cache_entries = max_cache_entries
+
+        # 方法 -> 退避截止时间
+        self._blocked_until: Dict[str, float] = {}
+        # 缓存键 -> (过期时间, 结果)
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+        # 缓存键 -> 进行中的请求，同时到达的相同请求只发一次
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def _lane(self, name: str) -> asyncio.Semaphore:
+        semaphore = self._lanes.get(name)
+        if semaphore is None:
+            semaphore = self._lanes[name] = asyncio.Semaphore(max(1, self.lane_limits.get(name, 1)))
+        return semaphore
+
+    def backoff_remaining(self, method: str) -> float:
+        """方法剩余的退避时间（秒）"""
+        return max(0.0, self._blocked_until.get(method, 0) - time.monotonic())
+
+    def invalidate(self, cache_key: Hashable = None):
+        """清除指定缓存，不传时清除全部"""
+        if cache_key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(cache_key, None)
+
+    async def call(self, method: str, func: Callable[[], Awaitable], *,
+                   lane: Optional[str] = None, cache_key: Hashable = None,
+                   ttl: float = 0, wait: bool = True):
+        """
+        执行一次 RPC
+        method: 方法名，FloodWait 按方法记录退避
+        func: 无参协程函数，真正发起请求
+        lane: 并发通道，None 表示不排队
+        cache_key/ttl: 幂等请求的缓存键和有效期（秒）
+        wait: 处于退避期时是否等待，False 时立即抛出 RpcBackoffError
+        """
+        now = time.monotonic()
+        cached = self._cache.get(cache_key) if cache_key is not None else None
+        if cached and cached[0] > now:
+            return cached[1]
+
+        if cache_key is not None and cache_key in self._inflight:
+            return await asyncio.shield(self._inflight[cache_key])
+
+        remaining = self.backoff_remaining(method)
+        if remaining > 0:
+            if cached:
+                # 退避期间返回过期的缓存，好过直接失败
+                return cached[1]
+            if not wait or remaining > self.max_wait:
+                raise RpcBackoffError(method, remaining)
+            await asyncio.sleep(remaining)
+
+        if cache_key is None:
+            return await self._execute(method, func, lane)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            result = await self._execute(method, func, lane)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, RpcBackoffError) and cached:
+                result = cached[1]
+                future.set_result(result)
+                return result
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            self._store(cache_key, result, ttl)
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(cache_key, None)
+
+    async def _execute(self, method: str, func: Callable[[], Awaitable], lane: Optional[str]):
+        try:
+            if lane is None:
+                return await func()
+            async with self._lane(lane):
+                return await func()
+        except FloodWaitError as e:
+            # Telethon 只会自动等待较短的 FloodWait，较长的在这里记录退避
+            self._blocked_until[method] = time.monotonic() + e.seconds
+            logger.warning(f"⏳ {method} 触发 FloodWait，退避 {e.seconds} 秒")
+            raise RpcBackoffError(method, e.seconds) from e
+
+    def _store(self, cache_key: Hashable, result: Any, ttl: float):
+        if ttl <= 0:
+            return
+        if len(self._cache) >= self.max_cache_entries:
+            now = time.monotonic()
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            if len(self._cache) >= self.max_cache_entries:
+                self._cache.pop(next(iter(self._cache)))
+        self._cache[cache_key] = (time.monotonic() + ttl, result)
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取处于退避期的方法及剩余秒数"""
+        now = time.monotonic()
+        return {method: until - now for method, until in self._blocked_until.items() if until > now}
@@ -0,0 +1,164 @@
+"""
+规则运行统计
+匹配时只在内存中累加每条规则的执行次数、耗时、命中次数和最后命中时间，
+定期批量写入 keyword_stats 表；平均耗时超过阈值的规则上报后停用。
+分进程模式下各工作进程只上报，由 Bot 进程统一写入停用标记并推送给所有工作进程
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from core.database import AsyncSessionLocal, KeywordStats
+
+logger = logging.getLogger(__name__)
+
+
+class RuleStats:
+    """
+    规则运行统计
+    耗时只统计单独执行的规则（正则、增量索引中的规则），走共享扫描的字面量规则开销无法拆分到单条规则
+    """
+
+    def __init__(self, flush_interval: float = 60, max_avg_ms: float = 0, min_evals: int = 50):
+        self.flush_interval = flush_interval
+        # 平均单次耗时超过 max_avg_ms 且执行满 min_evals 次（或累计耗时已超过两者之积）时上报，0 为不停用
+        self.max_avg_ms = max_avg_ms
+        self.min_evals = max(1, min_evals)
+        # 上报回调 (规则ID, 平均耗时毫秒)，由它决定是否调用 disable
+        self.on_slow: Optional[Callable[[int, float], Awaitable]] = None
+
+        # 待写入的增量 {规则ID: [执行次数, 耗时毫秒, 命中次数, 最后命中时间]}
+        self._pending: Dict[int, List] = {}
+        # 本进程内的累计耗时 {规则ID: [执行次数, 耗时毫秒]}，用于判断是否停用
+        self._costs: Dict[int, List] = {}
+        # 本进程已上报的规则，以及已写入停用标记的规则（Bot 进程）
+        self._reported: Set[int] = set()
+        self._disabled: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    def _entry(self, rule_id: int) -> List:
+        entry = self._pending.get(rule_id)
+        if entry is None:
+            entry = self._pending[rule_id] = [0, 0.0, 0, None]
+        return entry
+
+    def record(self, costs: Dict[int, List], hits: Iterable[int]):
+        """
+        记录一批匹配的统计
+        costs: {规则ID: [执行次数, 耗时秒]}，hits: 命中的规则ID
+        """
+        for rule_id, (evals, seconds) in costs.items():
+            cost_ms = seconds * 1000
+            entry = self._entry(rule_id)
+            entry[0] += evals
+            entry[1] += cost_ms
+
+            total = self._costs.get(rule_id)
+            if total is None:
+                total = self._costs[rule_id] = [0, 0.0]
+            total[0] += evals
+            total[1] += cost_ms
+            if self.max_avg_ms > 0 and rule_id not in self._reported:
+                average = total[1] / total[0]
+                if average > self.max_avg_ms and (
+                        total[0] >= self.min_evals or total[1] > self.max_avg_ms * self.min_evals):
+                    self._reported.add(rule_id)
+                    self._spawn(self._report(rule_id, average))
+
+        now = datetime.now()
+        for rule_id in hits:
+            entry = self._entry(rule_id)
+            entry[2] += 1
+            entry[3] = now
+
+    def reset(self, rule_ids: Iterable[int]):
+        """规则被修改或重新启用后重新计算耗时"""
+        for rule_id in rule_ids:
+            self._costs.pop(rule_id, None)
+            self._reported.discard(rule_id)
+            self._disabled.discard(rule_id)
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _report(self, rule_id: int, average_ms: float):
+        if not self.on_slow:
+            return
+        try:
+            await self.on_slow(rule_id, average_ms)
+        except Exception as e:
+            logger.error(f"上报慢规则 {rule_id} 失败: {e}")
+
+    async def disable(self, rule_id: int, average_ms: float) -> bool:
+        """
+        写入规则的停用标记
+        多个进程上报同一条规则时只处理第一次，之后的上报返回 False
+        """
+        if rule_id in self._disabled:
+            return False
+        self._disabled.add(rule_id)
+        reason = f"平均耗时 {average_ms:.1f}ms 超过 {self.max_avg_ms:g}ms"
+        async with AsyncSessionLocal() as session:
+            stmt = insert(KeywordStats).values(keyword_id=rule_id, disabled_at=datetime.now(),
+                                               disabled_reason=reason)
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[KeywordStats.keyword_id],
+                set_={'disabled_at': stmt.excluded.disabled_at, 'disabled_reason': stmt.excluded.disabled_reason},
+            ))
+            await session.commit()
+        logger.warning(f"⛔ 规则 {rule_id} 已自动停用: {reason}")
+        return True
+
+    async def flush(self):
+        """把累计的增量批量写入数据库"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with AsyncSessionLocal() as session:
+                stmt = insert(KeywordStats)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[KeywordStats.keyword_id],
+                        set_={
+                            'eval_count': KeywordStats.eval_count + stmt.excluded.eval_count,
+                            'total_cost_ms': KeywordStats.total_cost_ms + stmt.excluded.total_cost_ms,
+                            'hit_count': KeywordStats.hit_count + stmt.excluded.hit_count,
+                            'last_hit_at': func.coalesce(stmt.excluded.last_hit_at, KeywordStats.last_hit_at),
+                        },
+                    ),
+                    [
+                        {'keyword_id': rule_id, 'eval_count': evals, 'total_cost_ms': cost_ms,
+                         'hit_count': hits, 'last_hit_at': last_hit}
+                        for rule_id, (evals, cost_ms, hits, last_hit) in pending.items()
+                    ],
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"写入规则统计失败: {e}")
+
+    def start(self):
+        """开始定期写入"""
+        if self.flush_interval <= 0 or (self._flush_task and not self._flush_task.done()):
+            return
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """停止定期写入，并写入最后一批"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,103 @@
+"""
+连接监督模块
+监听 MTProto 连接断开，按带抖动的指数退避自动重连，
+重连成功后交给回调重新注册处理器并补拉断线期间的更新
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionSupervisor:
+    """连接监督器"""
+
+    def __init__(self, base_delay: float = 1, max_delay: float = 60):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._task: Optional[asyncio.Task] = None
+
+        # 健康状态
+        self.connected = False
+        self.started_at: Optional[float] = None
+        self.reconnect_count = 0
+        self.disconnected_seconds = 0.0
+        self._disconnected_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, client, on_reconnected: Callable[[], Awaitable]):
+        """开始监督客户端连接"""
+        if self.running:
+            return
+        self.connected = client.is_connected()
+        self.started_at = time.monotonic()
+        self.reconnect_count = 0
+        self.disconnected_seconds = 0.0
+        self._disconnected_at = None if self.connected else self.started_at
+        self._task = asyncio.create_task(self._run(client, on_reconnected))
+
+    async def stop(self):
+        """停止监督（主动断开连接前必须先停止，否则会被重连）"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.started_at = None
+
+    def _backoff(self, attempt: int) -> float:
+        """指数退避，取上限的一半加随机抖动，避免多个实例同时重连"""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    async def _run(self, client, on_reconnected: Callable[[], Awaitable]):
+        while True:
+            try:
+                await client.disconnected
+            except Exception as e:
+                logger.warning(f"连接已断开: {e}")
+
+            self.connected = False
+            self._disconnected_at = time.monotonic()
+            logger.warning("⚠️ 检测到连接断开，开始自动重连")
+
+            attempt = 0
+            while not client.is_connected():
+                delay = self._backoff(attempt)
+                logger.info(f"{delay:.1f} 秒后进行第 {attempt + 1} 次重连")
+                await asyncio.sleep(delay)
+                try:
+                    await client.connect()
+                except Exception as e:
+                    logger.warning(f"重连失败: {e}")
+                attempt += 1
+
+            self.disconnected_seconds += time.monotonic() - self._disconnected_at
+            self._disconnected_at = None
+            self.connected = True
+            self.reconnect_count += 1
+            logger.info(f"✓ 重连成功（共重连 {self.reconnect_count} 次）")
+
+            try:
+                await on_reconnected()
+            except Exception as e:
+                logger.error(f"重连后恢复监控失败: {e}", exc_info=True)
+
+    def get_stats(self) -> Dict:
+        """获取连接健康状态"""
+        now = time.monotonic()
+        disconnected = self.disconnected_seconds
+        if self._disconnected_at is not None:
+            disconnected += now - self._disconnected_at
+        return {
+            'connected': self.connected,
+            'uptime': now - self.started_at if self.started_at else 0,
+            'reconnect_count': self.reconnect_count,
+            'disconnected_seconds': disconnected,
+        }
@@ -5,24 +5,46 @@ Telegram客户端管理
 
 import asyncio
 import hashlib
+import html
 import json
 import logging
 import os
 import random
+import time
 import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 from decouple import config
 from telethon import TelegramClient, events
+from telethon.network import ConnectionTcpFull
 from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError, PasswordHashInvalidError, EmailUnconfirmedError
+from telethon.errors import UsernameInvalidError, UsernameNotOccupiedError
 from telethon.tl.types import User, Chat, Channel, Dialog
+from telethon.utils import get_peer_id
 
+from core.accounts import MonitorAccount, SeenMessages, account_worker
+from core.album import AlbumAggregator
+from core.alert_template import AlertRenderer, TemplateError
+from core.cooldown import AlertThrottle
 from core.database import get_config, set_config
+from core.dedup import DuplicateWindow, RecentMessageCache
+from core.highlight import render_highlights
+from core.ipc import publish
+from core.ingest import IngestQueue, MatchBatcher
+from core.memory_session import MemoryBackedSession
+from core.proxy_pool import ProxyPool
+from core.rpc import RpcBackoffError, RpcScheduler
+from core.supervisor import ConnectionSupervisor
+from core.update_state import UpdateStateStore
 from core.utils import format_datetime
 
 logger = logging.getLogger(__name__)
 
+# 已转发的消息编辑后不再命中任何关键词时，加在原告警开头的说明
+EDITED_UNMATCHED_NOTICE = "✏️ <b>原消息已编辑，当前内容不再匹配任何关键词</b>"
+
 
 # 真实设备数据库 - 基于市场份额的真实设备
 DEVICE_DATABASE = {
@@ -103,9 +125,13 @@ TELEGRAM_VERSIONS = {
 class DeviceFingerprint:
     """设备指纹生成器 - 生成真实的设备信息"""
     
-    def __init__(self, session_path: Path):
+    def __init__(self, session_path: Path, account: str = None):
         self.session_path = session_path
-        self.fingerprint_file = session_path / "device_fingerprint.json"
+        # 附加监控账号各自使用独立的指纹文件
+        if account:
+            self.fingerprint_file = session_path / f"device_fingerprint_{account}.json"
+        else:
+            self.fingerprint_file = session_path / "device_fingerprint.json"
     
     def _generate_android_fingerprint(self) -> Dict:
         """生成 Android 设备指纹"""
@@ -236,6 +262,9 @@ class TelegramClientManager:
         self.api_hash = config('TELEGRAM_API_HASH')
         self.session_path = Path(config('SESSION_PATH', default='./sessions'))
         self.session_path.mkdir(exist_ok=True)
+        # 会话后端: sqlite=Telethon默认, memory=内存会话定期写回
+        self.session_backend = config('SESSION_BACKEND', default='sqlite')
+        self.session_flush_interval = config('SESSION_FLUSH_INTERVAL', default=60, cast=float)
         
         self.client: Optional[TelegramClient] = None
         self.is_monitoring = False
@@ -247,20 +276,130 @@ class TelegramClientManager:
         
         # 设备指纹管理器
         self.device_fingerprint = DeviceFingerprint(self.session_path)
+        
+        # 跨群组去重窗口（窗口长度为0时关闭），近似重复按 SimHash 汉明距离判断
+        self.duplicate_window = DuplicateWindow(
+            window_seconds=config('DEDUP_WINDOW_SECONDS', default=60, cast=float),
+            max_entries=config('DEDUP_MAX_ENTRIES', default=5000, cast=int),
+            near_distance=config('DEDUP_NEAR_DISTANCE', default=3, cast=int),
+        )
+        # 合并重复来源时的编辑延迟，窗口内的多个来源只触发一次编辑
+        self.dedup_edit_delay = config('DEDUP_EDIT_DELAY', default=2.0, cast=float)
+        
+        # 按 (发送者, 关键词) 和 (群组, 关键词) 的告警冷却（秒，0为关闭）
+        self.alert_throttle = AlertThrottle(
+            sender_seconds=config('COOLDOWN_SENDER_SECONDS', default=0, cast=float),
+            chat_seconds=config('COOLDOWN_CHAT_SECONDS', default=0, cast=float),
+        )
+        
+        # 告警模板：版式编译一次，广告标题/链接/按钮按间隔刷新缓存（秒）
+        self.alert_renderer = AlertRenderer(
+            refresh_interval=config('ALERT_FRAGMENT_REFRESH_INTERVAL', default=60, cast=float),
+        )
+        
+        # 编辑消息监控：缓存最近消息的文本哈希，文本变化才重新匹配，已有告警原地更新
+        self.monitor_edits = config('MONITOR_EDITED_MESSAGES', default=False, cast=bool)
+        self.recent_messages = RecentMessageCache(
+            max_entries=config('EDIT_CACHE_SIZE', default=10000, cast=int) if self.monitor_edits else 0
+        )
+        
+        # 有界摄入队列：事件处理器只入队，工作协程消费
+        self.ingest_queue = IngestQueue(
+            maxsize=config('INGEST_QUEUE_SIZE', default=1000, cast=int),
+            workers=config('INGEST_WORKERS', default=4, cast=int),
+            batch_size=config('INGEST_BATCH_SIZE', default=32, cast=int),
+        )
+        # 相册聚合：同一 grouped_id 的分片在窗口内合并，合并后的相册放入摄入队列（秒，0为关闭）
+        self.album_aggregator = AlbumAggregator(
+            window_seconds=config('ALBUM_WINDOW_SECONDS', default=1.0, cast=float),
+            on_album=self._handle_album,
+            queue=self.ingest_queue,
+        )
+        # 关键词匹配合批（开始监控时绑定匹配器）
+        self.match_batch_size = config('MATCH_BATCH_SIZE', default=64, cast=int)
+        self.match_batch_delay = config('MATCH_BATCH_DELAY_MS', default=2, cast=float) / 1000
+        self.match_batcher: Optional[MatchBatcher] = None
+        
+        # 更新状态持久化与有界补拉
+        self.update_state_store = UpdateStateStore(
+            flush_interval=config('UPDATE_STATE_FLUSH_INTERVAL', default=30, cast=float),
+            max_age=config('CATCH_UP_MAX_AGE', default=3600, cast=float),
+        )
+        # 每个账号每轮补拉最多处理的消息数；只限制处理量，getDifference 的拉取仍由 Telethon 完成
+        self.catch_up_max_messages = config('CATCH_UP_MAX_MESSAGES', default=2000, cast=int)
+        
+        # 连接监督：断线后按指数退避自动重连，并补拉断线期间的消息
+        self.supervisor = ConnectionSupervisor(
+            base_delay=config('RECONNECT_BASE_DELAY', default=1, cast=float),
+            max_delay=config('RECONNECT_MAX_DELAY', default=60, cast=float),
+        )
+        
+        # 监控账号：主账号（self.client）和附加账号，共用同一条匹配和转发流程
+        self.primary: Optional[MonitorAccount] = None
+        self.accounts: Dict[str, MonitorAccount] = {}
+        # 正在登录的附加账号
+        self._pending_account: Optional[MonitorAccount] = None
+        self._keyword_matcher = None
+        # 多个账号看到的同一条消息只处理一次
+        self.seen_messages = SeenMessages(max_entries=config('ACCOUNT_DEDUP_SIZE', default=20000, cast=int))
+        
+        # 分进程模式下由工作进程设置：账号按手机号分片，主账号只在 0 号进程
+        self.worker_index = 0
+        self.worker_count = 1
+        # 黑名单服务（工作进程中为常驻内存的实例）
+        self.blacklist_service = None
+        
+        # RPC 调度：界面请求串行并缓存，FloodWait 转为退避，告警热路径不排队
+        self.rpc = RpcScheduler(
+            lane_limits={'ui': config('RPC_UI_CONCURRENCY', default=1, cast=int), 'sync': 1},
+            max_wait=config('RPC_MAX_FLOOD_WAIT', default=10, cast=float),
+        )
+        self.dialog_cache_ttl = config('DIALOG_CACHE_TTL', default=60, cast=float)
+        
+        # 代理池：后台探测延迟，选用最快的可用代理并自动切换
+        self.proxy_pool = ProxyPool(
+            probe_interval=config('PROXY_PROBE_INTERVAL', default=60, cast=float),
+            probe_timeout=config('PROXY_PROBE_TIMEOUT', default=5, cast=float),
+            failover_threshold=config('PROXY_FAILOVER_THRESHOLD', default=2, cast=int),
+            max_latency=config('PROXY_MAX_LATENCY', default=2.0, cast=float),
+        )
+        # 客户端当前使用的连接类型，所有账号共用同一个代理
+        self.connection_type: type = ConnectionTcpFull
     
     async def create_client(self, phone: str) -> TelegramClient:
         """创建Telegram客户端"""
+        # 探测代理池，选用延迟最低的可用代理
+        self.proxy_pool.load(await self.get_proxy_config())
+        await self.proxy_pool.probe_all()
+        self.proxy_pool.select()
+        
+        self.client = self._build_client(phone, self.device_fingerprint)
+        self.primary = MonitorAccount(phone, self.client, self.supervisor, self.update_state_store, primary=True)
+        self.proxy_pool.start(self._switch_proxy)
+        
+        return self.client
+    
+    def _build_client(self, phone: str, device_fingerprint: DeviceFingerprint) -> TelegramClient:
+        """按手机号和设备指纹构建客户端，使用代理池当前选定的代理"""
         session_file = self.session_path / f"{phone.replace('+', '')}.session"
         
         # 获取或创建设备指纹（持久化）
-        fingerprint = self.device_fingerprint.get_or_create()
+        fingerprint = device_fingerprint.get_or_create()
         
         logger.info(f"使用设备: {fingerprint.get('device_model')} | "
                    f"系统: {fingerprint.get('system_version')} | "
                    f"TG版本: {fingerprint.get('app_version')}")
         
-        self.client = TelegramClient(
-            str(session_file),
+        session = str(session_file)
+        if self.session_backend == 'memory':
+            # 与 .session 文件格式兼容，进程退出时统一写回（见 core.memory_session）
+            session = MemoryBackedSession(session, flush_interval=self.session_flush_interval)
+        
+        connection, proxy = self._proxy_params(self.proxy_pool.current)
+        self.connection_type = connection
+        
+        return TelegramClient(
+            session,
             self.api_id,
             self.api_hash,
             device_model=fingerprint.get('device_model', 'Unknown Device'),
@@ -268,29 +407,48 @@ class TelegramClientManager:
             app_version=fingerprint.get('app_version', '10.0.0'),
             lang_code=fingerprint.get('lang_code', 'en'),
             system_lang_code=fingerprint.get('system_lang_code', 'en-US'),
+            # 逐个分发更新，事件处理器入队时的等待会反压到更新循环
+            sequential_updates=True,
+            connection=connection,
+            proxy=proxy,
         )
-        
-        return self.client
     
-    async def login_with_phone(self, phone: str) -> Tuple[bool, str]:
+    async def login_with_phone(self, phone: str, extra: bool = False) -> Tuple[bool, str]:
         """
         使用手机号登录
+        extra: 登录附加监控账号（独立的客户端和设备指纹），而不是主账号
         返回: (是否需要验证码, 消息)
         """
         try:
-            if not self.client:
+            # 放弃上一次未完成的附加账号登录
+            if self._pending_account:
+                await self._pending_account.client.disconnect()
+                self._pending_account = None
+            
+            if extra:
+                # 分进程模式下附加账号可能不在主账号所在的进程，以保存的主账号手机号为准
+                primary_phone = self.primary.phone if self.primary else await get_config("telegram_phone")
+                if not primary_phone:
+                    return False, "请先登录主账号"
+                if phone in self.accounts or phone == primary_phone:
+                    return False, "该账号已在监控中"
+                self._pending_account = self._create_account(phone)
+            elif not self.client:
                 await self.create_client(phone)
             
-            await self.client.connect()
+            client = self._login_client
+            await client.connect()
             
-            if await self.client.is_user_authorized():
-                await self.load_dialogs()
-                await set_config("telegram_phone", phone)
+            if await client.is_user_authorized():
+                if not extra:
+                    await set_config("telegram_phone", phone)
+                await self._on_login_success()
                 return True, "登录成功"
             
             # 发送验证码
-            await self.client.send_code_request(phone)
-            await set_config("telegram_phone", phone)
+            await client.send_code_request(phone)
+            if not extra:
+                await set_config("telegram_phone", phone)
             return False, "验证码已发送，请输入验证码"
             
         except Exception as e:
@@ -303,14 +461,15 @@ class TelegramClientManager:
         返回: (是否需要密码, 消息)
         """
         try:
-            if not self.client:
+            if not self._pending_account and not self.client:
                 await self.create_client(phone)
                 await self.client.connect()
             
-            await self.client.sign_in(phone, code)
+            client = self._login_client
+            await client.sign_in(phone, code)
             
-            if await self.client.is_user_authorized():
-                await self.load_dialogs()
+            if await client.is_user_authorized():
+                await self._on_login_success()
                 return True, "登录成功"
             
             return False, "登录失败，请检查验证码"
@@ -328,10 +487,11 @@ class TelegramClientManager:
     async def verify_email_code(self, email_code: str) -> Tuple[bool, str]:
         """验证邮箱验证码"""
         try:
-            await self.client.sign_in(email_code=email_code)
+            client = self._login_client
+            await client.sign_in(email_code=email_code)
             
-            if await self.client.is_user_authorized():
-                await self.load_dialogs()
+            if await client.is_user_authorized():
+                await self._on_login_success()
                 return True, "登录成功"
             
             return False, "登录失败，请检查邮箱验证码"
@@ -345,10 +505,11 @@ class TelegramClientManager:
     async def verify_password(self, password: str) -> Tuple[bool, str]:
         """验证两步验证密码"""
         try:
-            await self.client.sign_in(password=password)
+            client = self._login_client
+            await client.sign_in(password=password)
             
-            if await self.client.is_user_authorized():
-                await self.load_dialogs()
+            if await client.is_user_authorized():
+                await self._on_login_success()
                 return True, "登录成功"
             
             return False, "登录失败"
@@ -359,6 +520,110 @@ class TelegramClientManager:
             logger.error(f"密码验证失败: {e}")
             return False, f"验证失败: {str(e)}"
     
+    @property
+    def _login_client(self) -> TelegramClient:
+        """当前登录流程使用的客户端"""
+        return self._pending_account.client if self._pending_account else self.client
+    
+    async def _on_login_success(self):
+        """登录成功：主账号加载对话，附加账号加入监控"""
+        if self._pending_account:
+            account, self._pending_account = self._pending_account, None
+            await self._add_account(account)
+        else:
+            await self.load_dialogs()
+    
+    def _account_fingerprint(self, phone: str) -> DeviceFingerprint:
+        """附加账号的设备指纹（与主账号分开保存）"""
+        return DeviceFingerprint(self.session_path, phone.replace('+', ''))
+    
+    def _create_account(self, phone: str) -> MonitorAccount:
+        """创建附加监控账号，设备指纹、连接监督和更新状态各自独立"""
+        account_id = phone.replace('+', '')
+        client = self._build_client(phone, self._account_fingerprint(phone))
+        supervisor = ConnectionSupervisor(self.supervisor.base_delay, self.supervisor.max_delay)
+        update_state_store = UpdateStateStore(
+            flush_interval=self.update_state_store.flush_interval,
+            max_age=self.update_state_store.max_age,
+            key=f"update_state:{account_id}",
+        )
+        return MonitorAccount(phone, client, supervisor, update_state_store)
+    
+    async def _add_account(self, account: MonitorAccount):
+        """保存附加账号，监控运行中时立即开始监控"""
+        self.accounts[account.phone] = account
+        phones = json.loads(await get_config("monitor_accounts", "[]"))
+        if account.phone not in phones:
+            phones.append(account.phone)
+            await set_config("monitor_accounts", json.dumps(phones))
+        await publish('reload_accounts')
+        logger.info(f"✓ 已添加监控账号 {account.phone}，当前共 {len(self._monitor_accounts())} 个账号")
+        
+        if self.is_monitoring and self._keyword_matcher:
+            await self._start_account(account, self._keyword_matcher)
+    
+    def _owns_account(self, phone: str) -> bool:
+        """分进程模式下该账号是否分配给本进程"""
+        return account_worker(phone, self.worker_count) == self.worker_index
+    
+    async def load_accounts(self):
+        """
+        同步已保存的附加监控账号：连接新增的账号（未授权或连接失败的本次跳过），
+        断开已移除的账号；监控运行中时新账号立即开始监控
+        """
+        phones = [p for p in json.loads(await get_config("monitor_accounts", "[]")) if self._owns_account(p)]
+        
+        for phone in [p for p in self.accounts if p not in phones]:
+            await self._drop_account(phone)
+        
+        for phone in phones:
+            if phone in self.accounts:
+                continue
+            
+            account = self._create_account(phone)
+            try:
+                await account.client.connect()
+                if not await account.client.is_user_authorized():
+                    logger.warning(f"附加账号 {phone} 未授权，已跳过")
+                    await account.client.disconnect()
+                    continue
+            except Exception as e:
+                logger.warning(f"连接附加账号 {phone} 失败: {e}")
+                continue
+            
+            self.accounts[phone] = account
+            if self.is_monitoring and self._keyword_matcher:
+                await self._start_account(account, self._keyword_matcher)
+    
+    async def _drop_account(self, phone: str):
+        """停止并断开附加账号"""
+        account = self.accounts.pop(phone, None)
+        if account:
+            await self._stop_account(account)
+            await account.client.disconnect()
+    
+    async def remove_account(self, phone: str) -> bool:
+        """移除附加监控账号（保留会话文件，重新添加时无需验证码）"""
+        try:
+            await self._drop_account(phone)
+            
+            phones = json.loads(await get_config("monitor_accounts", "[]"))
+            await set_config("monitor_accounts", json.dumps([p for p in phones if p != phone]))
+            await publish('reload_accounts')
+            return True
+        except Exception as e:
+            logger.error(f"移除监控账号失败: {e}")
+            return False
+    
+    def _monitor_accounts(self) -> List[MonitorAccount]:
+        """所有参与监控的账号，主账号在前"""
+        accounts = [self.primary] if self.primary and self.client and self.worker_index == 0 else []
+        return accounts + list(self.accounts.values())
+    
+    def get_accounts_status(self) -> List[Dict]:
+        """获取每个账号的连接状态和吞吐"""
+        return [account.get_stats() for account in self._monitor_accounts()]
+    
     async def is_logged_in(self) -> bool:
         """检查是否已登录"""
         try:
@@ -380,10 +645,14 @@ class TelegramClientManager:
     async def logout(self) -> bool:
         """退出登录"""
         try:
+            await self.supervisor.stop()
+            await self.proxy_pool.stop()
+            self.rpc.invalidate()
             if self.client:
                 await self.client.log_out()
                 await self.client.disconnect()
                 self.client = None
+                self.primary = None
             
             # 清除配置
             await set_config("telegram_phone", "")
@@ -394,13 +663,55 @@ class TelegramClientManager:
             logger.error(f"退出登录失败: {e}")
             return False
     
+    async def get_dialogs(self):
+        """获取对话列表（走 ui 通道，短时间内的重复扫描直接用缓存）"""
+        return await self.rpc.call(
+            'get_dialogs', self.client.get_dialogs,
+            lane='ui', cache_key='get_dialogs', ttl=self.dialog_cache_ttl
+        )
+    
+    async def get_me(self):
+        """获取当前账号信息（走 ui 通道并缓存）"""
+        return await self.rpc.call('get_me', self.client.get_me, lane='ui', cache_key='get_me', ttl=300)
+    
+    async def get_user_info(self) -> Optional[Dict]:
+        """当前账号的基本信息，未登录时为 None"""
+        if not self.client:
+            return None
+        me = await self.get_me()
+        return {
+            'id': me.id,
+            'first_name': me.first_name,
+            'last_name': me.last_name,
+            'username': me.username,
+            'phone': me.phone
+        }
+    
+    async def resolve_username(self, username: str) -> Optional[int]:
+        """
+        解析用户名为ID（走 resolve 通道，FloodWait 转为退避，退避期间直接失败）
+        用户名不存在时返回 None
+        """
+        clients = [self.client] + [account.client for account in self.accounts.values()]
+        client = next((c for c in clients if c is not None and c.is_connected()), None)
+        if client is None:
+            raise RuntimeError("没有已连接的账号")
+        
+        try:
+            return await self.rpc.call(
+                'resolve_username', lambda: client.get_peer_id(username),
+                lane='resolve', cache_key=('resolve_username', username), ttl=60, wait=False
+            )
+        except (UsernameNotOccupiedError, UsernameInvalidError, ValueError):
+            return None
+    
     async def load_dialogs(self):
         """加载对话列表"""
         try:
             if not await self.is_logged_in():
                 return
             
-            dialogs = await self.client.get_dialogs()
+            dialogs = await self.get_dialogs()
             
             for dialog in dialogs:
                 entity = dialog.entity
@@ -422,7 +733,7 @@ class TelegramClientManager:
         available_chats = []
         
         try:
-            dialogs = await self.client.get_dialogs()
+            dialogs = await self.get_dialogs()
             
             for dialog in dialogs:
                 entity = dialog.entity
@@ -451,6 +762,8 @@ class TelegramClientManager:
                 
                 available_chats.append({
                     'id': entity.id,
+                    # 带标记的ID（与消息的 chat_id 一致），用于设置关键词的群组范围
+                    'peer_id': get_peer_id(entity),
                     'title': entity.title,
                     'type': chat_type,
                     'username': getattr(entity, 'username', None)
@@ -466,6 +779,7 @@ class TelegramClientManager:
         try:
             await set_config("target_chat_id", str(chat_id))
             self.target_chat_id = chat_id
+            await publish('set_target_chat', chat_id=chat_id)
             return True
         except Exception as e:
             logger.error(f"设置目标聊天失败: {e}")
@@ -493,7 +807,9 @@ class TelegramClientManager:
             # 如果缓存中没有，尝试从Telegram获取
             if self.client and await self.is_logged_in():
                 try:
-                    entity = await self.client.get_entity(chat_id)
+                    entity = await self.rpc.call(
+                        'get_entity', lambda: self.client.get_entity(chat_id), lane='ui'
+                    )
                     # 更新缓存
                     self.chats[chat_id] = entity
                     return {
@@ -510,12 +826,33 @@ class TelegramClientManager:
             logger.error(f"获取目标聊天失败: {e}")
             return None
     
+    async def set_alert_template(self, source: Optional[str]):
+        """设置告警模板（为空时恢复默认），格式错误时抛出 TemplateError"""
+        self.alert_renderer.set_template(source)
+        await set_config("alert_template", source or "")
+        await publish('reload_alert_template')
+    
+    async def get_alert_template(self) -> str:
+        """获取保存的告警模板，未设置时为空字符串"""
+        return await get_config("alert_template", "") or ""
+    
+    async def reload_alert_template(self):
+        """重新读取告警模板，并让广告片段在下一条告警时刷新"""
+        source = await self.get_alert_template()
+        try:
+            self.alert_renderer.set_template(source)
+        except TemplateError as e:
+            logger.warning(f"告警模板无效，使用默认模板: {e}")
+            self.alert_renderer.set_template(None)
+        self.alert_renderer.fragments.invalidate()
+    
     async def start_monitoring(self, keyword_matcher) -> bool:
         """开始监控"""
         try:
             logger.info("=== 开始监控流程 ===")
 
-            if not await self.is_logged_in():
+            # 分进程模式下只有 0 号进程负责主账号
+            if self.worker_index == 0 and not await self.is_logged_in():
                 logger.warning("监控失败：用户未登录")
                 return False
 
@@ -529,16 +866,23 @@ class TelegramClientManager:
                 self.target_chat_id = target_chat["id"]
 
             logger.info(f"✓ 目标聊天ID: {self.target_chat_id}")
+            await self.reload_alert_template()
 
-            # 同步所有未读消息，确保能接收到所有群组的消息
+            # 添加消息处理器（只负责入队，由摄入队列的工作协程处理）
+            self.ingest_queue.start()
+            self._keyword_matcher = keyword_matcher
+            self.match_batcher = MatchBatcher(
+                keyword_matcher.match_messages,
+                max_batch=self.match_batch_size,
+                max_delay=self.match_batch_delay,
+            )
+            
+            # 所有账号汇入同一个摄入队列
+            await self.load_accounts()
             logger.info("正在同步消息...")
-            await self.client.catch_up()
-            logger.info("✓ 消息同步完成")
-
-            # 添加消息处理器
-            @self.client.on(events.NewMessage)
-            async def message_handler(event):
-                await self._handle_new_message(event, keyword_matcher)
+            for account in self._monitor_accounts():
+                await self._start_account(account, keyword_matcher)
+            logger.info(f"✓ 监控账号数: {len(self._monitor_accounts())}")
 
             self.is_monitoring = True
             logger.info("✓ 消息处理器已注册，开始监控所有群组消息")
@@ -552,10 +896,13 @@ class TelegramClientManager:
     async def stop_monitoring(self) -> bool:
         """停止监控"""
         try:
-            if self.client:
-                # 移除所有事件处理器
-                self.client.remove_event_handler(self._handle_new_message)
+            # 移除所有账号的事件处理器
+            for account in self._monitor_accounts():
+                await self._stop_account(account)
             
+            # 先停相册聚合，避免窗口结束的相册再放入已停止的队列
+            await self.album_aggregator.stop()
+            await self.ingest_queue.stop()
             self.is_monitoring = False
             logger.info("停止监控消息")
             return True
@@ -564,67 +911,314 @@ class TelegramClientManager:
             logger.error(f"停止监控失败: {e}")
             return False
     
+    async def _start_account(self, account: MonitorAccount, keyword_matcher):
+        """在单个账号上注册处理器、补拉缺口并开始连接监督"""
+        self._register_handlers(account, keyword_matcher)
+        account.reset_replay()
+        
+        # 处理器注册后再补拉：只补拉上次记录之后的缺口，记录过旧则不补拉
+        if await account.update_state_store.restore(account.client):
+            await self.rpc.call('catch_up', account.client.catch_up, lane='sync')
+            logger.info(f"✓ [{account.phone}] 已开始补拉离线期间的消息")
+        else:
+            logger.info(f"✓ [{account.phone}] 从当前状态开始监控")
+        account.update_state_store.start(account.client)
+        account.supervisor.start(account.client, lambda: self._on_reconnected(account, keyword_matcher))
+    
+    async def _stop_account(self, account: MonitorAccount):
+        """停止单个账号的监控"""
+        await account.supervisor.stop()
+        self._remove_handlers(account)
+        await account.update_state_store.stop(account.client)
+    
+    def _register_handlers(self, account: MonitorAccount, keyword_matcher):
+        """注册事件处理器（先移除旧的，重复调用不会重复注册）"""
+        self._remove_handlers(account)
+        
+        async def message_handler(event):
+            if self._accept_account_message(account, event.message) and self._accept_replayed(account, event.message):
+                await self.ingest_queue.put(self._handle_new_message, event, keyword_matcher)
+        
+        handlers = [(message_handler, events.NewMessage())]
+        
+        if self.monitor_edits:
+            async def edited_handler(event):
+                if self._accept_account_message(account, event.message, edited=True):
+                    await self.ingest_queue.put(self._handle_edited_message, event, keyword_matcher)
+            
+            handlers.append((edited_handler, events.MessageEdited()))
+        
+        for callback, event in handlers:
+            account.client.add_event_handler(callback, event)
+        account.event_handlers = handlers
+    
+    def _remove_handlers(self, account: MonitorAccount):
+        """移除已注册的事件处理器"""
+        for callback, event in account.event_handlers:
+            account.client.remove_event_handler(callback, event)
+        account.event_handlers = []
+    
+    async def _on_reconnected(self, account: MonitorAccount, keyword_matcher):
+        """重连成功后重新注册处理器，并补拉断线期间的缺口"""
+        self._register_handlers(account, keyword_matcher)
+        # 客户端内存中的更新状态仍停在断线时，catch_up 只补拉缺口；只重新计算本账号的补拉预算
+        account.reset_replay()
+        await self.rpc.call('catch_up', account.client.catch_up, lane='sync')
+        logger.info(f"✓ [{account.phone}] 已补拉断线期间的消息")
+    
+    def _accept_account_message(self, account: MonitorAccount, message, edited: bool = False) -> bool:
+        """记录账号吞吐；多账号时同一条消息只放行最先收到的账号"""
+        duplicate = bool(self.accounts) and not self.seen_messages.claim(SeenMessages.key(message, edited))
+        account.record(duplicate)
+        return not duplicate
+    
+    def _accept_replayed(self, account: MonitorAccount, message) -> bool:
+        """
+        补拉到的历史消息按账号分别按条数和时长限流，超出预算的直接丢弃
+        注意：这里只限制处理量，消息在到达处理器之前已由 getDifference 拉取，拉取开销不受预算限制
+        """
+        since = account.replay_since
+        if not since or not message.date or message.date >= since:
+            return True
+        
+        max_age = account.update_state_store.max_age
+        if max_age > 0 and message.date < since - timedelta(seconds=max_age):
+            return False
+        
+        account.replayed_count += 1
+        if account.replayed_count == self.catch_up_max_messages + 1:
+            logger.warning(f"[{account.phone}] 补拉消息超过 {self.catch_up_max_messages} 条，其余历史消息将被跳过")
+        return account.replayed_count <= self.catch_up_max_messages
+    
     async def _handle_new_message(self, event, keyword_matcher):
         """处理新消息"""
+        message = event.message
+        
+        # 相册分片先聚合，整个相册只走一次处理流程
+        if message.grouped_id and self.album_aggregator.enabled:
+            self.album_aggregator.add(message, keyword_matcher)
+            return
+        
+        await self._process_message(message, message.text, keyword_matcher)
+    
+    async def _handle_edited_message(self, event, keyword_matcher):
+        """处理编辑消息"""
+        message = event.message
+        await self._process_message(message, message.text, keyword_matcher, edited=True)
+    
+    async def _handle_album(self, messages, keyword_matcher):
+        """处理聚合后的相册"""
+        message, text = AlbumAggregator.combine(messages)
+        logger.info(f"🖼 相册 {message.grouped_id} | 分片数: {len(messages)}")
+        await self._process_message(message, text, keyword_matcher)
+    
+    async def _process_message(self, message, text: str, keyword_matcher, edited: bool = False):
+        """
+        处理一条消息
+        text: 参与匹配的文本（相册为合并后的说明文字）
+        edited: 是否来自编辑事件
+        """
         try:
             logger.debug(f">>> 收到新消息事件")
-            message = event.message
             
             # 记录消息基本信息
             chat_id = message.chat_id if message.chat_id else "Unknown"
             sender_id = message.sender_id if message.sender_id else "Unknown"
-            has_text = bool(message.text)
+            has_text = bool(text)
             
-            logger.info(f"📨 新消息 | 群组ID: {chat_id} | 发送者ID: {sender_id} | 有文本: {has_text}")
+            logger.info(f"📨 {'编辑消息' if edited else '新消息'} | 群组ID: {chat_id} | 发送者ID: {sender_id} | 有文本: {has_text}")
+            
+            # 记录文本哈希；编辑事件文本未变化（如仅修改格式、媒体）时直接跳过
+            recent = None
+            if self.recent_messages.enabled and text:
+                recent_key = (message.chat_id, message.id)
+                text_hash = DuplicateWindow.fingerprint(text)
+                recent = self.recent_messages.get(recent_key)
+                if edited and recent and recent.text_hash == text_hash:
+                    logger.debug(f"⊘ 跳过：编辑后文本未变化")
+                    return
+                recent = self.recent_messages.remember(recent_key, text_hash)
             
             # 检查黑名单
-            from services.blacklist_service import BlacklistService
-            blacklist_service = BlacklistService()
-            if await blacklist_service.is_blacklisted(user_id=sender_id, chat_id=chat_id):
+            if self.blacklist_service is None:
+                from services.blacklist_service import BlacklistService
+                self.blacklist_service = BlacklistService()
+            if await self.blacklist_service.is_blacklisted(user_id=sender_id, chat_id=chat_id):
                 logger.info(f"🚫 跳过：用户或群组在黑名单中")
                 return
             
+            # 核对发送者当前的用户名，用户匹配规则引用的用户名易主时按需刷新
+            if self._keyword_matcher and message.sender is not None:
+                self._keyword_matcher.observe_sender(message.sender_id, getattr(message.sender, 'username', None))
+            
             # 跳过空消息
-            if not message.text:
+            if not text:
                 logger.debug(f"⊘ 跳过：消息无文本内容")
                 return
             
-            logger.debug(f"消息内容预览: {message.text[:50]}...")
+            logger.debug(f"消息内容预览: {text[:50]}...")
             
             # 检查关键词匹配
             logger.debug(f"开始关键词匹配...")
-            matched_keywords = await keyword_matcher.match_message(
-                message.text,
+            matched_keywords = await self.match_batcher.match(
+                text,
                 message.sender_id,
                 message.chat_id
             )
             
             if not matched_keywords:
+                # 已转发过的消息被编辑成不再命中：在原告警上注明，避免告警内容与原消息不符
+                if edited and recent and recent.alert_id:
+                    formatted_message = await self._format_message(message, [], text=text)
+                    await self._edit_via_bot(
+                        recent.alert_id, f"{EDITED_UNMATCHED_NOTICE}\n{formatted_message}", recent.reply_markup
+                    )
+                    logger.info(f"✏️ 已更新告警 {recent.alert_id}：编辑后不再匹配任何关键词")
+                    return
                 logger.debug(f"⊘ 跳过：未匹配任何关键词")
                 return
             
             logger.info(f"✓ 匹配到关键词: {[kw.content for kw in matched_keywords]}")
             
+            # 编辑后的消息已经转发过：原地更新告警，不再发送新消息
+            if edited and recent and recent.alert_id:
+                formatted_message = await self._format_message(message, matched_keywords, text=text)
+                await self._edit_via_bot(recent.alert_id, formatted_message, recent.reply_markup)
+                logger.info(f"✏️ 已更新告警 {recent.alert_id}")
+                return
+            
+            # 冷却检查：同一发送者/群组在冷却窗口内重复命中同一关键词时抑制
+            suppressed = 0
+            if self.alert_throttle.enabled:
+                allowed, suppressed = self.alert_throttle.check(
+                    message.sender_id, message.chat_id, [kw.id for kw in matched_keywords]
+                )
+                if not allowed:
+                    logger.info(f"⊘ 抑制：关键词处于冷却期")
+                    return
+            
+            # 跨群组去重：窗口内相同内容只转发一次，其余来源合并到首条告警
+            dup_entry = None
+            if self.duplicate_window.enabled:
+                is_first, dup_entry = self.duplicate_window.claim(text)
+                if not is_first:
+                    chat = await self._get_message_peer(message, 'chat')
+                    dup_entry.extra_sources.append(self._build_chat_link(chat, message.chat_id, message.id))
+                    self._schedule_duplicate_edit(dup_entry)
+                    logger.info(f"⊘ 合并：与窗口内已转发的告警内容重复")
+                    return
+            
             # 格式化消息
             logger.debug(f"开始格式化消息...")
-            formatted_message = await self._format_message(message, matched_keywords)
+            formatted_message = await self._format_message(message, matched_keywords, suppressed, text)
             
             # 使用 Bot API 发送消息
             logger.info(f"📤 准备通过Bot转发到目标群组: {self.target_chat_id}")
-            await self._send_via_bot(formatted_message, sender_id, chat_id, message.id)
+            try:
+                alert_id, reply_markup = await self._send_via_bot(formatted_message, sender_id, chat_id, message.id)
+            except Exception:
+                if dup_entry:
+                    self.duplicate_window.release(text, dup_entry)
+                raise
+            
+            if dup_entry:
+                self.duplicate_window.mark_sent(dup_entry, alert_id, formatted_message, reply_markup)
+            if recent:
+                recent.alert_id = alert_id
+                recent.reply_markup = reply_markup
             
             logger.info(f"✅ 消息转发成功！")
             
         except Exception as e:
             logger.error(f"❌ 处理消息失败: {e}", exc_info=True)
     
-    async def _send_via_bot(self, text: str, sender_id: int, source_chat_id: int, message_id: int):
-        """通过 Bot API 发送消息"""
+    async def _get_message_peer(self, message, attr: str):
+        """
+        告警热路径获取发送者/聊天（attr 为 sender 或 chat）
+        不进入任何通道，处于退避期时不等待，直接使用消息自带的实体
+        """
+        try:
+            return await self.rpc.call('get_entity', getattr(message, f'get_{attr}'), wait=False)
+        except RpcBackoffError:
+            return getattr(message, attr)
+    
+    def _schedule_duplicate_edit(self, entry):
+        """安排一次合并编辑，已有待执行的编辑时直接复用"""
+        if entry.edit_task and not entry.edit_task.done():
+            return
+        entry.edit_task = asyncio.create_task(self._flush_duplicate_edit(entry))
+    
+    async def _flush_duplicate_edit(self, entry):
+        """把窗口内累积的重复来源编辑进首条告警"""
+        try:
+            await entry.sent.wait()
+            rendered = 0
+            # 编辑请求进行中又有新来源加入时，再编辑一轮
+            while entry.message_id and len(entry.extra_sources) > rendered:
+                await asyncio.sleep(self.dedup_edit_delay)
+                rendered = len(entry.extra_sources)
+                await self._edit_via_bot(entry.message_id, DuplicateWindow.render(entry), entry.reply_markup)
+                logger.info(f"✏️ 已合并 {rendered} 个重复来源到告警 {entry.message_id}")
+        except Exception as e:
+            logger.warning(f"合并重复告警失败: {e}")
+    
+    def _get_bot_target_id(self) -> int:
+        """将目标群组ID转换为Bot API格式"""
+        # Telethon 返回的超级群组ID是正数，Bot API 需要 -100 前缀
+        target_id = self.target_chat_id
+        if target_id > 0:
+            # Telethon 格式的超级群组ID，需要转换为 Bot API 格式
+            target_id = -1000000000000 - target_id
+        # 如果已经是负数，保持不变
+        return target_id
+    
+    async def _call_bot_api(self, method: str, payload: Dict) -> Dict:
+        """调用 Bot API，返回 result 字段"""
         import httpx
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
         
         bot_token = config('BOT_TOKEN')
         
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"https://api.telegram.org/bot{bot_token}/{method}",
+                json=payload,
+                timeout=30.0
+            )
+            
+            if response.status_code != 200:
+                # 网关错误等情况下响应体不一定是 JSON
+                try:
+                    description = response.json().get('description', 'Unknown error')
+                except ValueError:
+                    description = f"HTTP {response.status_code}: {response.text[:200]}"
+                logger.error(f"Bot API {method} 失败: {description}")
+                raise Exception(f"Bot API error: {description}")
+            
+            return response.json().get('result') or {}
+    
+    async def _edit_via_bot(self, alert_id: int, text: str, reply_markup: Optional[str] = None):
+        """通过 Bot API 编辑已发送的告警"""
+        payload = {
+            "chat_id": self._get_bot_target_id(),
+            "message_id": alert_id,
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True,
+        }
+        
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        
+        await self._call_bot_api("editMessageText", payload)
+    
+    async def _send_via_bot(self, text: str, sender_id: int, source_chat_id: int,
+                            message_id: int) -> Tuple[Optional[int], Optional[str]]:
+        """
+        通过 Bot API 发送消息
+        返回: (告警消息ID, 按钮JSON)
+        """
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        
         # 构建按钮
         keyboard = []
         
@@ -644,85 +1238,72 @@ class TelegramClientManager:
         if row1:
             keyboard.append(row1)
         
-        # 第二行：广告按钮
-        try:
-            from core.ad_integration import get_ad_service
-            ad_service = get_ad_service()
-            if ad_service and ad_service.manager:
-                ad_button_configs = ad_service.manager.get_buttons()
-                if ad_button_configs:
-                    ad_row = [
-                        InlineKeyboardButton(btn["text"], url=btn["url"])
-                        for btn in ad_button_configs
-                    ]
-                    keyboard.append(ad_row)
-        except Exception as e:
-            logger.warning(f"获取广告按钮失败: {e}")
+        # 第二行：广告按钮（缓存的片段）
+        ad_row = self.alert_renderer.fragments.get().buttons
+        if ad_row:
+            keyboard.append(ad_row)
         
-        reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+        reply_markup = InlineKeyboardMarkup(keyboard).to_json() if keyboard else None
         
         # 调用 Bot API 发送消息
-        async with httpx.AsyncClient() as client:
-            # 需要将目标群组ID转换为Bot API格式
-            # Telethon 返回的超级群组ID是正数，Bot API 需要 -100 前缀
-            target_id = self.target_chat_id
-            if target_id > 0:
-                # Telethon 格式的超级群组ID，需要转换为 Bot API 格式
-                target_id = -1000000000000 - target_id
-            # 如果已经是负数，保持不变
-            
-            logger.info(f"Bot API 目标ID: {target_id}")
-            
-            payload = {
-                "chat_id": target_id,
-                "text": text,
-                "parse_mode": "Markdown",
-                "disable_web_page_preview": True,
-            }
-            
-            if reply_markup:
-                payload["reply_markup"] = reply_markup.to_json()
-            
-            response = await client.post(
-                f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                json=payload,
-                timeout=30.0
-            )
-            
-            if response.status_code != 200:
-                result = response.json()
-                logger.error(f"Bot API 发送失败: {result}")
-                raise Exception(f"Bot API error: {result.get('description', 'Unknown error')}")
+        target_id = self._get_bot_target_id()
+        logger.info(f"Bot API 目标ID: {target_id}")
+        
+        payload = {
+            "chat_id": target_id,
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True,
+        }
+        
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        
+        result = await self._call_bot_api("sendMessage", payload)
+        return result.get('message_id'), reply_markup
     
-    async def _format_message(self, message, matched_keywords) -> str:
-        """格式化消息"""
+    def _build_chat_link(self, chat, chat_id: int, message_id: int) -> str:
+        """构建来源群组链接（HTML）"""
+        chat_name = html.escape(getattr(chat, 'title', 'Private Chat'), quote=False)
+        chat_username = getattr(chat, 'username', None)
+        
+        if chat_username:
+            return f'<a href="https://t.me/{chat_username}">{chat_name}</a>'
+        elif chat_id < 0:
+            # 超级群组/频道
+            return f'<a href="https://t.me/c/{abs(chat_id) % 10000000000}/{message_id}">{chat_name}</a>'
+        return chat_name
+    
+    async def _format_message(self, message, matched_keywords, suppressed: int = 0,
+                              text: Optional[str] = None) -> str:
+        """
+        按告警模板格式化消息（HTML），按关键词设置的样式标注命中内容
+        suppressed: 冷却期间被抑制的相似命中数
+        text: 消息内容，默认取 message.text（相册传入合并后的说明文字）
+        """
+        if text is None:
+            text = message.text
+        
         try:
-            # 获取发送者信息
-            sender = await message.get_sender()
+            # 获取发送者和聊天（之后的格式化不再等待，计入格式化耗时）
+            sender = await self._get_message_peer(message, 'sender')
+            chat = await self._get_message_peer(message, 'chat')
+            started = time.perf_counter()
+            
             sender_name = getattr(sender, 'first_name', '') or getattr(sender, 'title', 'Unknown')
+            sender_name = html.escape(sender_name, quote=False)
             sender_username = getattr(sender, 'username', None)
             sender_id = message.sender_id
             
             # 获取聊天信息
-            chat = await message.get_chat()
-            chat_name = getattr(chat, 'title', 'Private Chat')
             chat_id = message.chat_id
             chat_username = getattr(chat, 'username', None)
             
             # 构建用户链接
             if sender_username:
-                user_link = f"[{sender_name}](https://t.me/{sender_username})"
+                user_link = f'<a href="https://t.me/{sender_username}">{sender_name}</a>'
             else:
-                user_link = f"[{sender_name}](tg://user?id={sender_id})"
-            
-            # 构建群组链接
-            if chat_username:
-                chat_link = f"[{chat_name}](https://t.me/{chat_username})"
-            elif chat_id < 0:
-                # 超级群组/频道
-                chat_link = f"[{chat_name}](https://t.me/c/{abs(chat_id) % 10000000000}/{message.id})"
-            else:
-                chat_link = chat_name
+                user_link = f'<a href="tg://user?id={sender_id}">{sender_name}</a>'
             
             # 构建消息链接
             if chat_username:
@@ -732,83 +1313,98 @@ class TelegramClientManager:
             else:
                 msg_link = None
             
-            # 应用样式
-            styled_text = message.text
-            if msg_link:
-                styled_text = f"[{message.text}]({msg_link})"
-            
-            # 获取广告配置
-            header_title = "📨 实时精准获客"
-            header_author = ""
-            
-            try:
-                from core.ad_integration import get_ad_service
-                ad_service = get_ad_service()
-                if ad_service and ad_service.manager:
-                    header = ad_service.manager.get_header()
-                    if header:
-                        header_title = header.get('title', header_title)
-                        header_author = header.get('author', '')
-            except Exception as e:
-                logger.warning(f"获取header配置失败: {e}")
-            
-            # 构建标题
-            title = header_title
-            if header_author:
-                title += f" {header_author}"
-            
-            # 格式化消息
-            formatted = f"""{title}
-
-用户: {user_link}
-来源: 🔍 {chat_link}
-内容: {styled_text}
-时间: {format_datetime(message.date)}
-命中关键词: {', '.join([kw.content for kw in matched_keywords])}
-"""
-            
-            # 添加消息内广告链接（使用 ads 配置）
-            try:
-                from core.ad_integration import get_ad_service
-                ad_service = get_ad_service()
-                if ad_service and ad_service.manager:
-                    ads = ad_service.manager.get_ads()
-                    if ads:
-                        formatted += "\n"
-                        for ad in ads:
-                            formatted += f"🔗 [{ad['title']}]({ad['url']})\n"
-            except Exception as e:
-                logger.warning(f"获取广告链接失败: {e}")
+            # 标注命中内容并应用关键词样式
+            spans = []
+            if self._keyword_matcher:
+                spans = self._keyword_matcher.match_spans(text, matched_keywords)
+            
+            # 按模板填入本条告警的内容，标题和广告使用缓存的片段
+            formatted = self.alert_renderer.render(
+                user=user_link,
+                chat=self._build_chat_link(chat, chat_id, message.id),
+                content=render_highlights(text, spans, msg_link),
+                time=format_datetime(message.date),
+                keywords=html.escape(', '.join([kw.content for kw in matched_keywords]), quote=False),
+                suppressed=f"🔕 另有 +{suppressed} 条相似命中已抑制\n" if suppressed else "",
+            )
             
-            formatted += "\n---"
+            elapsed = time.perf_counter() - started
+            self.alert_renderer.record(elapsed)
+            logger.debug(f"告警格式化耗时: {elapsed * 1000:.2f}ms")
             
             return formatted
             
         except Exception as e:
             logger.error(f"格式化消息失败: {e}")
-            return message.text
+            return html.escape(text, quote=False)
     
-    async def set_proxy(self, proxy_type: str, proxy_url: str = None) -> bool:
-        """设置代理"""
+    async def set_proxy(self, proxies: List[Dict]) -> bool:
+        """设置代理列表（空列表为直连），立即探测并切换到最快的可用代理"""
         try:
-            proxy_config = {
-                'type': proxy_type,
-                'url': proxy_url
-            }
-            
-            await set_config("proxy_config", json.dumps(proxy_config))
-            
-            # 如果客户端已连接，需要重新连接以应用代理
-            if self.client and self.client.is_connected():
-                await self.client.disconnect()
-                # 重新创建客户端时会应用新的代理设置
-            
+            await set_config("proxy_config", json.dumps({'proxies': proxies}))
+            await self.reload_proxy()
+            await publish('reload_proxy')
             return True
             
         except Exception as e:
             logger.error(f"设置代理失败: {e}")
             return False
     
+    async def reload_proxy(self):
+        """重新读取代理配置，探测后切换到最快的可用代理"""
+        await self.proxy_pool.stop()
+        self.proxy_pool.load(await self.get_proxy_config())
+        await self.proxy_pool.probe_all()
+        await self._switch_proxy(self.proxy_pool.select())
+        self.proxy_pool.start(self._switch_proxy)
+    
+    def _proxy_params(self, endpoint) -> Tuple[type, object]:
+        """代理对应的 TelegramClient connection/proxy 参数，None 为直连"""
+        if endpoint is None:
+            return ConnectionTcpFull, None
+        logger.info(f"使用代理: {endpoint.type} {endpoint.host}:{endpoint.port}")
+        return endpoint.to_telethon()
+    
+    async def _switch_proxy(self, endpoint):
+        """切换所有账号的代理，已连接时断开重连使其生效"""
+        connection, proxy = self._proxy_params(endpoint)
+        
+        # set_proxy 不能改变连接类型，Socks5 与 MTProxy 互切时重建客户端
+        if connection is not self.connection_type:
+            for account in self._monitor_accounts():
+                await self._rebuild_client(account)
+            return
+        
+        for account in self._monitor_accounts():
+            client = account.client
+            client.set_proxy(proxy)
+            
+            if client.is_connected():
+                await client.disconnect()
+                # 监控运行时由连接监督器重连并补拉缺口
+                if not account.supervisor.running:
+                    await client.connect()
+    
+    async def _rebuild_client(self, account: MonitorAccount):
+        """按当前代理重建账号的客户端（会话文件不变），监控中的账号重新注册处理器并补拉缺口"""
+        monitoring = account.supervisor.running
+        if monitoring:
+            await self._stop_account(account)
+        was_connected = account.client.is_connected()
+        # 断开时会话写回文件，新客户端从同一文件读取
+        await account.client.disconnect()
+        
+        fingerprint = self.device_fingerprint if account.primary else self._account_fingerprint(account.phone)
+        account.client = self._build_client(account.phone, fingerprint)
+        if account.primary:
+            self.client = account.client
+        self.rpc.invalidate()
+        
+        if was_connected or monitoring:
+            await account.client.connect()
+        if monitoring and self._keyword_matcher:
+            await self._start_account(account, self._keyword_matcher)
+    
     async def get_proxy_config(self) -> Dict:
         """获取代理配置"""
         try:
@@ -0,0 +1,118 @@
+"""
+更新状态持久化
+定期记录 Telethon 更新状态（账号 pts/qts/date/seq 及每个频道的 pts），
+开始监控时只补拉上次记录之后的缺口，而不是每次都全量 catch_up
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from telethon._updates import ChannelState, Entity, EntityType, SessionState
+
+from core.database import get_config, set_config
+
+logger = logging.getLogger(__name__)
+
+# SystemConfig 中保存更新状态的键
+UPDATE_STATE_KEY = "update_state"
+
+
+class UpdateStateStore:
+    """
+    更新状态存储
+    注意：读写的是 Telethon 内部的 MessageBox（1.32），升级 Telethon 时需要复查
+    """
+
+    def __init__(self, flush_interval: float = 30, max_age: float = 3600, key: str = UPDATE_STATE_KEY):
+        self.flush_interval = flush_interval
+        # 多账号时每个账号使用各自的键
+        self.key = key
+        # 记录超过该时长（秒）就不再补拉，0 表示从不补拉
+        self.max_age = max_age
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def save(self, client) -> bool:
+        """保存客户端当前的更新状态"""
+        try:
+            if client is None or client._message_box.is_empty():
+                return False
+
+            ss, cs = client._message_box.session_state()
+            state = {
+                'pts': ss['pts'],
+                'qts': ss['qts'],
+                'date': int(ss['date'].timestamp()),
+                'seq': ss['seq'],
+                'channels': {str(channel_id): pts for channel_id, pts in cs.items()},
+                'saved_at': time.time(),
+            }
+            await set_config(self.key, json.dumps(state))
+            return True
+        except Exception as e:
+            logger.warning(f"保存更新状态失败: {e}")
+            return False
+
+    async def load(self) -> Optional[Dict]:
+        """读取上次保存的更新状态"""
+        try:
+            state_str = await get_config(self.key)
+            return json.loads(state_str) if state_str else None
+        except Exception as e:
+            logger.warning(f"读取更新状态失败: {e}")
+            return None
+
+    async def restore(self, client) -> bool:
+        """
+        把上次保存的状态装回客户端
+        返回 True 表示已装载，之后调用 catch_up 只会补拉缺口；
+        没有记录或记录过旧时返回 False，从当前状态开始监控
+        """
+        state = await self.load()
+        if not state:
+            logger.info("没有已保存的更新状态，跳过补拉")
+            return False
+
+        age = time.time() - state.get('saved_at', 0)
+        if self.max_age <= 0 or age > self.max_age:
+            logger.info(f"已保存的更新状态过旧（{int(age)}秒前），跳过补拉")
+            return False
+
+        try:
+            ss = SessionState(0, 0, False, state['pts'], state['qts'], state['date'], state['seq'], None)
+            cs = [ChannelState(int(channel_id), pts) for channel_id, pts in state['channels'].items()]
+            client._message_box.load(ss, cs)
+
+            # 频道补拉需要 access_hash，和 Telethon 连接时的处理一致，从会话中取出
+            for channel_state in cs:
+                try:
+                    entity = client.session.get_input_entity(channel_state.channel_id)
+                except ValueError:
+                    continue
+                client._mb_entity_cache.put(Entity(EntityType.CHANNEL, entity.channel_id, entity.access_hash))
+
+            logger.info(f"已装载 {int(age)} 秒前的更新状态，频道数: {len(cs)}")
+            return True
+        except Exception as e:
+            logger.warning(f"装载更新状态失败: {e}")
+            return False
+
+    def start(self, client):
+        """开始定期保存更新状态"""
+        if self.flush_interval <= 0 or (self._flush_task and not self._flush_task.done()):
+            return
+        self._flush_task = asyncio.create_task(self._flush_loop(client))
+
+    async def stop(self, client):
+        """停止定期保存，并保存最后一次状态"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.save(client)
+
+    async def _flush_loop(self, client):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.save(client)
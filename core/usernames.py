@@ -0,0 +1,182 @@
+"""
+用户名解析缓存
+用户匹配规则中的 @username 在添加时解析成用户ID并持久化，之后在后台定期刷新；
+匹配热路径只做 sender_id 查表，不发起任何请求。
+收到消息时顺带核对发送者当前的用户名，发现用户名易主或被改掉时才按需重新解析
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from core.database import AsyncSessionLocal, UsernameCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_username(username: str) -> str:
+    """用户名的比较形式（去掉 @，不区分大小写）"""
+    return username.strip().lstrip('@').lower()
+
+
+class UsernameResolver:
+    """
+    用户名 -> 用户ID 的缓存
+    resolve_func 负责真正发起解析请求（应走带 FloodWait 退避的 RPC 通道），
+    on_change 在某个用户名对应的用户ID变化后调用
+    """
+
+    def __init__(self, refresh_interval: float = 21600, retry_interval: float = 600):
+        # 已解析的用户名多久刷新一次；解析失败的用户名多久重试一次（秒）
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.resolve_func: Optional[Callable[[str], Awaitable[Optional[int]]]] = None
+        self.on_change: Optional[Callable[[str, Optional[int]], Awaitable]] = None
+
+        self._ids: Dict[str, Optional[int]] = {}
+        # 用户ID -> 解析到它的用户名，用于发现用户改名
+        self._owners: Dict[int, Set[str]] = {}
+        # 上次解析时间（time.time()）
+        self._resolved_at: Dict[str, float] = {}
+        # 正在重新解析的用户名
+        self._stale: Set[str] = set()
+        self._loaded = False
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    def get(self, username: str) -> Optional[int]:
+        return self._ids.get(normalize_username(username))
+
+    def remember(self, username: str, user_id: Optional[int] = None):
+        """登记需要解析和刷新的用户名，已知ID时一并记录（不覆盖已有的解析结果）"""
+        username = normalize_username(username)
+        if self._ids.get(username) is None:
+            if user_id is None:
+                self._ids.setdefault(username, None)
+            else:
+                self._set(username, user_id, time.time())
+
+    def _set(self, username: str, user_id: Optional[int], resolved_at: float) -> bool:
+        """更新内存映射，返回用户ID是否变化"""
+        old = self._ids.get(username)
+        self._ids[username] = user_id
+        self._resolved_at[username] = resolved_at
+        if old == user_id:
+            return False
+        if old is not None:
+            names = self._owners.get(old)
+            if names:
+                names.discard(username)
+                if not names:
+                    del self._owners[old]
+        if user_id is not None:
+            self._owners.setdefault(user_id, set()).add(username)
+        return True
+
+    async def load(self):
+        """从数据库加载已解析的用户名"""
+        if self._loaded:
+            return
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(UsernameCache))
+            for item in result.scalars().all():
+                self._set(item.username, item.user_id,
+                          item.resolved_at.timestamp() if item.resolved_at else 0)
+        self._loaded = True
+
+    async def _save(self, username: str, user_id: Optional[int]):
+        try:
+            async with AsyncSessionLocal() as session:
+                stmt = insert(UsernameCache).values(username=username, user_id=user_id, resolved_at=datetime.now())
+                await session.execute(stmt.on_conflict_do_update(
+                    index_elements=[UsernameCache.username],
+                    set_={'user_id': stmt.excluded.user_id, 'resolved_at': stmt.excluded.resolved_at},
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"保存用户名解析结果失败 @{username}: {e}")
+
+    async def _notify(self, username: str, user_id: Optional[int]):
+        logger.info(f"👤 用户名 @{username} -> {user_id if user_id is not None else '未找到'}")
+        if self.on_change:
+            await self.on_change(username, user_id)
+
+    async def _update(self, username: str, user_id: Optional[int]):
+        changed = self._set(username, user_id, time.time())
+        await self._save(username, user_id)
+        if changed:
+            await self._notify(username, user_id)
+
+    async def _adopt(self, username: str, user_id: int):
+        await self._save(username, user_id)
+        await self._notify(username, user_id)
+
+    async def resolve(self, username: str) -> Optional[int]:
+        """立即解析用户名；请求失败（未登录、退避中等）时保留原有结果"""
+        username = normalize_username(username)
+        self._ids.setdefault(username, None)
+        if self.resolve_func is None:
+            return self._ids[username]
+        try:
+            user_id = await self.resolve_func(username)
+        except Exception as e:
+            logger.warning(f"解析用户名 @{username} 失败: {e}")
+            self._resolved_at[username] = time.time()
+            return self._ids[username]
+        await self._update(username, user_id)
+        return user_id
+
+    def observe(self, sender_id: int, username: Optional[str]):
+        """
+        用消息发送者的当前用户名核对缓存（只查字典，不发请求）
+        username 为发送者当前的用户名，没有用户名时为 None
+        """
+        name = normalize_username(username) if username else ''
+        if name and name in self._ids and self._ids[name] != sender_id:
+            # 用户名现在属于这个发送者，直接更新
+            self._set(name, sender_id, time.time())
+            self._spawn(self._adopt(name, sender_id))
+        names = self._owners.get(sender_id)
+        if names:
+            for old_name in names:
+                if old_name != name and old_name not in self._stale:
+                    # 该用户已不再使用这个用户名，重新解析看它现在属于谁
+                    self._stale.add(old_name)
+                    self._spawn(self._refresh(old_name))
+
+    async def _refresh(self, username: str):
+        self._stale.add(username)
+        try:
+            await self.resolve(username)
+        finally:
+            self._stale.discard(username)
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def start(self):
+        """开始后台刷新"""
+        if self.refresh_interval <= 0 or (self._refresh_task and not self._refresh_task.done()):
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(min(self.retry_interval, self.refresh_interval))
+            now = time.time()
+            for username, user_id in list(self._ids.items()):
+                interval = self.refresh_interval if user_id is not None else self.retry_interval
+                if now - self._resolved_at.get(username, 0) >= interval and username not in self._stale:
+                    await self._refresh(username)
@@ -3,9 +3,12 @@
 提供全项目通用的工具函数
 """
 
+import re
 from datetime import datetime
 from typing import Optional
 import pytz
+from telethon.utils import get_peer_id, resolve_id
+from telethon.tl.types import PeerChannel, PeerUser
 
 
 def get_current_time(timezone: str = 'Asia/Shanghai', format: str = '%Y-%m-%d %H:%M:%S') -> str:
@@ -93,3 +96,59 @@ def get_relative_time(dt: datetime) -> str:
         return f"{days}天前"
     else:
         return format_datetime(dt, format='%Y-%m-%d')
+
+
+def format_duration(seconds: float) -> str:
+    """
+    格式化时长
+    
+    Args:
+        seconds: 秒数
+        
+    Returns:
+        时长描述，如 "45秒"、"3分12秒"、"2天5小时"
+    """
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    
+    if days:
+        return f"{days}天{hours}小时"
+    elif hours:
+        return f"{hours}小时{minutes}分"
+    elif minutes:
+        return f"{minutes}分{seconds}秒"
+    else:
+        return f"{seconds}秒"
+
+
+def normalize_chat_id(value, assume_channel: bool = False) -> int:
+    """
+    把群组ID统一为带标记的形式（与 Telethon 的 message.chat_id 一致）
+    
+    Args:
+        value: -100 开头的频道/超级群组ID，或其他负数的普通群组ID
+        assume_channel: 是否把正数当作频道/超级群组的原始ID（补上 -100 前缀）；
+                        正数无法区分普通群组和频道，只用于读取早期保存的数据
+        
+    Returns:
+        带标记的群组ID
+        
+    Raises:
+        ValueError: 不是上述格式
+    """
+    text = str(value).strip()
+    if not re.fullmatch(r'-?\d+', text) or int(text) == 0:
+        raise ValueError(f"无效的群组ID: {value}")
+    
+    chat_id = int(text)
+    if chat_id > 0:
+        if not assume_channel:
+            raise ValueError(f"无效的群组ID: {value}（请使用 - 或 -100 开头的群组ID）")
+        return get_peer_id(PeerChannel(chat_id))
+    
+    real_id, peer_type = resolve_id(chat_id)
+    if real_id <= 0 or peer_type is PeerUser:
+        raise ValueError(f"无效的群组ID: {value}")
+    return get_peer_id(peer_type(real_id))
@@ -0,0 +1,166 @@
+"""
+监控工作进程
+分进程模式下运行 Telethon 客户端、关键词匹配和告警转发，
+通过回环地址上的 TCP 连接接收界面进程的指令以及关键词/黑名单增量；
+会话文件只由负责该账号的工作进程打开，界面进程的登录和查询也在这里执行
+"""
+
+import asyncio
+import logging
+import signal
+
+from decouple import config
+
+
+def run_worker(index: int, count: int, token: str, port_writer):
+    """工作进程入口（由 WorkerPool 以 spawn 方式启动），开始监听后把端口号写入 port_writer"""
+    logging.basicConfig(
+        format=f'%(asctime)s - worker{index} - %(name)s - %(levelname)s - %(message)s',
+        level=getattr(logging, config('LOG_LEVEL', default='INFO'))
+    )
+    asyncio.run(_worker_main(index, count, token, port_writer))
+
+
+async def _worker_main(index: int, count: int, token: str, port_writer):
+    from core.ad_integration import init_ad_system
+    from core.database import init_database
+    from core.ipc import WorkerServer
+    from core.telegram_client import telegram_client_manager as manager
+    from services.blacklist_service import BlacklistService
+    from services.keyword_service import KeywordService, rule_matcher, username_resolver
+
+    logger = logging.getLogger(__name__)
+
+    await init_database()
+    await init_ad_system()
+
+    # 账号按手机号分片到各个工作进程，主账号在 0 号进程
+    manager.worker_index = index
+    manager.worker_count = count
+
+    # 规则和黑名单常驻内存，之后只接收增量
+    keyword_matcher = KeywordService()
+    await keyword_matcher.load_rules()
+    manager.blacklist_service = BlacklistService()
+    await manager.blacklist_service.load()
+
+    stop_event = asyncio.Event()
+
+    async def start_monitoring():
+        return await manager.start_monitoring(keyword_matcher)
+
+    async def stop_monitoring():
+        return await manager.stop_monitoring()
+
+    async def status():
+        return {
+            'is_monitoring': manager.is_monitoring,
+            'connection': manager.supervisor.get_stats(),
+            'accounts': manager.get_accounts_status(),
+            'rules': rule_matcher.get_status(),
+            'alerts': manager.alert_renderer.get_stats(),
+        }
+
+    async def keywords_delta(**delta):
+        keyword_matcher.apply_delta(**delta)
+
+    async def blacklist_delta(**delta):
+        manager.blacklist_service.apply_delta(**delta)
+
+    async def set_target_chat(chat_id: int):
+        manager.target_chat_id = chat_id
+
+    async def reload_accounts():
+        await manager.load_accounts()
+
+    async def reload_proxy():
+        await manager.reload_proxy()
+
+    async def reload_alert_template():
+        await manager.reload_alert_template()
+
+    # 会话文件只由本进程打开，界面进程的登录、账号信息、对话列表等请求都转到这里
+    async def is_logged_in():
+        return await manager.is_logged_in()
+
+    async def login_with_phone(phone: str, extra: bool = False):
+        return await manager.login_with_phone(phone, extra)
+
+    async def verify_code(phone: str, code: str):
+        return await manager.verify_code(phone, code)
+
+    async def verify_email_code(email_code: str):
+        return await manager.verify_email_code(email_code)
+
+    async def verify_password(password: str):
+        return await manager.verify_password(password)
+
+    async def logout():
+        return await manager.logout()
+
+    async def get_user_info():
+        return await manager.get_user_info()
+
+    async def rpc_backoff():
+        return manager.rpc.get_stats()
+
+    async def get_available_chats():
+        return await manager.get_available_chats()
+
+    async def get_target_chat():
+        return await manager.get_target_chat()
+
+    async def proxy_status():
+        return manager.proxy_pool.get_status()
+
+    async def resolve_username(username: str):
+        return await manager.resolve_username(username)
+
+    server = WorkerServer(token, {
+        'start_monitoring': start_monitoring,
+        'stop_monitoring': stop_monitoring,
+        'status': status,
+        'keywords_delta': keywords_delta,
+        'blacklist_delta': blacklist_delta,
+        'set_target_chat': set_target_chat,
+        'reload_accounts': reload_accounts,
+        'reload_proxy': reload_proxy,
+        'reload_alert_template': reload_alert_template,
+        'is_logged_in': is_logged_in,
+        'login_with_phone': login_with_phone,
+        'verify_code': verify_code,
+        'verify_email_code': verify_email_code,
+        'verify_password': verify_password,
+        'logout': logout,
+        'get_user_info': get_user_info,
+        'rpc_backoff': rpc_backoff,
+        'get_available_chats': get_available_chats,
+        'get_target_chat': get_target_chat,
+        'proxy_status': proxy_status,
+        'resolve_username': resolve_username,
+    })
+    # 慢规则只上报给界面进程，由它写入停用标记并推送给所有工作进程，管理员只收到一次通知
+    async def report_slow_rule(rule_id: int, average_ms: float):
+        await server.notify('rule_slow', rule_id=rule_id, average_ms=average_ms)
+
+    rule_matcher.stats.on_slow = report_slow_rule
+    port_writer.send(await server.start())
+    port_writer.close()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows 的事件循环不支持信号处理，terminate() 直接结束进程
+            pass
+
+    logger.info(f"监控工作进程 {index}/{count} 已就绪")
+    await stop_event.wait()
+
+    await manager.stop_monitoring()
+    await server.stop()
+    await rule_matcher.stats.stop()
+    await username_resolver.stop()
+    rule_matcher.close()
+    logger.info(f"监控工作进程 {index} 已退出")
@@ -6,6 +6,7 @@ Telegram Monitor Bot - 简化版
 
 import asyncio
 import logging
+import multiprocessing
 import sys
 from pathlib import Path
 
@@ -15,6 +16,7 @@ from telegram.ext import Application
 from bot.handlers import setup_handlers
 from core.database import init_database
 from core.ad_integration import init_ad_system
+from core.ipc import WorkerPool, get_worker_pool, set_worker_pool
 
 
 # 配置日志
@@ -29,6 +31,17 @@ async def post_init(app: Application) -> None:
     """Bot初始化后的回调"""
     logger.info("Bot已连接到Telegram")
     
+    # 分进程模式：监控在独立的工作进程中运行，本进程只负责 Bot 界面
+    if config('PROCESS_MODE', default='single') == 'split':
+        from services.keyword_service import disable_slow_rule
+        
+        pool = WorkerPool(
+            config('MONITOR_WORKERS', default=1, cast=int),
+            events={'rule_slow': disable_slow_rule},
+        )
+        await pool.start()
+        set_worker_pool(pool)
+    
     # 发送启动消息给授权用户
     try:
         from telegram import InlineKeyboardButton, InlineKeyboardMarkup
@@ -62,6 +75,19 @@ async def post_init(app: Application) -> None:
         logger.warning(f"发送启动消息失败: {e}")
 
 
+async def post_shutdown(app: Application) -> None:
+    """Bot停止后的回调"""
+    pool = get_worker_pool()
+    if pool is not None:
+        await pool.stop()
+        set_worker_pool(None)
+        logger.info("监控工作进程已停止")
+    
+    # 写入最后一批规则统计
+    from services.keyword_service import rule_matcher
+    await rule_matcher.stats.stop()
+
+
 async def main() -> None:
     """主函数"""
     try:
@@ -102,7 +128,7 @@ async def main() -> None:
             raise Exception("广告系统完整性验证失败，程序无法启动")
         
         # 创建Bot应用
-        app = Application.builder().token(bot_token).post_init(post_init).build()
+        app = Application.builder().token(bot_token).post_init(post_init).post_shutdown(post_shutdown).build()
         
         # 设置处理器
         setup_handlers(app)
@@ -119,10 +145,13 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
+    # 打包成单文件可执行程序后，spawn 启动的工作进程和匹配分片进程会重新执行本入口，
+    # 必须最先交给 multiprocessing 处理，否则子进程会再启动一个 Bot
+    multiprocessing.freeze_support()
     try:
         # 创建Bot应用
         bot_token = config('BOT_TOKEN')
-        app = Application.builder().token(bot_token).post_init(post_init).build()
+        app = Application.builder().token(bot_token).post_init(post_init).post_shutdown(post_shutdown).build()
         
         # 在同步上下文中初始化数据库和广告系统
         import asyncio
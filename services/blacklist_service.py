@@ -10,6 +10,7 @@ from sqlalchemy import select, func, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.database import AsyncSessionLocal, Blacklist
+from core.ipc import publish
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,29 @@ class BlacklistService:
         1: "群组"
     }
     
+    def __init__(self):
+        # 常驻内存的黑名单ID集合，None 表示每次检查时查询数据库
+        self._users: Optional[set] = None
+        self._chats: Optional[set] = None
+    
+    async def load(self):
+        """把黑名单加载到内存，之后通过 apply_delta 增量更新"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Blacklist))
+            items = result.scalars().all()
+        self._users = {item.target_id for item in items if item.target_type == 0}
+        self._chats = {item.target_id for item in items if item.target_type == 1}
+    
+    def apply_delta(self, op: str, target_type: int, target_id: str):
+        """应用黑名单增量，op 为 add 或 remove"""
+        if self._users is None:
+            return
+        targets = self._users if target_type == 0 else self._chats
+        if op == 'add':
+            targets.add(target_id)
+        elif op == 'remove':
+            targets.discard(target_id)
+    
     async def add_to_blacklist(self, target_id: str, target_type: int = 0, name: str = None) -> Tuple[bool, str]:
         """添加到黑名单"""
         try:
@@ -50,6 +74,7 @@ class BlacklistService:
                 session.add(blacklist_item)
                 await session.commit()
                 
+            await publish('blacklist_delta', op='add', target_type=target_type, target_id=target_id.strip())
             type_name = self.TYPE_NAMES.get(target_type, "未知")
             return True, f"已将{type_name} {target_id} 添加到黑名单"
             
@@ -65,9 +90,11 @@ class BlacklistService:
                 if not item:
                     return False, "记录不存在"
                 
+                target_type, target_id = item.target_type, item.target_id
                 await session.delete(item)
                 await session.commit()
                 
+            await publish('blacklist_delta', op='remove', target_type=target_type, target_id=target_id)
             return True, "已从黑名单移除"
             
         except Exception as e:
@@ -124,6 +151,10 @@ class BlacklistService:
     
     async def is_blacklisted(self, user_id: int = None, chat_id: int = None) -> bool:
         """检查是否在黑名单中"""
+        if self._users is not None:
+            return bool((user_id and str(user_id) in self._users)
+                        or (chat_id and str(chat_id) in self._chats))
+        
         try:
             async with AsyncSessionLocal() as session:
                 # 检查用户黑名单
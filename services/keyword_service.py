@@ -3,18 +3,115 @@
 处理关键词管理和匹配逻辑
 """
 
+import asyncio
 import json
 import re
 import logging
 from typing import List, Optional, Dict, Any, Tuple
 
+from decouple import config
 from sqlalchemy import select, func, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import AsyncSessionLocal, Keyword
+from core.database import AsyncSessionLocal, Keyword, KeywordChat, KeywordStats
+from core.expression import ExpressionError, validate_expression
+from core.highlight import StyledSpan, keyword_style
+from core.proximity import ProximityError, parse_proximity
+from core.ipc import get_worker_pool, publish
+from core.matcher import RuleMatcher
+from core.rule_stats import RuleStats
+from core.usernames import UsernameResolver, normalize_username
+from core.utils import normalize_chat_id
 
 logger = logging.getLogger(__name__)
 
+# 进程内共享的规则匹配器（首次匹配时加载，编辑后增量更新）
+rule_matcher = RuleMatcher(
+    shards=config('MATCH_SHARDS', default=0, cast=int),
+    delta_threshold=config('MATCH_DELTA_THRESHOLD', default=256, cast=int),
+)
+# 规则加载锁：并发到达的首批消息只加载一次
+_rules_load_lock = asyncio.Lock()
+# 规则运行统计（耗时、命中），可选自动停用平均耗时过高的规则（默认关闭）
+rule_matcher.stats = RuleStats(
+    flush_interval=config('RULE_STATS_FLUSH_INTERVAL', default=60, cast=float),
+    max_avg_ms=config('RULE_MAX_AVG_COST_MS', default=0, cast=float),
+    min_evals=config('RULE_MIN_EVALS', default=50, cast=int),
+)
+
+
+async def disable_slow_rule(rule_id: int, average_ms: float):
+    """
+    停用耗时过高的规则：写入停用标记，从本进程和所有工作进程的匹配器移除，并通知管理员
+    在 Bot 进程执行（分进程模式下由工作进程上报），多次上报同一条规则只处理一次
+    """
+    from core.telegram_client import telegram_client_manager
+    
+    if not await rule_matcher.stats.disable(rule_id, average_ms):
+        return
+    async with AsyncSessionLocal() as session:
+        keyword = await session.get(Keyword, rule_id)
+    rule_matcher.apply_delta('delete', ids=[rule_id])
+    await publish('keywords_delta', op='delete', ids=[rule_id])
+    text = (
+        f"⛔ 关键词规则已自动停用\n\n"
+        f"ID: {rule_id}\n"
+        f"内容: {keyword.content if keyword else ''}\n"
+        f"平均耗时: {average_ms:.1f}ms（阈值 {rule_matcher.stats.max_avg_ms:g}ms）\n\n"
+        f"可在关键词编辑页重新启用"
+    )
+    try:
+        await telegram_client_manager._call_bot_api("sendMessage", {
+            "chat_id": config('AUTHORIZED_USER_ID', cast=int),
+            "text": text,
+        })
+    except Exception as e:
+        logger.warning(f"发送规则停用通知失败: {e}")
+
+
+rule_matcher.stats.on_slow = disable_slow_rule
+
+# 用户匹配规则的用户名 -> 用户ID，添加规则时解析，之后后台刷新
+username_resolver = UsernameResolver(
+    refresh_interval=config('USERNAME_REFRESH_INTERVAL', default=21600, cast=float),
+    retry_interval=config('USERNAME_RETRY_INTERVAL', default=600, cast=float),
+)
+
+# Telegram 用户名格式
+USERNAME_PATTERN = re.compile(r'^@?[A-Za-z][A-Za-z0-9_]{3,31}$')
+
+# Keyword 表的列名，匹配结果转换为 Keyword 时忽略其他字段
+_KEYWORD_COLUMNS = {column.name for column in Keyword.__table__.columns}
+
+
+def _is_username_rule(kw_type: int, content: str) -> bool:
+    """是否为按用户名匹配的用户规则（数字ID的规则不需要解析）"""
+    return kw_type == 4 and not content.strip().lstrip('@').lstrip('-').isdigit()
+
+
+async def _resolve_username(username: str) -> Optional[int]:
+    from core.telegram_client import telegram_client_manager
+    
+    # 分进程模式下界面进程不持有客户端，由 0 号工作进程解析
+    pool = get_worker_pool()
+    if pool is not None:
+        return await pool.call('resolve_username', username=username)
+    return await telegram_client_manager.resolve_username(username)
+
+
+async def _on_username_changed(username: str, user_id: Optional[int]):
+    """用户名对应的用户ID变化：更新引用它的用户匹配规则"""
+    rows = [
+        dict(row, user_id=user_id) for row in rule_matcher.rules.values()
+        if _is_username_rule(row['type'], row['content']) and normalize_username(row['content']) == username
+    ]
+    if rows:
+        rule_matcher.apply_delta('upsert', rows=rows)
+
+
+username_resolver.resolve_func = _resolve_username
+username_resolver.on_change = _on_username_changed
+
 
 class KeywordService:
     """关键词服务类"""
@@ -25,7 +122,9 @@ class KeywordService:
         1: "包含匹配", 
         2: "正则表达式",
         3: "模糊匹配",
-        4: "用户匹配"
+        4: "用户匹配",
+        5: "布尔表达式",
+        6: "邻近匹配"
     }
     
     # 动作类型映射
@@ -34,27 +133,175 @@ class KeywordService:
         1: "监控"
     }
     
+    @staticmethod
+    def _keyword_row(kw: Keyword, chats: List[int] = None) -> Dict[str, Any]:
+        """规则的列值（chats 为群组范围，空表示所有群组），用于向工作进程推送增量"""
+        return {
+            'id': kw.id,
+            'content': kw.content,
+            'type': kw.type,
+            'action': kw.action,
+            'is_case_sensitive': kw.is_case_sensitive,
+            'is_bold': kw.is_bold,
+            'is_italic': kw.is_italic,
+            'is_underline': kw.is_underline,
+            'is_strikethrough': kw.is_strikethrough,
+            'is_quote': kw.is_quote,
+            'is_monospace': kw.is_monospace,
+            'is_spoiler': kw.is_spoiler,
+            'chats': list(chats or []),
+            # 用户名规则解析出的用户ID
+            'user_id': username_resolver.get(kw.content) if _is_username_rule(kw.type, kw.content) else None
+        }
+    
+    @staticmethod
+    async def _load_chats(session: AsyncSession, keyword_ids: List[int] = None) -> Dict[int, List[int]]:
+        """读取关键词的群组范围 {关键词ID: [群组ID]}，keyword_ids 为 None 时读取全部"""
+        query = select(KeywordChat)
+        if keyword_ids is not None:
+            query = query.where(KeywordChat.keyword_id.in_(keyword_ids))
+        chats: Dict[int, List[int]] = {}
+        for item in (await session.execute(query)).scalars().all():
+            # 早期保存的可能是频道原始ID，统一为带标记的形式
+            chats.setdefault(item.keyword_id, []).append(normalize_chat_id(item.chat_id, assume_channel=True))
+        return chats
+    
+    @staticmethod
+    def _stats_dict(stats: Optional[KeywordStats]) -> Dict[str, Any]:
+        """规则运行统计的展示字段"""
+        if stats is None:
+            return {'evals': 0, 'avg_cost_ms': None, 'hits': 0, 'last_hit_at': None,
+                    'disabled': False, 'disabled_reason': None}
+        evals = stats.eval_count or 0
+        return {
+            'evals': evals,
+            'avg_cost_ms': round(stats.total_cost_ms / evals, 3) if evals else None,
+            'hits': stats.hit_count or 0,
+            'last_hit_at': stats.last_hit_at.strftime('%Y-%m-%d %H:%M:%S') if stats.last_hit_at else None,
+            'disabled': stats.disabled_at is not None,
+            'disabled_reason': stats.disabled_reason
+        }
+    
+    async def load_rules(self):
+        """把全部启用中的规则加载到匹配器，之后通过 apply_delta 增量更新"""
+        async with _rules_load_lock:
+            await self._load_rules()
+    
+    async def _load_rules(self):
+        await username_resolver.load()
+        # 读取期间到达的增量由匹配器记下，主索引生效时重放
+        await rule_matcher.load(self._read_rules())
+        rule_matcher.stats.start()
+        username_resolver.start()
+        logger.info(f"已加载 {len(rule_matcher.snapshot)} 条关键词规则")
+    
+    async def _read_rules(self) -> List[Dict]:
+        """读取全部启用中的规则列值"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Keyword)
+                .outerjoin(KeywordStats, KeywordStats.keyword_id == Keyword.id)
+                .where(KeywordStats.disabled_at.is_(None))
+            )
+            keywords = result.scalars().all()
+            chats = await self._load_chats(session)
+            rows = [self._keyword_row(kw, chats.get(kw.id)) for kw in keywords]
+        for row in rows:
+            if _is_username_rule(row['type'], row['content']):
+                username_resolver.remember(row['content'])
+        return rows
+    
+    def apply_delta(self, op: str, rows: List[Dict] = None, ids: List[int] = None):
+        """
+        应用规则增量
+        op: upsert（rows 为规则列值）或 delete（ids 为规则ID）
+        """
+        for row in rows or []:
+            if _is_username_rule(row['type'], row['content']):
+                username_resolver.remember(row['content'], row.get('user_id'))
+        rule_matcher.apply_delta(op, rows=rows, ids=ids)
+    
+    def observe_sender(self, sender_id: int, username: Optional[str]):
+        """用消息发送者的当前用户名核对用户名缓存（不发起请求）"""
+        username_resolver.observe(sender_id, username)
+    
+    async def _publish_delta(self, op: str, rows: List[Dict] = None, ids: List[int] = None):
+        """规则变更后更新本进程的匹配器，并推送给监控工作进程"""
+        self.apply_delta(op, rows=rows, ids=ids)
+        await publish('keywords_delta', op=op, rows=rows, ids=ids)
+    
+    def _validate_rule(self, content: str, kw_type: int, action: int) -> Optional[str]:
+        """校验规则内容、类型和动作（添加、修改、批量导入共用），返回错误说明，合法时返回 None"""
+        if not content or not content.strip():
+            return "关键词内容不能为空"
+        
+        # 验证关键词类型
+        if kw_type not in self.TYPE_NAMES:
+            return "无效的关键词类型"
+        
+        # 验证动作类型
+        if action not in [0, 1]:
+            return "无效的动作类型"
+        
+        # 如果是正则表达式，验证语法
+        if kw_type == 2:
+            try:
+                re.compile(content)
+            except re.error as e:
+                return f"正则表达式语法错误: {str(e)}"
+        
+        # 如果是布尔表达式，验证语法
+        if kw_type == 5:
+            try:
+                validate_expression(content)
+            except ExpressionError as e:
+                return f"表达式语法错误: {str(e)}"
+        
+        # 如果是邻近匹配，验证格式
+        if kw_type == 6:
+            try:
+                parse_proximity(content)
+            except ProximityError as e:
+                return f"邻近规则格式错误: {str(e)}"
+        
+        # 如果是用户名，验证格式
+        if _is_username_rule(kw_type, content) and not USERNAME_PATTERN.match(content.strip()):
+            return "无效的用户名"
+        
+        return None
+    
+    @staticmethod
+    def _normalize_chats(chats) -> List[int]:
+        """
+        群组范围统一为带标记的群组ID（与消息的 chat_id 一致），去重排序
+        格式无效时抛出 ValueError
+        """
+        return sorted({normalize_chat_id(chat_id) for chat_id in chats or []})
+    
+    async def _resolve_rule_username(self, content: str, kw_type: int) -> str:
+        """用户名规则立即解析，返回附加提示（未解析到时后台重试）"""
+        if not _is_username_rule(kw_type, content):
+            return ""
+        await username_resolver.load()
+        if await username_resolver.resolve(content) is None:
+            return "（暂未解析到该用户名，将在后台重试）"
+        return ""
+    
     async def add_keyword(self, content: str, kw_type: int = 1, action: int = 1, 
-                         styles: Dict[str, bool] = None) -> Tuple[bool, str]:
-        """添加关键词"""
+                         styles: Dict[str, bool] = None, chats: List[int] = None) -> Tuple[bool, str]:
+        """添加关键词（chats 为群组范围，不设置则对所有群组生效）"""
         try:
-            if not content.strip():
-                return False, "关键词内容不能为空"
+            error = self._validate_rule(content, kw_type, action)
+            if error:
+                return False, error
             
-            # 验证关键词类型
-            if kw_type not in range(5):
-                return False, "无效的关键词类型"
+            try:
+                chats = self._normalize_chats(chats)
+            except ValueError as e:
+                return False, str(e)
             
-            # 验证动作类型
-            if action not in [0, 1]:
-                return False, "无效的动作类型"
-            
-            # 如果是正则表达式，验证语法
-            if kw_type == 2:
-                try:
-                    re.compile(content)
-                except re.error as e:
-                    return False, f"正则表达式语法错误: {str(e)}"
+            # 用户名规则立即解析
+            resolve_note = await self._resolve_rule_username(content, kw_type)
             
             # 创建关键词对象
             keyword = Keyword(
@@ -77,9 +324,12 @@ class KeywordService:
             # 保存到数据库
             async with AsyncSessionLocal() as session:
                 session.add(keyword)
+                await session.flush()
+                session.add_all(KeywordChat(keyword_id=keyword.id, chat_id=chat_id) for chat_id in chats)
                 await session.commit()
             
-            return True, "关键词添加成功"
+            await self._publish_delta(op='upsert', rows=[self._keyword_row(keyword, chats)])
+            return True, f"关键词添加成功{resolve_note}"
             
         except Exception as e:
             logger.error(f"添加关键词失败: {e}")
@@ -90,7 +340,9 @@ class KeywordService:
         """获取关键词列表"""
         try:
             async with AsyncSessionLocal() as session:
-                query = select(Keyword)
+                query = select(Keyword, KeywordStats).outerjoin(
+                    KeywordStats, KeywordStats.keyword_id == Keyword.id
+                )
                 
                 # 按动作过滤
                 if action is not None:
@@ -101,12 +353,12 @@ class KeywordService:
                 if per_page > 0:
                     query = query.offset(page * per_page).limit(per_page)
                 
-                result = await session.execute(query)
-                keywords = result.scalars().all()
+                result = (await session.execute(query)).all()
+                chats = await self._load_chats(session, [kw.id for kw, _ in result])
                 
                 # 转换为字典格式
                 keyword_list = []
-                for kw in keywords:
+                for kw, stats in result:
                     keyword_dict = {
                         'id': kw.id,
                         'content': kw.content,
@@ -124,6 +376,8 @@ class KeywordService:
                             'monospace': kw.is_monospace,
                             'spoiler': kw.is_spoiler
                         },
+                        'chats': chats.get(kw.id, []),
+                        'stats': self._stats_dict(stats),
                         'created_at': kw.created_at.strftime('%Y-%m-%d %H:%M:%S')
                     }
                     keyword_list.append(keyword_dict)
@@ -159,6 +413,9 @@ class KeywordService:
                 if not result:
                     return None
                 
+                stats = await session.get(KeywordStats, keyword_id)
+                chats = await self._load_chats(session, [keyword_id])
+                
                 return {
                     'id': result.id,
                     'content': result.content,
@@ -175,7 +432,9 @@ class KeywordService:
                         'quote': result.is_quote,
                         'monospace': result.is_monospace,
                         'spoiler': result.is_spoiler
-                    }
+                    },
+                    'chats': chats.get(keyword_id, []),
+                    'stats': self._stats_dict(stats)
                 }
                 
         except Exception as e:
@@ -193,23 +452,17 @@ class KeywordService:
                 if not keyword:
                     return False, "关键词不存在"
                 
-                # 更新内容
-                if content is not None:
-                    if not content.strip():
-                        return False, "关键词内容不能为空"
-                    keyword.content = content.strip()
+                # 按修改后的内容、类型和动作整体校验（只改类型时也要校验原有内容）
+                content = content if content is not None else keyword.content
+                kw_type = kw_type if kw_type is not None else keyword.type
+                action = action if action is not None else keyword.action
+                error = self._validate_rule(content, kw_type, action)
+                if error:
+                    return False, error
                 
-                # 更新类型
-                if kw_type is not None:
-                    if kw_type not in range(5):
-                        return False, "无效的关键词类型"
-                    keyword.type = kw_type
-                
-                # 更新动作
-                if action is not None:
-                    if action not in [0, 1]:
-                        return False, "无效的动作类型"
-                    keyword.action = action
+                keyword.content = content.strip()
+                keyword.type = kw_type
+                keyword.action = action
                 
                 # 更新样式
                 if styles:
@@ -222,8 +475,15 @@ class KeywordService:
                     keyword.is_monospace = styles.get('monospace', keyword.is_monospace)
                     keyword.is_spoiler = styles.get('spoiler', keyword.is_spoiler)
                 
+                # 修改后的规则重新启用并重新统计耗时
+                await self._clear_disabled(session, keyword_id)
+                
                 await session.commit()
-                return True, "关键词更新成功"
+                chats = await self._load_chats(session, [keyword_id])
+            
+            resolve_note = await self._resolve_rule_username(keyword.content, keyword.type)
+            await self._publish_delta(op='upsert', rows=[self._keyword_row(keyword, chats.get(keyword_id))])
+            return True, f"关键词更新成功{resolve_note}"
                 
         except Exception as e:
             logger.error(f"更新关键词失败: {e}")
@@ -239,30 +499,101 @@ class KeywordService:
                     return False, "关键词不存在"
                 
                 await session.delete(keyword)
+                await session.execute(delete(KeywordStats).where(KeywordStats.keyword_id == keyword_id))
+                await session.execute(delete(KeywordChat).where(KeywordChat.keyword_id == keyword_id))
                 await session.commit()
                 
-                return True, "关键词删除成功"
+            await self._publish_delta(op='delete', ids=[keyword_id])
+            return True, "关键词删除成功"
                 
         except Exception as e:
             logger.error(f"删除关键词失败: {e}")
             return False, f"删除失败: {str(e)}"
     
+    @staticmethod
+    async def _clear_disabled(session: AsyncSession, keyword_id: int):
+        stats = await session.get(KeywordStats, keyword_id)
+        if stats:
+            stats.disabled_at = None
+            stats.disabled_reason = None
+            stats.eval_count = 0
+            stats.total_cost_ms = 0.0
+    
+    async def enable_keyword(self, keyword_id: int) -> Tuple[bool, str]:
+        """重新启用被自动停用的关键词"""
+        try:
+            async with AsyncSessionLocal() as session:
+                keyword = await session.get(Keyword, keyword_id)
+                
+                if not keyword:
+                    return False, "关键词不存在"
+                
+                await self._clear_disabled(session, keyword_id)
+                await session.commit()
+                chats = await self._load_chats(session, [keyword_id])
+                
+            await self._publish_delta(op='upsert', rows=[self._keyword_row(keyword, chats.get(keyword_id))])
+            return True, "关键词已重新启用"
+                
+        except Exception as e:
+            logger.error(f"启用关键词失败: {e}")
+            return False, f"启用失败: {str(e)}"
+    
+    async def set_keyword_chats(self, keyword_id: int, chat_ids: List) -> Tuple[bool, str]:
+        """设置关键词的群组范围，chat_ids 为空时对所有群组生效"""
+        try:
+            chat_ids = self._normalize_chats(chat_ids)
+        except ValueError as e:
+            return False, str(e)
+        
+        try:
+            async with AsyncSessionLocal() as session:
+                keyword = await session.get(Keyword, keyword_id)
+                
+                if not keyword:
+                    return False, "关键词不存在"
+                
+                await session.execute(delete(KeywordChat).where(KeywordChat.keyword_id == keyword_id))
+                session.add_all(KeywordChat(keyword_id=keyword_id, chat_id=chat_id) for chat_id in chat_ids)
+                await session.commit()
+                
+            await self._publish_delta(op='upsert', rows=[self._keyword_row(keyword, chat_ids)])
+            if chat_ids:
+                return True, f"关键词已限定在 {len(chat_ids)} 个群组生效"
+            return True, "关键词已对所有群组生效"
+                
+        except Exception as e:
+            logger.error(f"设置关键词群组范围失败: {e}")
+            return False, f"设置失败: {str(e)}"
+    
     async def batch_add_keywords(self, keywords_data: List[Dict]) -> Tuple[bool, str]:
-        """批量添加关键词"""
+        """批量添加关键词，未通过校验的跳过并在结果中列出（line 为导入文本中的行号）"""
         try:
             if not keywords_data:
                 return False, "没有要添加的关键词"
             
             keywords = []
+            keyword_chats = []
+            rejected = []
             for data in keywords_data:
                 content = data.get('content', '').strip()
                 if not content:
                     continue
                 
+                kw_type, action = data.get('type', 1), data.get('action', 1)
+                error = self._validate_rule(content, kw_type, action)
+                try:
+                    chats = self._normalize_chats(data.get('chats'))
+                except ValueError as e:
+                    error = error or str(e)
+                if error:
+                    rejected.append((data.get('line'), content, error))
+                    continue
+                
                 keyword = Keyword(
                     content=content,
-                    type=data.get('type', 1),
-                    action=data.get('action', 1),
+                    type=kw_type,
+                    action=action,
                     is_case_sensitive=data.get('case_sensitive', False),
                     is_bold=data.get('bold', False),
                     is_italic=data.get('italic', False),
@@ -273,20 +604,40 @@ class KeywordService:
                     is_spoiler=data.get('spoiler', False)
                 )
                 keywords.append(keyword)
+                keyword_chats.append(chats)
             
             if not keywords:
-                return False, "没有有效的关键词"
+                return False, "没有有效的关键词" + self._rejected_note(rejected)
             
             async with AsyncSessionLocal() as session:
                 session.add_all(keywords)
+                await session.flush()
+                for keyword, chats in zip(keywords, keyword_chats):
+                    session.add_all(KeywordChat(keyword_id=keyword.id, chat_id=chat_id) for chat_id in chats)
                 await session.commit()
             
-            return True, f"成功添加 {len(keywords)} 个关键词"
+            await self._publish_delta(op='upsert', rows=[
+                self._keyword_row(kw, chats) for kw, chats in zip(keywords, keyword_chats)
+            ])
+            return True, f"成功添加 {len(keywords)} 个关键词" + self._rejected_note(rejected)
             
         except Exception as e:
             logger.error(f"批量添加关键词失败: {e}")
             return False, f"批量添加失败: {str(e)}"
     
+    @staticmethod
+    def _rejected_note(rejected: List[Tuple[Optional[int], str, str]], limit: int = 10) -> str:
+        """未通过校验的关键词说明（有行号时注明第几行），最多列出 limit 条"""
+        if not rejected:
+            return ""
+        lines = [
+            f"第 {line} 行 {content}: {error}" if line else f"{content}: {error}"
+            for line, content, error in rejected[:limit]
+        ]
+        if len(rejected) > limit:
+            lines.append(f"……另有 {len(rejected) - limit} 个")
+        return f"，{len(rejected)} 个未通过校验:\n" + "\n".join(lines)
+    
     async def export_keywords(self) -> str:
         """导出关键词为JSON格式"""
         try:
@@ -299,92 +650,54 @@ class KeywordService:
     async def match_message(self, message_text: str, sender_id: int, 
                           chat_id: int) -> List[Keyword]:
         """匹配消息中的关键词"""
+        return (await self.match_messages([(message_text, sender_id, chat_id)]))[0]
+    
+    async def match_messages(self, messages: List[Tuple[str, int, int]]) -> List[List[Keyword]]:
+        """
+        批量匹配消息
+        messages: [(文本, 发送者ID, 聊天ID)]，返回与之一一对应的命中监控规则
+        """
         try:
-            # 获取所有关键词
-            async with AsyncSessionLocal() as session:
-                result = await session.execute(select(Keyword))
-                all_keywords = result.scalars().all()
-            
-            matched_keywords = []
-            
-            for keyword in all_keywords:
-                is_match = False
-                
-                # 根据类型进行匹配
-                if keyword.type == 0:  # 全字匹配
-                    is_match = self._full_word_match(keyword.content, message_text, keyword.is_case_sensitive)
-                elif keyword.type == 1:  # 包含匹配
-                    is_match = self._contains_match(keyword.content, message_text, keyword.is_case_sensitive)
-                elif keyword.type == 2:  # 正则表达式
-                    is_match = self._regex_match(keyword.content, message_text, keyword.is_case_sensitive)
-                elif keyword.type == 3:  # 模糊匹配
-                    is_match = self._fuzzy_match(keyword.content, message_text, keyword.is_case_sensitive)
-                elif keyword.type == 4:  # 用户匹配
-                    is_match = self._user_match(keyword.content, sender_id)
-                
-                if is_match:
-                    matched_keywords.append(keyword)
+            # 规则首次使用时加载，之后常驻内存
+            if not rule_matcher.loaded:
+                async with _rules_load_lock:
+                    # 等锁期间其他批次可能已经加载完成
+                    if not rule_matcher.loaded:
+                        await self._load_rules()
             
-            # 处理排除规则
-            exclude_keywords = [kw for kw in matched_keywords if kw.action == 0]
-            if exclude_keywords:
-                return []  # 如果有排除规则匹配，则不转发消息
-            
-            # 返回监控规则
-            monitor_keywords = [kw for kw in matched_keywords if kw.action == 1]
-            return monitor_keywords
+            results = []
+            for matched_rows in await rule_matcher.match_batch(messages):
+                matched_keywords = [
+                    Keyword(**{key: value for key, value in row.items() if key in _KEYWORD_COLUMNS})
+                    for row in matched_rows
+                ]
+                
+                # 处理排除规则：有排除规则匹配则不转发消息
+                if any(kw.action == 0 for kw in matched_keywords):
+                    results.append([])
+                    continue
+                
+                # 返回监控规则
+                results.append([kw for kw in matched_keywords if kw.action == 1])
+            return results
             
         except Exception as e:
             logger.error(f"匹配关键词失败: {e}")
-            return []
-    
-    def _full_word_match(self, keyword: str, text: str, case_sensitive: bool) -> bool:
-        """全字匹配"""
-        if not case_sensitive:
-            return keyword.lower() == text.lower()
-        return keyword == text
+            return [[] for _ in messages]
     
-    def _contains_match(self, keyword: str, text: str, case_sensitive: bool) -> bool:
-        """包含匹配"""
-        if not case_sensitive:
-            return keyword.lower() in text.lower()
-        return keyword in text
-    
-    def _regex_match(self, pattern: str, text: str, case_sensitive: bool) -> bool:
-        """正则表达式匹配"""
-        try:
-            flags = 0 if case_sensitive else re.IGNORECASE
-            return bool(re.search(pattern, text, flags))
-        except re.error:
-            return False
-    
-    def _fuzzy_match(self, keyword: str, text: str, case_sensitive: bool) -> bool:
-        """模糊匹配（多个关键词用?分隔）"""
-        keywords = [kw.strip() for kw in keyword.split('?') if kw.strip()]
-        if not keywords:
-            return False
-        
-        text_to_match = text if case_sensitive else text.lower()
-        
-        for kw in keywords:
-            kw_to_match = kw if case_sensitive else kw.lower()
-            if kw_to_match not in text_to_match:
-                return False
-        
-        return True
-    
-    def _user_match(self, keyword: str, sender_id: int) -> bool:
-        """用户匹配"""
-        # 移除@符号
-        keyword = keyword.lstrip('@')
+    def match_spans(self, text: str, keywords: List[Keyword]) -> List[StyledSpan]:
+        """
+        命中关键词在原文中的位置及样式 [(起始, 结束, 样式位)]
+        只定位设置了样式的关键词，用于告警中标注匹配内容
+        """
+        styles = {kw.id: keyword_style(kw) for kw in keywords}
+        styles = {rule_id: style for rule_id, style in styles.items() if style}
+        if not styles:
+            return []
         
-        # 检查是否是用户ID
         try:
-            if int(keyword) == sender_id:
-                return True
-        except ValueError:
-            pass
-        
-        # TODO: 检查用户名匹配（需要从Telegram客户端获取用户信息）
-        
-        return False
\ No newline at end of file
+            located = rule_matcher.locate(text, styles)
+        except Exception as e:
+            logger.warning(f"定位命中内容失败: {e}")
+            return []
+        return [(start, end, styles[rule_id]) for rule_id, spans in located.items() for start, end in spans]
\ No newline at end of file
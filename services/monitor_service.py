@@ -6,8 +6,11 @@
 import logging
 from typing import Dict, Optional, Tuple
 
+from core.alert_template import DEFAULT_TEMPLATE, AlertRenderer, TemplateError
+from core.ipc import get_worker_pool
 from core.telegram_client import telegram_client_manager
-from services.keyword_service import KeywordService
+from services.keyword_service import KeywordService, rule_matcher
+from services.telegram_service import TelegramService
 
 logger = logging.getLogger(__name__)
 
@@ -18,14 +21,19 @@ class MonitorService:
     def __init__(self):
         self.client_manager = telegram_client_manager
         self.keyword_service = KeywordService()
+        # 登录状态和目标聊天查询（分进程模式下转给工作进程）
+        self.telegram_service = TelegramService()
     
     async def is_monitoring(self) -> bool:
         """检查是否正在监控"""
+        pool = get_worker_pool()
+        if pool is not None:
+            return pool.monitoring
         return self.client_manager.is_monitoring
     
     async def get_target_chat(self) -> Optional[Dict]:
         """获取目标聊天信息"""
-        return await self.client_manager.get_target_chat()
+        return await self.telegram_service.get_target_chat()
     
     async def set_target_chat(self, chat_id: int) -> Tuple[bool, str]:
         """设置目标聊天"""
@@ -39,11 +47,30 @@ class MonitorService:
             logger.error(f"设置目标聊天失败: {e}")
             return False, f"设置失败: {str(e)}"
     
+    async def get_alert_template(self) -> Dict:
+        """获取当前告警模板"""
+        source = await self.client_manager.get_alert_template()
+        return {
+            'source': source or DEFAULT_TEMPLATE,
+            'is_default': not source or source == DEFAULT_TEMPLATE,
+        }
+    
+    async def set_alert_template(self, source: Optional[str]) -> Tuple[bool, str]:
+        """设置告警模板，source 为空时恢复默认模板"""
+        try:
+            await self.client_manager.set_alert_template(source)
+            return True, "告警模板已更新" if source and source != DEFAULT_TEMPLATE else "已恢复默认模板"
+        except TemplateError as e:
+            return False, f"模板格式错误: {e}"
+        except Exception as e:
+            logger.error(f"设置告警模板失败: {e}")
+            return False, f"设置失败: {str(e)}"
+    
     async def start_monitoring(self) -> Tuple[bool, str]:
         """开始监控"""
         try:
             # 检查是否已登录
-            if not await self.client_manager.is_logged_in():
+            if not await self.telegram_service.is_logged_in():
                 return False, "请先登录Telegram账号"
             
             # 检查是否设置了目标聊天
@@ -56,8 +83,14 @@ class MonitorService:
             if keyword_count == 0:
                 return False, "请先添加监控关键词"
             
-            # 开始监控
-            success = await self.client_manager.start_monitoring(self.keyword_service)
+            # 开始监控（分进程模式下由各工作进程监控）
+            pool = get_worker_pool()
+            if pool is not None:
+                results = await pool.broadcast('start_monitoring')
+                success = results[0] is True
+                pool.monitoring = success
+            else:
+                success = await self.client_manager.start_monitoring(self.keyword_service)
             
             if success:
                 return True, "监控已启动"
@@ -71,7 +104,13 @@ class MonitorService:
     async def stop_monitoring(self) -> Tuple[bool, str]:
         """停止监控"""
         try:
-            success = await self.client_manager.stop_monitoring()
+            pool = get_worker_pool()
+            if pool is not None:
+                pool.monitoring = False
+                results = await pool.broadcast('stop_monitoring')
+                success = all(result is True for result in results)
+            else:
+                success = await self.client_manager.stop_monitoring()
             
             if success:
                 return True, "监控已停止"
@@ -94,7 +133,21 @@ class MonitorService:
             exclude_keywords = await self.keyword_service.get_keyword_count(action=0)
             
             # 获取账号状态
-            is_logged_in = await self.client_manager.is_logged_in()
+            is_logged_in = await self.telegram_service.is_logged_in()
+            
+            # 连接状态和账号吞吐（分进程模式下汇总各工作进程）
+            pool = get_worker_pool()
+            if pool is not None:
+                statuses = await pool.broadcast('status')
+                connection = statuses[0]['connection'] if statuses[0] else None
+                accounts = [account for status in statuses if status for account in status['accounts']]
+                rules = statuses[0]['rules'] if statuses[0] else None
+                alerts = AlertRenderer.merge_stats([status.get('alerts') for status in statuses if status])
+            else:
+                connection = self.client_manager.supervisor.get_stats()
+                accounts = self.client_manager.get_accounts_status()
+                rules = rule_matcher.get_status()
+                alerts = self.client_manager.alert_renderer.get_stats()
             
             return {
                 'is_monitoring': is_monitoring,
@@ -105,6 +158,10 @@ class MonitorService:
                     'monitor': monitor_keywords,
                     'exclude': exclude_keywords
                 },
+                'connection': connection,
+                'accounts': accounts,
+                'rules': rules,
+                'alerts': alerts,
                 'status_text': self._get_status_text(is_monitoring, is_logged_in, target_chat, monitor_keywords)
             }
             
@@ -115,6 +172,10 @@ class MonitorService:
                 'is_logged_in': False,
                 'target_chat': None,
                 'keyword_stats': {'total': 0, 'monitor': 0, 'exclude': 0},
+                'connection': None,
+                'accounts': [],
+                'rules': None,
+                'alerts': None,
                 'status_text': '状态获取失败'
             }
     
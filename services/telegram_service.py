@@ -6,39 +6,77 @@ Telegram服务
 import logging
 from typing import Dict, List, Optional, Tuple
 
+from core.accounts import account_worker
+from core.ipc import get_worker_pool
+from core.proxy_pool import ProxyEndpoint, ProxyPool, detect_proxy_type
 from core.telegram_client import telegram_client_manager
 
 logger = logging.getLogger(__name__)
 
 
 class TelegramService:
-    """Telegram服务类"""
+    """
+    Telegram服务类
+    分进程模式下会话文件只由工作进程打开：主账号在 0 号进程，附加账号按手机号分片，
+    登录、状态、对话列表等请求通过进程间通信交给对应的工作进程
+    """
     
     def __init__(self):
         self.client_manager = telegram_client_manager
+        # 分进程模式下正在进行的登录所在的工作进程
+        self._login_worker = 0
     
     async def is_logged_in(self) -> bool:
         """检查是否已登录"""
+        pool = get_worker_pool()
+        if pool is not None:
+            return await pool.call('is_logged_in')
         return await self.client_manager.is_logged_in()
     
-    async def login_with_phone(self, phone: str) -> Tuple[bool, str]:
-        """使用手机号登录"""
-        return await self.client_manager.login_with_phone(phone)
+    async def login_with_phone(self, phone: str, extra: bool = False) -> Tuple[bool, str]:
+        """使用手机号登录，extra 为 True 时添加附加监控账号"""
+        pool = get_worker_pool()
+        if pool is not None:
+            self._login_worker = account_worker(phone, pool.count) if extra else 0
+            return await self._login_call('login_with_phone', phone=phone, extra=extra)
+        return await self.client_manager.login_with_phone(phone, extra)
     
     async def verify_code(self, phone: str, code: str) -> Tuple[bool, str]:
         """验证验证码"""
+        if get_worker_pool() is not None:
+            return await self._login_call('verify_code', phone=phone, code=code)
         return await self.client_manager.verify_code(phone, code)
     
     async def verify_email_code(self, email_code: str) -> Tuple[bool, str]:
         """验证邮箱验证码"""
+        if get_worker_pool() is not None:
+            return await self._login_call('verify_email_code', email_code=email_code)
         return await self.client_manager.verify_email_code(email_code)
     
     async def verify_password(self, password: str) -> Tuple[bool, str]:
         """验证两步验证密码"""
+        if get_worker_pool() is not None:
+            return await self._login_call('verify_password', password=password)
         return await self.client_manager.verify_password(password)
     
+    async def _login_call(self, method: str, **params) -> Tuple[bool, str]:
+        """把登录步骤交给登录开始时所在的工作进程"""
+        try:
+            success, message = await get_worker_pool().call(method, index=self._login_worker, **params)
+            return success, message
+        except Exception as e:
+            logger.error(f"登录请求失败: {e}")
+            return False, f"登录失败: {str(e)}"
+    
     async def logout(self) -> bool:
         """退出登录"""
+        pool = get_worker_pool()
+        if pool is not None:
+            try:
+                return await pool.call('logout')
+            except Exception as e:
+                logger.error(f"退出登录失败: {e}")
+                return False
         return await self.client_manager.logout()
     
     async def get_account_status(self) -> Dict:
@@ -53,24 +91,20 @@ class TelegramService:
                     'proxy_status': await self.get_proxy_status()
                 }
             
-            # 获取用户信息
-            client = self.client_manager.client
-            if client:
-                me = await client.get_me()
-                user_info = {
-                    'id': me.id,
-                    'first_name': me.first_name,
-                    'last_name': me.last_name,
-                    'username': me.username,
-                    'phone': me.phone
-                }
+            # 获取用户信息（分进程模式下由主账号所在的工作进程查询）
+            pool = get_worker_pool()
+            if pool is not None:
+                user_info = await pool.call('get_user_info')
+                rpc_backoff = await pool.call('rpc_backoff')
             else:
-                user_info = None
+                user_info = await self.client_manager.get_user_info()
+                rpc_backoff = self.client_manager.rpc.get_stats()
             
             return {
                 'logged_in': True,
                 'user_info': user_info,
-                'proxy_status': await self.get_proxy_status()
+                'proxy_status': await self.get_proxy_status(),
+                'rpc_backoff': rpc_backoff
             }
             
         except Exception as e:
@@ -81,8 +115,38 @@ class TelegramService:
                 'proxy_status': {'type': 'none', 'status': 'error'}
             }
     
+    async def get_accounts_status(self) -> List[Dict]:
+        """获取所有监控账号的状态和吞吐"""
+        try:
+            # 分进程模式下账号连接在各工作进程中
+            pool = get_worker_pool()
+            if pool is not None:
+                statuses = await pool.broadcast('status')
+                return [account for status in statuses if status for account in status['accounts']]
+            
+            if await self.is_logged_in():
+                await self.client_manager.load_accounts()
+            return self.client_manager.get_accounts_status()
+        except Exception as e:
+            logger.error(f"获取监控账号状态失败: {e}")
+            return []
+    
+    async def remove_account(self, phone: str) -> Tuple[bool, str]:
+        """移除附加监控账号"""
+        success = await self.client_manager.remove_account(phone)
+        if success:
+            return True, f"已移除监控账号 {phone}"
+        return False, "移除监控账号失败"
+    
     async def get_available_chats(self) -> List[Dict]:
         """获取可用的聊天列表"""
+        pool = get_worker_pool()
+        if pool is not None:
+            try:
+                return await pool.call('get_available_chats')
+            except Exception as e:
+                logger.error(f"获取聊天列表失败: {e}")
+                return []
         return await self.client_manager.get_available_chats()
     
     async def set_target_chat(self, chat_id: int) -> bool:
@@ -91,10 +155,17 @@ class TelegramService:
     
     async def get_target_chat(self) -> Optional[Dict]:
         """获取目标聊天信息"""
+        pool = get_worker_pool()
+        if pool is not None:
+            try:
+                return await pool.call('get_target_chat')
+            except Exception as e:
+                logger.error(f"获取目标聊天失败: {e}")
+                return None
         return await self.client_manager.get_target_chat()
     
     async def set_proxy(self, proxy_type: str, proxy_url: str = None) -> Tuple[bool, str]:
-        """设置代理"""
+        """设置代理，proxy_url 每行一个代理，多个代理组成代理池"""
         try:
             # 验证代理类型
             if proxy_type not in ['none', 'socks5', 'mtproxy']:
@@ -104,9 +175,22 @@ class TelegramService:
             if proxy_type != 'none' and not proxy_url:
                 return False, "请提供代理地址"
             
-            success = await self.client_manager.set_proxy(proxy_type, proxy_url)
+            proxies = []
+            if proxy_type != 'none':
+                for line in proxy_url.splitlines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    line_type = detect_proxy_type(line, proxy_type)
+                    if not ProxyEndpoint.parse(line_type, line):
+                        return False, f"代理地址格式错误: {line}"
+                    proxies.append({'type': line_type, 'url': line})
+            
+            success = await self.client_manager.set_proxy(proxies)
             
             if success:
+                if len(proxies) > 1:
+                    return True, f"代理设置成功，共 {len(proxies)} 个代理，将自动选用最快的可用代理"
                 return True, "代理设置成功"
             else:
                 return False, "代理设置失败"
@@ -119,34 +203,35 @@ class TelegramService:
         """获取代理状态"""
         try:
             config = await self.client_manager.get_proxy_config()
+            proxies = ProxyPool.entries_from_config(config)
             
-            proxy_type = config.get('type', 'none')
-            proxy_url = config.get('url')
-            
-            if proxy_type == 'none':
+            if not proxies:
                 return {
                     'type': 'none',
                     'status': '无代理',
-                    'url': None
-                }
-            elif proxy_type == 'socks5':
-                return {
-                    'type': 'socks5',
-                    'status': 'Socks5代理',
-                    'url': proxy_url
-                }
-            elif proxy_type == 'mtproxy':
-                return {
-                    'type': 'mtproxy',
-                    'status': 'MTProxy代理',
-                    'url': proxy_url
+                    'url': None,
+                    'proxies': []
                 }
+            
+            # 合并代理池的探测结果（客户端未创建时尚未探测，分进程模式下取 0 号工作进程的结果）
+            pool = get_worker_pool()
+            probe_status = await pool.call('proxy_status') if pool is not None else self.client_manager.proxy_pool.get_status()
+            probed = {p['url']: p for p in probe_status}
+            proxies = [{**proxy, **probed.get(proxy['url'], {})} for proxy in proxies]
+            active = next((p for p in proxies if p.get('active')), proxies[0])
+            
+            type_names = {'socks5': 'Socks5代理', 'mtproxy': 'MTProxy代理'}
+            if len(proxies) > 1:
+                status = f"代理池（{len(proxies)}个）"
             else:
-                return {
-                    'type': 'unknown',
-                    'status': '未知代理类型',
-                    'url': proxy_url
-                }
+                status = type_names.get(active['type'], '未知代理类型')
+            
+            return {
+                'type': active['type'] if len(proxies) == 1 else 'pool',
+                'status': status,
+                'url': active['url'],
+                'proxies': proxies
+            }
                 
         except Exception as e:
             logger.error(f"获取代理状态失败: {e}")
@@ -0,0 +1,18 @@
+"""
+测试公共配置
+导入部分模块时会读取必需的环境变量，这里提供占位值，测试不会连接 Telegram
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault('TELEGRAM_API_ID', '1')
+os.environ.setdefault('TELEGRAM_API_HASH', 'test')
+os.environ.setdefault('BOT_TOKEN', '1:test')
+os.environ.setdefault('AUTHORIZED_USER_ID', '1')
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.gettempdir(), 'telegram_monitor_test.db'))
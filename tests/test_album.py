@@ -0,0 +1,46 @@
+"""相册聚合：窗口内的分片合并后经摄入队列处理一次"""
+
+import asyncio
+from types import SimpleNamespace
+
+from core.album import AlbumAggregator
+from core.ingest import IngestQueue
+
+
+def fragment(message_id: int, text: str = '') -> SimpleNamespace:
+    return SimpleNamespace(id=message_id, grouped_id=42, text=text)
+
+
+def test_album_is_processed_once_through_the_queue():
+    async def scenario():
+        queue = IngestQueue(workers=1)
+        handled = []
+        done = asyncio.Event()
+
+        async def on_album(messages, tag):
+            # 由队列的工作协程执行，而不是聚合器的计时任务
+            handled.append(([m.id for m in messages], tag, asyncio.current_task() in aggregator._tasks))
+            done.set()
+
+        aggregator = AlbumAggregator(0.05, on_album, queue)
+        queue.start()
+        try:
+            for message_id in (3, 1, 2):
+                aggregator.add(fragment(message_id, '说明' if message_id == 2 else ''), 'matcher')
+            await asyncio.wait_for(done.wait(), 5)
+            # 窗口结束后才到达的分片直接丢弃
+            aggregator.add(fragment(4), 'matcher')
+            await asyncio.sleep(0.1)
+        finally:
+            await aggregator.stop()
+            await queue.stop()
+        return handled
+
+    handled = asyncio.run(scenario())
+    assert handled == [([1, 2, 3], 'matcher', False)]
+
+
+def test_combine_uses_first_captioned_fragment():
+    messages = [fragment(1), fragment(2, '出 USDT'), fragment(3, '汇率')]
+    primary, text = AlbumAggregator.combine(messages)
+    assert primary.id == 2 and text == '出 USDT\n汇率'
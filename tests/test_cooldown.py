@@ -0,0 +1,63 @@
+"""告警冷却：按发送者、按群组、两者同时启用时的放行与抑制计数"""
+
+import pytest
+
+import core.cooldown
+from core.cooldown import AlertThrottle
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的单调时钟"""
+    now = [1000.0]
+    monkeypatch.setattr(core.cooldown.time, 'monotonic', lambda: now[0])
+
+    def advance(seconds):
+        now[0] += seconds
+
+    return advance
+
+
+def test_sender_only(clock):
+    throttle = AlertThrottle(sender_seconds=10)
+    assert throttle.check(1, -100, [7]) == (True, 0)
+    # 同一发送者换群组仍在冷却，其他发送者不受影响
+    assert throttle.check(1, -200, [7]) == (False, 0)
+    assert throttle.check(2, -100, [7]) == (True, 0)
+    clock(11)
+    assert throttle.check(1, -100, [7]) == (True, 1)
+
+
+def test_chat_only(clock):
+    throttle = AlertThrottle(chat_seconds=10)
+    assert throttle.check(1, -100, [7]) == (True, 0)
+    assert throttle.check(2, -100, [7]) == (False, 0)
+    assert throttle.check(3, -100, [7]) == (False, 0)
+    # 其他关键词、其他群组各自冷却
+    assert throttle.check(2, -100, [8]) == (True, 0)
+    assert throttle.check(2, -200, [7]) == (True, 0)
+    clock(11)
+    assert throttle.check(4, -100, [7]) == (True, 2)
+
+
+def test_combined_keeps_cooling_windows(clock):
+    throttle = AlertThrottle(sender_seconds=10, chat_seconds=30)
+    assert throttle.check(1, -100, [7]) == (True, 0)
+    # 发送者键已过期、群组键仍在冷却：不放行，计在群组键上
+    clock(11)
+    assert throttle.check(1, -100, [7]) == (False, 0)
+    # 关键词 8 放行了消息，冷却中的群组键不刷新，抑制次数留到它过期后的告警
+    assert throttle.check(2, -100, [7, 8]) == (True, 0)
+    clock(20)
+    assert throttle.check(3, -100, [7]) == (True, 1)
+
+
+def test_other_keyword_allows_without_refreshing_cooling_ones(clock):
+    throttle = AlertThrottle(sender_seconds=10)
+    assert throttle.check(1, -100, [7]) == (True, 0)
+    clock(5)
+    # 关键词 8 放行了消息，关键词 7 的冷却不因此延后
+    assert throttle.check(1, -100, [7, 8]) == (True, 0)
+    clock(6)
+    assert throttle.check(1, -100, [7]) == (True, 0)
+    assert throttle.check(1, -100, [8]) == (False, 0)
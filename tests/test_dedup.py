@@ -0,0 +1,127 @@
+"""告警去重：精确/近似重复、窗口过期、容量淘汰"""
+
+import random
+
+import pytest
+
+from core import dedup
+from core.dedup import DuplicateWindow, SimHashIndex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(dedup.time, 'monotonic', fake)
+    return fake
+
+
+TEXT = "出售 USDT 汇率优惠 联系飞机 秒到账 诚信交易"
+
+
+def test_exact_duplicate_within_window(clock):
+    window = DuplicateWindow(window_seconds=60)
+    first, entry = window.claim(TEXT)
+    assert first
+    again, same = window.claim("  出售 usdt 汇率优惠   联系飞机 秒到账 诚信交易 ")
+    assert not again and same is entry
+
+
+def test_exact_duplicate_expires(clock):
+    window = DuplicateWindow(window_seconds=60)
+    window.claim(TEXT)
+    clock.now += 61
+    first, _ = window.claim(TEXT)
+    assert first
+
+
+def test_near_duplicate_grouped(clock):
+    window = DuplicateWindow(window_seconds=60, near_distance=3)
+    _, entry = window.claim(TEXT)
+    first, same = window.claim(TEXT + "😀")
+    assert not first and same is entry
+
+
+def test_near_duplicate_alias_expires(clock):
+    """近似重复登记的精确哈希别名不能在窗口过期后继续抑制"""
+    window = DuplicateWindow(window_seconds=60, near_distance=3)
+    window.claim(TEXT)
+    clock.now += 40
+    window.claim("另一条完全不同的内容，用来占住淘汰队列的前面")
+    variant = TEXT + "！！"
+    clock.now += 10
+    assert not window.claim(variant)[0]
+    # 别名插入在字典末尾，排在仍未过期的记录之后；首条记录过期后别名也必须失效
+    clock.now += 11
+    first, _ = window.claim(variant)
+    assert first
+
+
+def test_release_allows_resend(clock):
+    window = DuplicateWindow(window_seconds=60)
+    _, entry = window.claim(TEXT)
+    window.release(TEXT, entry)
+    assert window.claim(TEXT)[0]
+
+
+def test_capacity_bound(clock):
+    window = DuplicateWindow(window_seconds=60, max_entries=10, near_distance=3)
+    for i in range(100):
+        window.claim(f"{TEXT} 编号 {i:04d} " + "x" * i)
+    assert len(window) <= 10
+    assert len(window._near_index) <= 10
+
+
+def test_simhash_index_matches_brute_force():
+    rng = random.Random(7)
+    index = SimHashIndex(max_distance=3, max_entries=10000)
+    fingerprints = [rng.getrandbits(64) for _ in range(2000)]
+    for position, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, position, 0.0)
+    for _ in range(500):
+        query = rng.choice(fingerprints)
+        for bit in rng.sample(range(64), rng.randint(0, 5)):
+            query ^= 1 << bit
+        found = index.find(query)
+        expected = any((query ^ fp).bit_count() <= 3 for fp in fingerprints)
+        assert (found is not None) == expected
+        if found is not None:
+            assert (query ^ fingerprints[found]).bit_count() <= 3
+
+
+def make_entry(alert_text: str, sources: int):
+    entry = dedup.DuplicateEntry(0.0)
+    entry.alert_text = alert_text
+    entry.extra_sources = [f'<a href="https://t.me/c/{i}/1">群组 {i} &amp; 频道</a>' for i in range(sources)]
+    return entry
+
+
+def test_render_lists_all_sources_when_they_fit():
+    rendered = DuplicateWindow.render(make_entry("告警", 3))
+    assert rendered.splitlines()[1] == "其他来源 (3):"
+    assert len(rendered.splitlines()) == 5
+
+
+@pytest.mark.parametrize('alert_length, sources', [(100, 19), (3900, 19), (4000, 5), (10, 500)])
+def test_render_respects_message_length(alert_length, sources):
+    entry = make_entry("告" * alert_length, sources)
+    rendered = DuplicateWindow.render(entry, max_sources=1000)
+    lines = rendered.splitlines()
+    listed = sum(line.startswith("• ") for line in lines)
+    assert DuplicateWindow._visible_length(rendered) <= dedup.MAX_MESSAGE_LENGTH
+    assert listed > 0
+    if listed < sources:
+        assert lines[-1] == f"… +{sources - listed} 个来源"
+
+
+def test_render_caps_source_count():
+    rendered = DuplicateWindow.render(make_entry("告警", 30), max_sources=20)
+    assert rendered.count("\n• ") == 20
+    assert rendered.endswith("\n… +10 个来源")
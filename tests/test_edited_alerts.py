@@ -0,0 +1,57 @@
+"""编辑消息：已转发的告警随编辑原地更新，不再命中时注明"""
+
+import asyncio
+from types import SimpleNamespace
+
+from core.dedup import RecentMessageCache
+from core.telegram_client import EDITED_UNMATCHED_NOTICE, TelegramClientManager
+
+
+class FakeBlacklist:
+    async def is_blacklisted(self, user_id=None, chat_id=None):
+        return False
+
+
+class FakeBatcher:
+    async def match(self, text, sender_id, chat_id):
+        return [SimpleNamespace(id=1, content='USDT')] if 'USDT' in text else []
+
+
+def test_edit_that_no_longer_matches_marks_the_alert():
+    manager = TelegramClientManager()
+    manager.recent_messages = RecentMessageCache(100)
+    manager.blacklist_service = FakeBlacklist()
+    manager.match_batcher = FakeBatcher()
+    sent, edits = [], []
+
+    async def format_message(message, matched_keywords, suppressed=0, text=None):
+        return f"{text} | {','.join(kw.content for kw in matched_keywords)}"
+
+    async def send_via_bot(text, sender_id, source_chat_id, message_id):
+        sent.append(text)
+        return 77, 'markup'
+
+    async def edit_via_bot(alert_id, text, reply_markup=None):
+        edits.append((alert_id, text, reply_markup))
+
+    manager._format_message = format_message
+    manager._send_via_bot = send_via_bot
+    manager._edit_via_bot = edit_via_bot
+
+    def message(message_id: int, text: str):
+        return SimpleNamespace(id=message_id, chat_id=-1001, sender_id=5, sender=None, text=text)
+
+    async def scenario():
+        await manager._process_message(message(1, '出 USDT'), '出 USDT', None)
+        await manager._process_message(message(1, '已售出'), '已售出', None, edited=True)
+        await manager._process_message(message(1, '再出 USDT'), '再出 USDT', None, edited=True)
+        # 没有转发过的消息编辑后仍不命中：不发送也不编辑
+        await manager._process_message(message(2, '闲聊'), '闲聊', None)
+        await manager._process_message(message(2, '还是闲聊'), '还是闲聊', None, edited=True)
+
+    asyncio.run(scenario())
+    assert sent == ['出 USDT | USDT']
+    assert edits == [
+        (77, f"{EDITED_UNMATCHED_NOTICE}\n已售出 | ", 'markup'),
+        (77, '再出 USDT | USDT', 'markup'),
+    ]
@@ -0,0 +1,81 @@
+"""命中内容标注：重叠样式取并集、链接与引用/等宽的嵌套、转义和标签配对"""
+
+import html
+import random
+import re
+
+import pytest
+
+from core.highlight import BOLD, ITALIC, MONOSPACE, QUOTE, SPOILER, UNDERLINE, render_highlights
+
+TAG = re.compile(r'<(/?)([a-z-]+)[^>]*>')
+
+
+def strip_tags(rendered: str) -> str:
+    return html.unescape(TAG.sub('', rendered))
+
+
+def assert_balanced(rendered: str):
+    stack = []
+    for match in TAG.finditer(rendered):
+        closing, name = match.groups()
+        if closing:
+            assert stack and stack.pop() == name, rendered
+        else:
+            stack.append(name)
+    assert not stack, rendered
+
+
+def test_overlapping_spans_take_style_union():
+    rendered = render_highlights('abcdef', [(0, 4, BOLD), (2, 6, ITALIC)])
+    assert rendered == '<b>ab</b><b><i>cd</i></b><i>ef</i>'
+
+
+def test_link_stays_open_across_inline_segments():
+    rendered = render_highlights('ab cd ef', [(0, 2, BOLD), (6, 8, UNDERLINE)], link='https://t.me/c/1/2')
+    assert rendered == '<a href="https://t.me/c/1/2"><b>ab</b> cd <u>ef</u></a>'
+
+
+def test_link_closes_around_quote_and_monospace():
+    rendered = render_highlights('ab cd ef gh', [(3, 5, QUOTE), (9, 11, MONOSPACE)], link='https://t.me/x?a=1&b=2')
+    href = '<a href="https://t.me/x?a=1&amp;b=2">'
+    assert rendered == f'{href}ab </a><blockquote>cd</blockquote>{href} ef </a><code>gh</code>'
+
+
+def test_monospace_only_emits_code():
+    assert render_highlights('ab', [(0, 2, MONOSPACE | BOLD | SPOILER)]) == '<code>ab</code>'
+
+
+def test_consecutive_quotes_merge_into_one_blockquote():
+    rendered = render_highlights('abcdef', [(0, 2, QUOTE), (2, 4, QUOTE | BOLD), (4, 6, BOLD)])
+    assert rendered == '<blockquote>ab<b>cd</b></blockquote><b>ef</b>'
+
+
+def test_text_is_escaped():
+    assert render_highlights('<a&"b">', [(1, 4, BOLD)]) == '&lt;<b>a&amp;"</b>b"&gt;'
+    assert render_highlights('1 < 2', []) == '1 &lt; 2'
+
+
+def test_spans_are_clamped_and_empty_ones_ignored():
+    assert render_highlights('abc', [(-5, 1, BOLD), (2, 99, ITALIC), (1, 1, BOLD), (0, 3, 0)]) == '<b>a</b>b<i>c</i>'
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_spans_round_trip(seed):
+    rng = random.Random(seed)
+    text = ''.join(rng.choices('ab <&">出', k=rng.randint(1, 40)))
+    spans = []
+    for _ in range(rng.randint(0, 6)):
+        start = rng.randint(0, len(text))
+        spans.append((start, rng.randint(start, len(text)), rng.randint(0, 127)))
+    link = 'https://t.me/c/1/2' if rng.random() < 0.5 else None
+
+    rendered = render_highlights(text, spans, link)
+    assert strip_tags(rendered) == text
+    assert_balanced(rendered)
+    # 等宽内部不能再有其他实体，链接不进入引用和等宽
+    for code in re.findall(r'<code>(.*?)</code>', rendered):
+        assert '<' not in code
+    for quote in re.findall(r'<blockquote>(.*?)</blockquote>', rendered):
+        assert '<a ' not in quote
+    assert '<code>' not in ''.join(re.findall(r'<a [^>]*>(.*?)</a>', rendered))
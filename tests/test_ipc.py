@@ -0,0 +1,71 @@
+"""进程间通信：回环地址上的请求/响应、令牌校验、错误传递"""
+
+import asyncio
+
+import pytest
+
+from core.ipc import HOST, WorkerClient, WorkerServer
+
+
+def test_call_round_trip_and_errors():
+    async def scenario():
+        async def echo(value):
+            return value
+
+        async def fail():
+            raise ValueError("坏请求")
+
+        server = WorkerServer('token', {'echo': echo, 'fail': fail})
+        client = WorkerClient('worker', 'token')
+        await client.connect(await server.start())
+        try:
+            result = await client.call('echo', value={'中文': [1, 2]})
+            with pytest.raises(RuntimeError, match="坏请求"):
+                await client.call('fail')
+            return result
+        finally:
+            await client.close()
+            await server.stop()
+
+    assert asyncio.run(scenario()) == {'中文': [1, 2]}
+
+
+def test_wrong_token_is_refused():
+    async def scenario():
+        async def echo(value):
+            return value
+
+        server = WorkerServer('token', {'echo': echo})
+        port = await server.start()
+        reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(b'guess\n{"id": 1, "method": "echo", "params": {"value": 1}}\n')
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        await server.stop()
+        return response
+
+    assert asyncio.run(scenario()) == b''
+
+
+def test_worker_events_reach_the_pool_side():
+    async def scenario():
+        received = asyncio.Queue()
+
+        async def on_event(event, params):
+            await received.put((event, params))
+
+        server = WorkerServer('token', {})
+        client = WorkerClient('worker', 'token', on_event)
+        await client.connect(await server.start())
+        try:
+            # 等服务端登记连接后再发送事件
+            while not server._authorized:
+                await asyncio.sleep(0.01)
+            await server.notify('rule_slow', rule_id=3, average_ms=25.0)
+            return await asyncio.wait_for(received.get(), 5)
+        finally:
+            await client.close()
+            await server.stop()
+
+    assert asyncio.run(scenario()) == ('rule_slow', {'rule_id': 3, 'average_ms': 25.0})
@@ -0,0 +1,120 @@
+"""关键词写入校验：添加、修改、批量导入走同一套校验"""
+
+import asyncio
+
+import pytest
+
+from core.database import AsyncSessionLocal, Keyword, KeywordChat, engine, init_database
+from services.keyword_service import KeywordService
+
+
+def run(scenario):
+    async def wrapper():
+        await init_database()
+        async with AsyncSessionLocal() as session:
+            await session.execute(KeywordChat.__table__.delete())
+            await session.execute(Keyword.__table__.delete())
+            await session.commit()
+        try:
+            return await scenario(KeywordService())
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(wrapper())
+
+
+@pytest.mark.parametrize('content, kw_type, error', [
+    ('(出', 2, '正则表达式语法错误'),
+    ('出 AND', 5, '表达式语法错误'),
+    ('NOT 诈骗', 5, '表达式语法错误'),
+    ('出 ~x USDT', 6, '邻近规则格式错误'),
+    ('@a', 4, '无效的用户名'),
+    ('  ', 1, '关键词内容不能为空'),
+    ('出', 9, '无效的关键词类型'),
+])
+def test_validate_rule_rejects(content, kw_type, error):
+    assert error in KeywordService()._validate_rule(content, kw_type, 1)
+
+
+def test_update_keyword_validates_resulting_rule():
+    async def scenario(service):
+        assert (await service.add_keyword('(出 USDT', kw_type=1))[0]
+        keyword = (await service.get_keywords())[0]
+        # 只改类型：原内容不是合法正则
+        changed_type = await service.update_keyword(keyword['id'], kw_type=2)
+        changed_content = await service.update_keyword(keyword['id'], content='出 ~ USDT', kw_type=6)
+        return changed_type, changed_content, await service.get_keyword_by_id(keyword['id'])
+
+    changed_type, changed_content, keyword = run(scenario)
+    assert not changed_type[0] and '正则表达式语法错误' in changed_type[1]
+    assert not changed_content[0] and '邻近规则格式错误' in changed_content[1]
+    assert keyword['type'] == 1 and keyword['content'] == '(出 USDT'
+
+
+def test_batch_add_skips_and_reports_invalid_rules():
+    async def scenario(service):
+        result = await service.batch_add_keywords([
+            {'content': 'USDT', 'type': 1},
+            {'content': '[汇率', 'type': 2},
+            {'content': '出 ~20 USDT', 'type': 6},
+            {'content': '出 OR', 'type': 5},
+        ])
+        return result, await service.get_keywords(per_page=0)
+
+    (success, message), keywords = run(scenario)
+    assert success
+    assert '成功添加 2 个关键词' in message
+    assert '[汇率: 正则表达式语法错误' in message and '出 OR: 表达式语法错误' in message
+    assert sorted(kw['content'] for kw in keywords) == ['USDT', '出 ~20 USDT']
+
+
+def test_batch_add_reports_rejected_lines():
+    async def scenario(service):
+        return await service.batch_add_keywords([
+            {'content': '出 ~20> USDT', 'type': 6, 'line': 1},
+            {'content': '出 ~20> ', 'type': 6, 'line': 2},
+            {'content': '出 ~5<USDT', 'type': 6, 'line': 3},
+            {'content': '出 ~99999 USDT', 'type': 6, 'line': 4},
+        ])
+
+    success, message = run(scenario)
+    assert success and '成功添加 1 个关键词' in message
+    assert '3 个未通过校验' in message
+    assert '第 2 行 出 ~20>: 邻近规则格式错误' in message
+    assert '第 3 行 出 ~5<USDT: 邻近规则格式错误' in message
+    assert '第 4 行 出 ~99999 USDT: 邻近规则格式错误: 距离不能超过 4096 个字符' in message
+
+
+def test_keyword_chats_are_saved_in_marked_form():
+    async def scenario(service):
+        await service.add_keyword('USDT', chats=['-1001234567890'])
+        keyword = (await service.get_keywords())[0]
+        rejected = [
+            await service.set_keyword_chats(keyword['id'], ['-1001234567890', chat_id])
+            for chat_id in ('abc', '1234567890', '0')
+        ]
+        saved = await service.set_keyword_chats(keyword['id'], ['-1001234567890', '-123', -1000987654321])
+        return keyword, rejected, saved, await service.get_keyword_by_id(keyword['id'])
+
+    added, rejected, saved, keyword = run(scenario)
+    assert added['chats'] == [-1001234567890]
+    assert all(not success for success, _ in rejected)
+    assert '1234567890' in rejected[1][1]
+    assert saved[0]
+    assert keyword['chats'] == [-1001234567890, -1000987654321, -123]
+
+
+def test_basic_group_scope_matches_its_messages():
+    async def scenario(service):
+        # 普通群组 12345 的带标记ID为 -12345，消息的 chat_id 也是 -12345
+        await service.add_keyword('USDT', chats=['-12345'])
+        keyword = (await service.get_keywords())[0]
+        await service.load_rules()
+        return keyword, await service.match_messages([
+            ("出 USDT", 1, -12345),
+            ("出 USDT", 1, -1000000012345),
+        ])
+
+    keyword, results = run(scenario)
+    assert keyword['chats'] == [-12345]
+    assert [[kw.id for kw in rows] for rows in results] == [[keyword['id']], []]
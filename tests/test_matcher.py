@@ -0,0 +1,190 @@
+"""规则匹配器：快照增量/删除标记与全量重建等价、加载期间的增量、分片模式的命中去重"""
+
+import asyncio
+import random
+
+import pytest
+
+from core.matcher import RuleIndex, RuleMatcher
+
+
+def rule(rule_id: int, content: str, kw_type: int = 1, **columns) -> dict:
+    return {'id': rule_id, 'content': content, 'type': kw_type, 'action': 1, 'chats': [], **columns}
+
+
+def hit_ids(results):
+    return [[row['id'] for row in rows] for rows in results]
+
+
+class StalePool:
+    """模拟已加载了更新主索引的分片进程"""
+
+    def __init__(self, rows):
+        self.index = RuleIndex(rows)
+
+    def load(self, rows):
+        pass
+
+    async def match_batch(self, messages, costs=None):
+        return self.index.match_batch(messages, costs)
+
+    def shutdown(self):
+        pass
+
+
+def test_sharded_batch_reports_each_rule_once():
+    async def scenario():
+        matcher = RuleMatcher()
+        matcher.pool = StalePool([])
+        await matcher.load([])
+        matcher.apply_delta('upsert', rows=[rule(1, 'usdt')])
+        # 分片已按最新规则重建（规则 1 在主索引中），当前快照的增量里也有规则 1
+        matcher.pool = StalePool([rule(1, 'usdt')])
+        return await matcher.match_batch([("出 USDT", 1, -100)])
+
+    assert hit_ids(asyncio.run(scenario())) == [[1]]
+
+
+def test_concurrent_loads_apply_in_call_order():
+    async def scenario():
+        matcher = RuleMatcher()
+        # 第一次加载的规则多、构建慢，不加锁时会晚于第二次加载完成并覆盖它
+        first = [rule(rule_id, f"词{rule_id}") for rule_id in range(1, 20001)]
+        second = [rule(1, 'usdt')]
+        await asyncio.gather(matcher.load(first), matcher.load(second))
+        return matcher
+
+    matcher = asyncio.run(scenario())
+    assert list(matcher.rules) == [1]
+    assert matcher.rules[1]['content'] == 'usdt'
+
+
+WORDS = ["出", "收", "USDT", "汇率", "飞机", "代开", "秒到", "靠谱", "诈骗", "担保"]
+CHATS = [-1001, -1002, -1003]
+
+
+def random_rule(rng: random.Random, rule_id: int) -> dict:
+    first, second = rng.sample(WORDS, 2)
+    kw_type, content = rng.choice([
+        (0, first),
+        (1, first),
+        (1, f"{first}{second}"),
+        (2, f"{first}.{{0,3}}{second}"),
+        (3, f"{first}?{second}"),
+        (5, f"({first} OR {second}) AND NOT 诈骗"),
+        (6, f"{first} ~5 {second}"),
+        (6, f"{first} ~5> {second}"),
+    ])
+    chats = rng.sample(CHATS, rng.randint(1, 2)) if rng.random() < 0.3 else []
+    return rule(rule_id, content, kw_type, is_case_sensitive=rng.random() < 0.2, chats=chats)
+
+
+def random_messages(rng: random.Random, count: int):
+    return [
+        (' '.join(rng.choices(WORDS + ["usdt", "哈哈"], k=rng.randint(1, 8))), rng.randint(1, 3), rng.choice(CHATS))
+        for _ in range(count)
+    ]
+
+
+async def fresh_results(rules: dict, messages):
+    matcher = RuleMatcher()
+    await matcher.load(rules.values())
+    return [sorted(ids) for ids in hit_ids(await matcher.match_batch(messages))]
+
+
+@pytest.mark.parametrize('delta_threshold', [1, 8, 10000])
+@pytest.mark.parametrize('seed', range(5))
+def test_deltas_match_like_a_fresh_index(seed, delta_threshold):
+    async def scenario():
+        rng = random.Random(seed)
+        rules = {rule_id: random_rule(rng, rule_id) for rule_id in range(1, 41)}
+        matcher = RuleMatcher(delta_threshold=delta_threshold)
+        await matcher.load(rules.values())
+
+        next_id = 41
+        for _ in range(60):
+            if rules and rng.random() < 0.4:
+                ids = rng.sample(sorted(rules), rng.randint(1, min(3, len(rules))))
+                for rule_id in ids:
+                    del rules[rule_id]
+                matcher.apply_delta('delete', ids=ids)
+            else:
+                rows = []
+                for _ in range(rng.randint(1, 3)):
+                    # 一半修改已有规则（产生删除标记），一半新增
+                    if rules and rng.random() < 0.5:
+                        rule_id = rng.choice(sorted(rules))
+                    else:
+                        rule_id, next_id = next_id, next_id + 1
+                    rules[rule_id] = random_rule(rng, rule_id)
+                    rows.append(rules[rule_id])
+                matcher.apply_delta('upsert', rows=rows)
+            # 让后台合并有机会执行
+            await asyncio.sleep(0)
+
+        messages = random_messages(rng, 200)
+        got = [sorted(ids) for ids in hit_ids(await matcher.match_batch(messages))]
+        assert matcher.rules == rules
+        assert got == await fresh_results(rules, messages)
+
+        if matcher._merge_task:
+            await matcher._merge_task
+        assert matcher.rules == rules
+        assert [sorted(ids) for ids in hit_ids(await matcher.match_batch(messages))] == got
+        assert matcher._log == []
+
+    asyncio.run(scenario())
+
+
+def test_deltas_during_first_load_are_replayed():
+    async def scenario():
+        matcher = RuleMatcher()
+        loaded = asyncio.Event()
+
+        async def read_rules():
+            # 读取全量规则期间到达了增量
+            await loaded.wait()
+            return [rule(1, 'usdt'), rule(2, '汇率')]
+
+        load = asyncio.create_task(matcher.load(read_rules()))
+        await asyncio.sleep(0)
+        matcher.apply_delta('upsert', rows=[rule(3, '飞机')])
+        matcher.apply_delta('delete', ids=[2])
+        loaded.set()
+        await load
+        return matcher
+
+    matcher = asyncio.run(scenario())
+    assert sorted(matcher.rules) == [1, 3]
+    assert matcher._log == []
+
+
+def test_deltas_are_not_logged_between_builds():
+    async def scenario():
+        matcher = RuleMatcher(delta_threshold=10000)
+        await matcher.load([rule(1, 'usdt')])
+        for _ in range(100):
+            matcher.apply_delta('upsert', rows=[rule(2, '飞机')])
+        return matcher
+
+    matcher = asyncio.run(scenario())
+    assert matcher._log == []
+    assert sorted(matcher.rules) == [1, 2]
+
+
+def test_sharded_processes_match_like_one_index():
+    async def scenario():
+        rng = random.Random(7)
+        rules = [random_rule(rng, rule_id) for rule_id in range(1, 61)]
+        messages = random_messages(rng, 100)
+        sharded = RuleMatcher(shards=2)
+        try:
+            await sharded.load(rules)
+            got = [sorted(ids) for ids in hit_ids(await sharded.match_batch(messages))]
+        finally:
+            sharded.close()
+        return got, await fresh_results({row['id']: row for row in rules}, messages)
+
+    got, expected = asyncio.run(scenario())
+    assert got == expected
+    assert any(got)
@@ -0,0 +1,32 @@
+"""内存会话：定时任务按间隔写回、关闭时停止"""
+
+import asyncio
+import datetime
+import sqlite3
+
+from telethon.tl import types
+
+from core.memory_session import MemoryBackedSession
+
+
+def test_dirty_state_is_flushed_without_further_saves(tmp_path):
+    path = tmp_path / 'account.session'
+
+    async def scenario():
+        session = MemoryBackedSession(str(path), flush_interval=0.05)
+        # 客户端 connect() 时的 save() 启动定期写回
+        session.save()
+        task = session._flush_task
+        session.set_update_state(0, types.updates.State(
+            pts=7, qts=0, date=datetime.datetime.now(tz=datetime.timezone.utc), seq=1, unread_count=0
+        ))
+        await asyncio.sleep(0.3)
+        with sqlite3.connect(path) as db:
+            rows = db.execute('select id, pts from update_state').fetchall()
+        session.close()
+        await asyncio.sleep(0)
+        return rows, task
+
+    rows, task = asyncio.run(scenario())
+    assert rows == [(0, 7)]
+    assert task.cancelled()
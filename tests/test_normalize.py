@@ -0,0 +1,88 @@
+"""文本归一化：各步骤的映射、原文下标换算、形近字默认关闭且与忽略大小写一致"""
+
+import asyncio
+
+import pytest
+
+import core.normalize
+from core.matcher import RuleMatcher, fold_case
+from core.normalize import Normalizer, get_normalizer, normalize_rule
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    """按 MATCH_NORMALIZE 重新构建进程内共享的归一化函数"""
+    def configure(value=None):
+        if value is None:
+            monkeypatch.delenv('MATCH_NORMALIZE', raising=False)
+        else:
+            monkeypatch.setenv('MATCH_NORMALIZE', value)
+        monkeypatch.setattr(core.normalize, '_normalizer', None)
+        return get_normalizer()
+
+    return configure
+
+
+def rule(rule_id: int, content: str, kw_type: int = 1, **columns) -> dict:
+    return {'id': rule_id, 'content': content, 'type': kw_type, 'action': 1, 'chats': [], **columns}
+
+
+def hit_ids(rows, messages):
+    async def scenario():
+        matcher = RuleMatcher()
+        await matcher.load(rows)
+        return [sorted(row['id'] for row in hits) for hits in await matcher.match_batch(messages)]
+
+    return asyncio.run(scenario())
+
+
+def test_steps_map_variants():
+    normalizer = Normalizer(['nfkc', 'width', 'zero_width', 't2s'])
+    assert normalizer('ＵＳＤＴ　匯率') == 'USDT 汇率'
+    assert normalizer('飞​机') == '飞机'
+    assert normalizer('①號') == '1号'
+    assert normalizer('plain ascii') == 'plain ascii'
+
+
+def test_pattern_escapes_mapped_characters():
+    normalizer = Normalizer(['nfkc', 'width'])
+    assert normalizer.pattern('（出|收）') == r'\(出|收\)'
+
+
+def test_offsets_map_back_to_original():
+    normalizer = Normalizer(['nfkc', 'zero_width'])
+    text = 'a​ﬁx'
+    normalized = normalizer(text)
+    offsets = normalizer.offsets(text)
+    assert normalized == 'afix'
+    assert offsets == [0, 2, 2, 3, 4]
+    assert normalizer.offsets('abc') is None
+
+
+def test_confusables_off_by_default(steps):
+    normalizer = steps()
+    assert 'confusables' not in normalizer.steps
+    assert normalizer('рау') == 'рау'
+    assert steps('confusables,nfkc')('рау') == 'pay'
+
+
+def test_confusables_commute_with_case_folding():
+    normalizer = Normalizer(['confusables'])
+    for cp in normalizer.table:
+        ch = chr(cp)
+        assert fold_case(normalizer(ch)) == normalizer(fold_case(ch)), ch
+
+
+@pytest.mark.parametrize('content, text', [
+    ('αθηνα', 'ΑΘΗΝΑ'),
+    ('ΑΘΗΝΑ', 'αθηνα'),
+    ('βετα', 'ΒΕΤΑ'),
+    ('ΒΕΤΑ', 'βετα'),
+    ('привет', 'ПРИВЕТ'),
+])
+@pytest.mark.parametrize('config', ['nfkc,width,zero_width,t2s', 'nfkc,width,zero_width,t2s,confusables'])
+def test_case_insensitive_non_latin_rules(steps, config, content, text):
+    steps(config)
+    rows = [rule(1, content), rule(2, content, 0), rule(3, f"^{content}$", 2), rule(4, f"{content} ~3 usdt", 6),
+            rule(5, content, is_case_sensitive=True)]
+    assert hit_ids(rows, [(text, 1, -100), (f"出 {text} usdt", 1, -100)]) == [[1, 2, 3], [1, 4]]
@@ -0,0 +1,67 @@
+"""规则运行统计：慢规则默认不停用、每个进程只上报一次、多次上报只停用一次"""
+
+import asyncio
+
+from core.database import AsyncSessionLocal, KeywordStats, engine, init_database
+from core.rule_stats import RuleStats
+
+
+def record_slow(stats: RuleStats, rule_id: int, times: int, seconds: float = 0.05):
+    for _ in range(times):
+        stats.record({rule_id: [1, seconds]}, [])
+
+
+def reports(stats: RuleStats, scenario) -> list:
+    reported = []
+
+    async def on_slow(rule_id, average_ms):
+        reported.append((rule_id, round(average_ms)))
+
+    async def run():
+        stats.on_slow = on_slow
+        scenario(stats)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    return reported
+
+
+def test_auto_disable_is_off_by_default():
+    stats = RuleStats(flush_interval=0)
+    assert reports(stats, lambda s: record_slow(s, 1, 200)) == []
+
+
+def test_slow_rule_is_reported_once_until_reset():
+    def scenario(stats):
+        record_slow(stats, 1, 3)
+        record_slow(stats, 1, 10)
+        record_slow(stats, 2, 10, seconds=0.001)
+        stats.reset([1])
+        record_slow(stats, 1, 5)
+
+    stats = RuleStats(flush_interval=0, max_avg_ms=20, min_evals=5)
+    assert reports(stats, scenario) == [(1, 50), (1, 50)]
+
+
+def test_disable_writes_marker_once():
+    async def scenario():
+        await init_database()
+        async with AsyncSessionLocal() as session:
+            await session.execute(KeywordStats.__table__.delete())
+            await session.commit()
+        try:
+            stats = RuleStats(flush_interval=0, max_avg_ms=20)
+            # 两个工作进程先后上报同一条规则
+            first = await stats.disable(7, 35.0)
+            second = await stats.disable(7, 40.0)
+            async with AsyncSessionLocal() as session:
+                row = await session.get(KeywordStats, 7)
+            stats.reset([7])
+            again = await stats.disable(7, 41.0)
+            return first, second, row, again
+        finally:
+            await engine.dispose()
+
+    first, second, row, again = asyncio.run(scenario())
+    assert (first, second, again) == (True, False, True)
+    assert row.disabled_at is not None and '35.0ms' in row.disabled_reason